@@ -0,0 +1,61 @@
+"""The benchmark of the size and the time of saving and loading the database file per compression codec.
+
+Usage:
+    python -m benchmarks.compression_benchmark [orders] [products]
+"""
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter
+
+from benchmarks.database_benchmark import new_database
+from benchmarks.ingest_benchmark import order_history, store_bulk
+from tools.container import AVAILABLE_CODECS, DEFAULT_LEVELS, Compression
+from tools.protection import Protection
+
+LEVELS = {'none': (0,), 'zlib': (1, 6, 9), 'lzma': (0, 6), 'zstd': (1, 3, 9, 19)}
+
+
+def measure(protection: Protection, dump: bytes) -> tuple:
+    """Return the size of the file, the time of the save and the time of the load."""
+    start = perf_counter()
+    protection.save_database_dump(dump)
+    saved = perf_counter() - start
+
+    start = perf_counter()
+    content = protection.decrypt_file()
+    loaded = perf_counter() - start
+    assert content == dump
+
+    return protection.database_path.stat().st_size, saved, loaded
+
+
+def main(orders: int = 20000, products: int = 2000):
+    """Print the size and the time of saving and loading the synthetic database per codec and level.
+
+    Args:
+        orders (int): the number of the orders
+        products (int): the number of the distinct products
+    """
+    database = new_database()
+    database.create_database()
+    store_bulk(database, order_history(orders, products))
+    dump = database.dump()
+    print(f'{orders} orders, the sqlite image of {len(dump) / 1024 ** 2:.1f} MB')
+
+    with tempfile.TemporaryDirectory() as directory:
+        protection = Protection('password', Path(directory) / 'benchmark.db')
+        # the key is derived once, before the measured saves
+        protection.derive_key(protection.key_derivation)
+
+        print(f'{"codec":<8}{"level":>6}{"size":>12}{"ratio":>8}{"save":>12}{"load":>12}')
+        for codec in AVAILABLE_CODECS:
+            for level in LEVELS.get(codec, (DEFAULT_LEVELS[codec],)):
+                protection.compression = Compression(codec, level)
+                size, saved, loaded = measure(protection, dump)
+                print(f'{codec:<8}{level:>6}{size / 1024 ** 2:>9.2f} MB{len(dump) / size:>8.1f}'
+                      f'{saved:>10.3f} s{loaded:>10.3f} s')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
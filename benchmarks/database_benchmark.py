@@ -0,0 +1,90 @@
+"""The benchmark of saving and loading the database as the sql text dump and as the sqlite image.
+
+Usage:
+    python -m benchmarks.database_benchmark [orders] [products]
+"""
+import sys
+from pathlib import Path
+from time import perf_counter
+
+from sqlalchemy import func, text
+
+from benchmarks.ingest_benchmark import order_history, store_bulk
+from tools.database import Database
+from tools.models import Base, Order, OrderProduct, Product
+from tools.search import SEARCH_INDEXES
+
+
+def new_database() -> Database:
+    """Return the empty database with the open session."""
+    database = Database(Path('benchmark.db'), 'password')
+    database.create_session()
+    return database
+
+
+def dump_text(database: Database) -> bytes:
+    """Dump the database as the sql text, as before the image format.
+        The lines are joined once, the previous concatenation was quadratic.
+        The full-text indexes are left out, as the older databases have no indexes."""
+    connection = database.engine.raw_connection()
+    return '\n'.join(
+        line for line in connection.driver_connection.iterdump()
+        if not any(name in line for name in SEARCH_INDEXES) and 'writable_schema' not in line
+    ).encode('utf-8')
+
+
+def load_text(database: Database, content: bytes):
+    """Load the sql text dump executing the statements one by one, as before the image format."""
+    for script in content.decode('utf-8').split(';'):
+        database.session.execute(text(script))
+    Base.metadata.create_all(database.engine)
+
+
+def load_image(database: Database, content: bytes):
+    """Load the sqlite image."""
+    connection = database.engine.raw_connection()
+    connection.driver_connection.deserialize(content)
+    connection.close()
+
+
+def rows(database: Database) -> int:
+    """Return the number of the rows of the orders, the products and the order lines."""
+    return sum(database.session.query(func.count()).select_from(model).scalar()
+               for model in (Order, Product, OrderProduct))
+
+
+def measure(source: Database, dump, load) -> tuple:
+    """Return the size of the dump, the time of the dump and the time of the load."""
+    start = perf_counter()
+    content = dump(source)
+    dumped = perf_counter() - start
+
+    target = new_database()
+    start = perf_counter()
+    load(target, content)
+    loaded = perf_counter() - start
+    assert rows(target) == rows(source)
+
+    return len(content), dumped, loaded
+
+
+def main(orders: int = 20000, products: int = 2000):
+    """Print the size and the time of saving and loading the synthetic database per format.
+
+    Args:
+        orders (int): the number of the orders
+        products (int): the number of the distinct products
+    """
+    source = new_database()
+    source.create_database()
+    store_bulk(source, order_history(orders, products))
+    print(f'{rows(source)} rows')
+
+    print(f'{"format":<12}{"size":>12}{"dump":>12}{"load":>12}')
+    for name, dump, load in (('sql text', dump_text, load_text), ('image', Database.dump, load_image)):
+        size, dumped, loaded = measure(source, dump, load)
+        print(f'{name:<12}{size / 1024 ** 2:>9.1f} MB{dumped:>10.3f} s{loaded:>10.3f} s')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,120 @@
+"""The benchmark of storing the synthetic order history in the database.
+
+Usage:
+    python -m benchmarks.ingest_benchmark [orders] [products]
+"""
+import random
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+from time import perf_counter
+
+from tools.database import Database
+from tools.ingest import OrderIngest
+from tools.models import Order, OrderProduct, Product
+
+
+def order_history(orders: int, products: int) -> dict:
+    """Return the synthetic order history.
+
+    Args:
+        orders (int): the number of the orders
+        products (int): the number of the distinct products
+
+    Returns:
+        (dict): the order numbers with the order details
+    """
+    randomizer = random.Random(0)
+    catalog = [
+        {'catalog_number': f'{4400 + number // 1000} {number % 1000:04}', 'oem_number': f'RL{number}-000',
+         'description': f'Rolka HP LJ P{number}'}
+        for number in range(products)
+    ]
+
+    history = {}
+    for number in range(orders):
+        history[str(200000 + number)] = {
+            'date': str(date(2014, 1, 1) + timedelta(days=number // 20)),
+            'products': [
+                {**product, 'quantity': str(randomizer.randint(1, 10))}
+                for product in randomizer.sample(catalog, randomizer.randint(1, 8))
+            ],
+        }
+
+    return history
+
+
+def store_order_per_line(database: Database, order_number: str, details: dict):
+    """Store the order querying every product and committing every new product, as before the bulk ingest."""
+    order = Order(order_number=order_number, date=date.fromisoformat(details['date']))
+    database.session.add(order)
+
+    for product in details['products']:
+        product_model = Product(
+            catalog_number=product['catalog_number'],
+            oem_number=product['oem_number'],
+            description=product['description'],
+        )
+        filters = (
+                (Product.catalog_number == product_model.catalog_number) &
+                (Product.oem_number == product_model.oem_number) &
+                (Product.description == product_model.description)
+        )
+        result = database.session.query(Product).filter(filters).all()
+        if result:
+            product_id = result[0].id
+        else:
+            database.session.add(product_model)
+            database.session.commit()
+            product_id = product_model.id
+
+        database.session.add(OrderProduct(order=order, product_id=product_id, quantity=product['quantity']))
+
+    database.session.commit()
+
+
+def store_bulk(database: Database, history: dict):
+    """Store the orders with the bulk ingest."""
+    ingest = OrderIngest(database.session)
+    for order_number, details in history.items():
+        ingest.add(order_number, details)
+    ingest.flush()
+
+
+def measure(history: dict, store) -> tuple:
+    """Return the time of storing the history in the empty database and the number of the stored lines."""
+    database = Database(Path('benchmark.db'), 'password')
+    database.create_session()
+    database.create_database()
+
+    start = perf_counter()
+    store(database, history)
+    elapsed = perf_counter() - start
+
+    lines = database.session.query(OrderProduct).count()
+    database.session.close()
+    return elapsed, lines
+
+
+def main(orders: int = 10000, products: int = 2000):
+    """Print the time of storing the synthetic order history with the both ingest methods.
+
+    Args:
+        orders (int): the number of the orders
+        products (int): the number of the distinct products
+    """
+    history = order_history(orders, products)
+
+    per_line = measure(history, lambda database, items: [
+        store_order_per_line(database, order_number, details) for order_number, details in items.items()
+    ])
+    bulk = measure(history, store_bulk)
+
+    print(f'{orders} orders, {per_line[1]} order lines, {products} products')
+    print(f'{"per line queries":<20}{per_line[0]:>10.2f} s')
+    print(f'{"bulk ingest":<20}{bulk[0]:>10.2f} s')
+    print(f'{"speedup":<20}{per_line[0] / bulk[0]:>10.1f} x')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
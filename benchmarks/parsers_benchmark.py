@@ -0,0 +1,38 @@
+"""The benchmark of the parser backends on the stored arbiko.pl pages.
+
+Usage:
+    python -m benchmarks.parsers_benchmark [repeat]
+"""
+import sys
+from timeit import repeat
+
+from tools.parsers import PARSERS, get_parser
+
+PAGES = (
+    ('history list', 'order_list', 'tests/responses/expected_response_post_history_url.txt'),
+    ('order page', 'order', 'tests/responses/expected_response_get_order_url.txt'),
+    ('search result', 'oem_number', 'tests/responses/expected_good_response_post_search_url.txt'),
+)
+
+
+def main(number: int = 20):
+    """Print the best time of parsing every page per backend in milliseconds.
+
+    Args:
+        number (int): number of the parsings per measurement
+    """
+    print(f'{"page":<15}' + ''.join(f'{name:>24}' for name in PARSERS))
+    for page, method, path in PAGES:
+        with open(path) as file:
+            content = file.read()
+
+        times = []
+        for name in PARSERS:
+            parse = getattr(get_parser(name), method)
+            best = min(repeat(lambda: parse(content), number=number, repeat=3)) / number
+            times.append(f'{best * 1000:>21.2f} ms')
+        print(f'{page:<15}' + ''.join(times))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,89 @@
+"""The benchmark of searching the order lines with the LIKE queries and with the full-text index,
+and of looking up the order lines by the exact catalog number and by the number search keys.
+
+Usage:
+    python -m benchmarks.search_benchmark [orders] [products]
+"""
+import sys
+from time import perf_counter
+
+from benchmarks.database_benchmark import new_database
+from benchmarks.ingest_benchmark import order_history, store_bulk
+from tools.database import Database
+from tools.models import Order, OrderProduct, Product
+from tools.search import search_order_products, search_order_products_by_number
+
+PHRASES = ('rl1234', 'p1999', 'rolka p123', 'lj 4401 rl17')
+NUMBERS = ('4401 0999', '04401-0999', '440109', '4410 0999')
+REPEATS = 5
+
+
+def search_like(database: Database, phrases: str) -> list:
+    """Search the order lines with one LIKE query per word and column, as before the full-text index."""
+    result = []
+    for column in (Product.oem_number, Product.description):
+        for phrase in phrases.split(' '):
+            result += database.session.query(OrderProduct) \
+                .join(Product).join(Order).filter(column.like(f'%{phrase}%')) \
+                .order_by(Order.date).all()
+    result.sort(key=lambda order_product: order_product.order.date)
+    return result
+
+
+def search_exact(database: Database, number: str) -> list:
+    """Search the order lines with the exact catalog number, as before the number search keys."""
+    return database.session.query(OrderProduct) \
+        .join(Product).join(Order).filter(Product.catalog_number == number) \
+        .order_by(Order.date).all()
+
+
+def measure(search, database: Database, phrases: str) -> tuple:
+    """Return the best time of the search and the number of the found order lines."""
+    times = []
+    for _ in range(REPEATS):
+        database.session.expunge_all()
+        start = perf_counter()
+        result = search(database, phrases)
+        times.append(perf_counter() - start)
+    return min(times), len(result)
+
+
+def main(orders: int = 20000, products: int = 2000):
+    """Print the time of searching the synthetic database with the both methods per phrase.
+
+    Args:
+        orders (int): the number of the orders
+        products (int): the number of the distinct products
+    """
+    database = new_database()
+    database.create_database()
+    store_bulk(database, order_history(orders, products))
+    lines = database.session.query(OrderProduct).count()
+    print(f'{orders} orders, {lines} order lines, {products} products')
+
+    print(f'{"phrase":<16}{"like":>12}{"lines":>8}{"fts5 any":>12}{"lines":>8}{"fts5 all":>12}{"lines":>8}')
+    for phrases in PHRASES:
+        row = f'{phrases:<16}'
+        for search in (
+            search_like,
+            lambda target, words: search_order_products(target.session, words, match_all=False),
+            lambda target, words: search_order_products(target.session, words, match_all=True),
+        ):
+            elapsed, found = measure(search, database, phrases)
+            row += f'{elapsed * 1000:>9.1f} ms{found:>8}'
+        print(row)
+
+    print(f'{"number":<16}{"exact":>12}{"lines":>8}{"keys":>12}{"lines":>8}')
+    for number in NUMBERS:
+        row = f'{number:<16}'
+        for search in (
+            search_exact,
+            lambda target, typed: search_order_products_by_number(target.session, typed),
+        ):
+            elapsed, found = measure(search, database, number)
+            row += f'{elapsed * 1000:>9.1f} ms{found:>8}'
+        print(row)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
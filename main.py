@@ -1,9 +1,12 @@
 """The app to manage the placed orders at arbiko.pl site."""
 import argparse
-from datetime import date, timedelta, datetime
+import asyncio
+from datetime import date, timedelta
+from functools import partial
 from pathlib import Path
 from os import getenv
 import re
+from typing import Sequence
 
 from fake_useragent import UserAgent
 from rich.console import Console
@@ -11,10 +14,22 @@ from rich.table import Table
 from sqlalchemy import desc
 from dotenv import load_dotenv
 
-from tools.arbiko import Arbiko
+from tools.arbiko import Arbiko, AsyncArbiko, SHARD_ERRORS, split_date_range
+from tools.cache import OemNumberCache, QueryCache, ResponseCache, SessionStore
+from tools.checkpoint import Checkpoint
+from tools.container import AVAILABLE_CODECS, Compression
 from tools.database import Database
-from tools.exceptions import DatabaseError, ExitException, LoginError
-from tools.models import Order, Product, OrderProduct
+from tools.exceptions import CacheMissError, DatabaseError, ExitException, LoginError
+from tools.ingest import OrderIngest
+from tools.models import Order
+from tools.search import COLUMNS, number_key, search_order_products, search_order_products_by_number
+from tools.throttle import RequestPolicy
+
+# the word of the typed catalog or oem number, with a digit or the short letter group like the 'B' suffix
+NUMBER_WORD = '(?:[0-9a-z./_,-]*[0-9][0-9a-z./_,-]*|[a-z./_,-]{1,2})'
+# the typed catalog or oem number, its words separated by the spaces
+NUMBER = re.compile(f'{NUMBER_WORD}(?: +{NUMBER_WORD})*')
+MIN_NUMBER_DIGITS = 3
 
 
 def load_arguments():
@@ -30,21 +45,180 @@ def load_arguments():
     group.add_argument('-s', '--search', help='choose to search data', action='store_true', default=True)
     parser.add_argument('-start_date', help='date format: YYYY-MM-DD')
     parser.add_argument('-end_date', help='date format: YYYY-MM-DD')
+    parser.add_argument('-overlap_days', help='number of days scanned again by refresh', type=int, default=7)
+    parser.add_argument('-shard_days', help='number of days fetched as one shard', type=int, default=31)
+    parser.add_argument('-shard_retries', help='number of the retries of a failed shard', type=int, default=1)
+    parser.add_argument('-workers', help='number of concurrent requests', type=int, default=4)
+    parser.add_argument('--async', help='use the asyncio client', action='store_true', dest='use_async')
+    parser.add_argument('-timeout', help='timeout of a request in seconds', type=float, default=30.0)
+    parser.add_argument('-retries', help='number of the retries of a failed request', type=int, default=3)
+    parser.add_argument('-rate', help='initial number of the requests per second', type=float, default=5.0)
+    parser.add_argument('--refetch', help='fetch also the orders stored in the database', action='store_true')
+    parser.add_argument('--cache', help='cache the order pages and the search results', action='store_true')
+    parser.add_argument('--replay', help='update the database only from the cached responses, '
+                        'requires the -start_date, -end_date and -shard_days of the cached update',
+                        action='store_true')
+    parser.add_argument('-cache_size', help='maximum size of the response cache in MB', type=int, default=256)
+    parser.add_argument('-compression', help='codec compressing the saved database', choices=AVAILABLE_CODECS,
+                        default='zlib')
+    parser.add_argument('-compression_level', help='level of the codec, its default level if not passed', type=int)
+    parser.add_argument('--any_word', help='search the products with any word of the phrase', action='store_true')
+    parser.add_argument('-search_columns', help='searched columns of the products', nargs='+', choices=COLUMNS,
+                        default=COLUMNS)
+    parser.add_argument('--by_relevance', help='show the most relevant products first', action='store_true')
+    parser.add_argument('-limit', help='maximum number of the found order lines', type=int)
+    parser.add_argument('-search_cache', help='maximum number of the cached search results', type=int, default=128)
+    parser.add_argument('--debug', help='show the hits and the misses of the search cache', action='store_true')
 
     args = parser.parse_args()
+    try:
+        Compression(args.compression, args.compression_level)
+    except ValueError as error:
+        parser.error(str(error))
 
     return args
 
 
+def get_known_orders(database: Database) -> dict:
+    """The function returns the index of the order numbers stored in the database.
+
+    Args:
+        database (Database): database connection
+
+    Returns:
+        (dict): the order numbers with their status, None if the status is not compared
+            as for the orders stored before the status was kept
+    """
+    return dict(database.session.query(Order.order_number, Order.status))
+
+
+def _report_shard(shard: tuple, orders: int, error: Exception = None):
+    """The function prints the progress of the shard."""
+    if error is None:
+        print(f'{shard[0]} - {shard[1]}: {orders} orders')
+    else:
+        print(f'{shard[0]} - {shard[1]}: failed after {orders} orders ({error!r})')
+
+
+def _ingest_shards(
+        ingest: OrderIngest,
+        checkpoint: Checkpoint,
+        arbiko: Arbiko,
+        shards: list,
+        known_orders: dict,
+):
+    """The function fetches the order history of the shards and stores the fetched orders in batches,
+        the orders of every shard are written before the shard is marked as completed.
+
+    Returns:
+        failed (list): the failed shards
+    """
+    failed = []
+    for shard, orders in arbiko.get_order_lists(shards):
+        if isinstance(orders, Exception):
+            _report_shard(shard, 0, orders)
+            failed.append(shard)
+            continue
+
+        count = 0
+        try:
+            for order_number, details in arbiko.iter_orders(orders, known_orders):
+                ingest.add(order_number, details)
+                count += 1
+        except SHARD_ERRORS as error:
+            ingest.flush()
+            _report_shard(shard, count, error)
+            failed.append(shard)
+        else:
+            ingest.flush()
+            _report_shard(shard, count)
+            if checkpoint:
+                checkpoint.add_shard(shard)
+
+    return failed
+
+
+async def _ingest_shards_async(
+        ingest: OrderIngest,
+        checkpoint: Checkpoint,
+        arbiko: AsyncArbiko,
+        shards: list,
+        known_orders: dict,
+):
+    """The function fetches the order history of the shards with the asyncio client
+        and stores the fetched orders in batches.
+
+    Returns:
+        failed (list): the failed shards
+    """
+    failed = []
+    for shard, orders in await arbiko.get_order_lists(shards):
+        if isinstance(orders, Exception):
+            _report_shard(shard, 0, orders)
+            failed.append(shard)
+            continue
+
+        count = 0
+        try:
+            async for order_number, details in arbiko.iter_orders(orders, known_orders):
+                ingest.add(order_number, details)
+                count += 1
+        except SHARD_ERRORS as error:
+            ingest.flush()
+            _report_shard(shard, count, error)
+            failed.append(shard)
+        else:
+            ingest.flush()
+            _report_shard(shard, count)
+            if checkpoint:
+                checkpoint.add_shard(shard)
+
+    return failed
+
+
+async def _ingest_order_history_async(
+        ingest: OrderIngest,
+        checkpoint: Checkpoint,
+        arbiko: AsyncArbiko,
+        shards: list,
+        known_orders: dict,
+        shard_retries: int,
+) -> list:
+    """The function fetches the order history with the asyncio client and retries the failed shards.
+
+    Returns:
+        shards (list): the shards failed after all retries
+    """
+    async with arbiko:
+        for _ in range(shard_retries + 1):
+            if shards:
+                shards = await _ingest_shards_async(ingest, checkpoint, arbiko, shards, known_orders)
+    return shards
+
+
 def update_data(
         database: Database,
         login: str,
         password: str,
         user_agent: str,
         start_date: str = None,
-        end_date: str = None
+        end_date: str = None,
+        max_workers: int = 4,
+        use_async: bool = False,
+        only_new: bool = True,
+        checkpoint_path: Path = None,
+        policy: RequestPolicy = None,
+        response_cache: ResponseCache = None,
+        replay: bool = False,
+        shard_days: int = None,
+        shard_retries: int = 1,
+        session_store: SessionStore = None,
 ):
     """The function to update order history in database.
+        The time period is split into the shards fetched independently, the failed shards are retried.
+        The fetched orders are written in batches with the bulk inserts, every batch is saved to the database file
+        or its journal, then the saved orders and the completed shards are saved in the checkpoint file,
+        so the interrupted update resumes from the last saved order.
 
     Args:
         database (Database): database connection
@@ -53,132 +227,168 @@ def update_data(
         user_agent (str): user agent
         start_date (str): start date to get order history
         end_date (str): end date to get order history
+        max_workers (int): the maximum number of the concurrent requests
+        use_async (bool): fetch the order history with the asyncio client
+        only_new (bool): fetch only the orders not stored in the database
+        checkpoint_path (Path): checkpoint file path, the checkpoint is not used if not passed
+        policy (RequestPolicy): timeouts, retries and rate limits of the requests
+        response_cache (ResponseCache): the on-disk cache of the server responses
+        replay (bool): read all responses from the response cache without connecting to the site,
+            the history lists are cached per shard, so the dates and the shards must match the cached update
+        shard_days (int): the number of days of a shard, the time period is not split if not passed
+        shard_retries (int): the number of the retries of the failed shards
+        session_store (SessionStore): the saved cookies of the logged-in session reused instead of the login
     """
+    if replay and not (start_date and end_date):
+        raise ValueError('The replay requires the start date and the end date of the cached update.')
+
     # set the default date to update database as 1 year
     if not start_date:
         start_date = date.today() - timedelta(days=365)
     if not end_date:
         end_date = date.today()
-    with Arbiko(login, password, user_agent) as arbiko:
-        order_history = arbiko.get_order_history(start_date, end_date)
-
-    for order_number, details in order_history.items():
-        order_date = details['date']
-        order_date = datetime.strptime(order_date, '%Y-%m-%d')
-
-        order = Order(
-            order_number=order_number,
-            date=order_date.date(),
-        )
-        database.session.add(order)
-
-        for product in details['products']:
-            product_model = Product(
-                catalog_number=product['catalog_number'],
-                oem_number=product['oem_number'],
-                description=product['description'],
-            )
 
-            filters = (
-                    (Product.catalog_number == product_model.catalog_number) &
-                    (Product.oem_number == product_model.oem_number) &
-                    (Product.description == product_model.description)
+    known_orders = get_known_orders(database) if only_new else None
+    checkpoint = None
+    if checkpoint_path:
+        checkpoint = Checkpoint(checkpoint_path, str(start_date), str(end_date))
+        if checkpoint.load():
+            print(f'Resuming the update from {checkpoint.start_date} to {checkpoint.end_date}')
+            start_date, end_date = checkpoint.start_date, checkpoint.end_date
+            known_orders = {**(known_orders or {}), **dict.fromkeys(checkpoint.orders)}
+
+    shards = split_date_range(start_date, end_date, shard_days)
+    if checkpoint:
+        shards = [shard for shard in shards if shard not in checkpoint.shards]
+
+    oem_cache = OemNumberCache(database.session)
+    # the batches are saved before they are marked in the checkpoint, so the killed update loses no orders
+    ingest = OrderIngest(database.session, checkpoint, save=database.save if checkpoint else None)
+    try:
+        if use_async:
+            arbiko = AsyncArbiko(
+                login, password, user_agent, max_workers, oem_cache,
+                policy=policy, response_cache=response_cache, replay=replay, session_store=session_store,
             )
-
-            # check if the product exist in database
-            result = database.session.query(Product).filter(filters).all()
-            if len(result) == 1:
-                product_id = result[0].id
-
-            elif not result:
-                database.session.add(product_model)
-                database.session.commit()
-                product_id = product_model.id
-
-            else:
-                raise ValueError
-
-            product_order = OrderProduct(
-                order=order,
-                product_id=product_id,
-                quantity=product['quantity'],
+            shards = asyncio.run(_ingest_order_history_async(
+                ingest, checkpoint, arbiko, shards, known_orders, shard_retries,
+            ))
+        else:
+            arbiko = Arbiko(
+                login, password, user_agent, max_workers, oem_cache,
+                policy=policy, response_cache=response_cache, replay=replay, session_store=session_store,
             )
-            database.session.add(product_order)
-
-        database.session.commit()
-
-
-def refresh_data(database: Database, login: str, password: str, user_agent: str):
+            with arbiko:
+                for _ in range(shard_retries + 1):
+                    if shards:
+                        shards = _ingest_shards(ingest, checkpoint, arbiko, shards, known_orders)
+    finally:
+        # write the orders fetched before the interruption
+        ingest.flush()
+        oem_cache.save()
+    print(arbiko.stats)
+
+    if shards:
+        print('Failed shards: ' + ', '.join(f'{start} - {end}' for start, end in shards))
+        print('Run the update again to retry them.')
+    elif checkpoint:
+        checkpoint.remove()
+
+
+def refresh_data(
+        database: Database,
+        login: str,
+        password: str,
+        user_agent: str,
+        session_store: SessionStore = None,
+        overlap_days: int = 7,
+        max_workers: int = 4,
+        use_async: bool = False,
+        policy: RequestPolicy = None,
+        response_cache: ResponseCache = None,
+        shard_days: int = None,
+        shard_retries: int = 1,
+):
     """The function gets the new records from arbiko.pl.
+        The history list is scanned again from the date of the last stored order
+        moved back by the overlap window, only the new orders and the orders
+        with the changed status are fetched and updated in place.
+        The options of the requests are passed to the 'update_data' function.
 
     Args:
         database (Database): database connection
         login (str): login to the aribko.pl
         password (str): password to the arbiko.pl
         user_agent (str): user agent
+        session_store (SessionStore): the saved cookies of the logged-in session reused instead of the login
+        overlap_days (int): the number of days before the last stored order scanned again
+        max_workers (int): the maximum number of the concurrent requests
+        use_async (bool): fetch the order history with the asyncio client
+        policy (RequestPolicy): timeouts, retries and rate limits of the requests
+        response_cache (ResponseCache): the on-disk cache of the server responses
+        shard_days (int): the number of days of a shard, the time period is not split if not passed
+        shard_retries (int): the number of the retries of the failed shards
         """
-    date_of_last_order = database.session.query(Order).order_by(desc(Order.date)).first()
+    date_of_last_order = database.session.query(Order.date).order_by(desc(Order.date)).first()
     if date_of_last_order:
         update_data(
             database=database,
             login=login,
             password=password,
             user_agent=user_agent,
-            start_date=date_of_last_order.date + timedelta(days=1)
+            start_date=date_of_last_order.date - timedelta(days=overlap_days),
+            max_workers=max_workers,
+            use_async=use_async,
+            policy=policy,
+            response_cache=response_cache,
+            shard_days=shard_days,
+            shard_retries=shard_retries,
+            session_store=session_store,
         )
     else:
         raise DatabaseError('It looks like the database is empty. First, try to update it.')
 
 
-def _sort_result(value):
-    """The function to sort record"""
-    return value.order.date
-
-
-def search(database: Database) -> list:
+def search(database: Database, match_all: bool = True, columns: Sequence[str] = COLUMNS,
+           by_relevance: bool = False, limit: int = None, query_cache: QueryCache = None) -> list:
     """The function gets a phrase and searches for it in the database.
+        The typed number is matched with the catalog and the oem numbers without the separators
+        and the leading zeros, the partial and the mistyped numbers by their trigrams,
+        then it is searched in the full-text index as the other phrases, e.g. in the description.
+        The result of the repeated query is taken from the cache until the database is changed.
 
     Args:
         database (Database): database connection
+        match_all (bool): find the products with all words of the phrase, with any word if False
+        columns (Sequence[str]): the searched columns of the products
+        by_relevance (bool): show the lines of the most relevant products first
+        limit (int): the maximum number of the found lines, all lines if not passed
+        query_cache (QueryCache): the cache of the search results, the results are not cached if not passed
     Returns:
-        result (list): with searched data
+        result (list): the rows of the found order lines with the fields of their orders and products
     """
     print('\nTo exit type "exit"')
     print('Search by catalog number/oem number/description')
 
     phrases = input('Search: >>> ').strip().lower()
-    result = []
 
     if phrases == 'exit':
         raise ExitException
 
-    filter_queries = (
-        Product.oem_number,
-        Product.description,
-    )
-    catalog_number = re.compile('[0-9]{8}|[0-9]{4} [0-9]{4}').match(phrases)
-    if catalog_number:
-        if ' ' not in phrases:
-            phrases = f'{phrases[:4]} {phrases[4:]}'
-
-        result += database.session.query(OrderProduct) \
-            .join(Product).join(Order) \
-            .filter(Product.catalog_number == phrases) \
-            .order_by(Order.date).all()
-        return result
-
-    for fq in filter_queries:
-        for phrase in phrases.split(' '):
-            result += database.session.query(OrderProduct) \
-                .join(Product).join(Order).filter(fq.like(f'%{phrase}%'))\
-                .order_by(Order.date).all()
-    result.sort(key=_sort_result)
+    if NUMBER.fullmatch(phrases) and sum(character.isdigit() for character in phrases) >= MIN_NUMBER_DIGITS:
+        query = ('number', number_key(phrases), tuple(phrases.split()), match_all, tuple(sorted(columns)), limit)
+        run = partial(search_order_products_by_number, database.session, phrases, limit, match_all, columns)
+    else:
+        query = ('phrases', tuple(phrases.split()), match_all, tuple(sorted(columns)), by_relevance, limit)
+        run = partial(search_order_products, database.session, phrases, match_all, columns, by_relevance, limit)
 
-    return result
+    if query_cache is None:
+        return run()
+    return query_cache.get_or_search(query, database.state(), run)
 
 
 def draw_table(records: list):
-    """The function draw the table with passed data"""
+    """The function draw the table with passed rows of the order lines, no query is run"""
     console = Console()
     table = Table(show_header=True, header_style='bold magenta', show_lines=True)
     table.add_column('Order number')
@@ -187,14 +397,14 @@ def draw_table(records: list):
     table.add_column('Oem num')
     table.add_column('Description')
     table.add_column('Quantity', justify='right')
-    for order_product in records:
+    for record in records:
         table.add_row(
-            str(order_product.order.order_number),
-            str(order_product.order.date),
-            str(order_product.product.catalog_number),
-            str(order_product.product.oem_number),
-            str(order_product.product.description),
-            str(order_product.quantity),
+            str(record.order_number),
+            str(record.date),
+            str(record.catalog_number),
+            str(record.oem_number),
+            str(record.description),
+            str(record.quantity),
         )
 
     console.print(table)
@@ -203,36 +413,92 @@ def draw_table(records: list):
 if __name__ == '__main__':
     load_dotenv()
 
-    database_path = getenv('DATABASE_PATH')
+    database_path = Path(getenv('DATABASE_PATH'))
     login = getenv('ARBIKO_LOGIN')
     arbiko_password = getenv('ARBIKO_PASSWORD')
     database_password = getenv('DATABASE_PASSWORD')
     user_agent = UserAgent().chrome
     args = load_arguments()
 
-    with Database(database_path, database_password) as database:
+    compression = Compression(args.compression, args.compression_level)
+    with Database(database_path, database_password, compression=compression) as database:
         if not database_path.exists():
             database.create_database()
         else:
             database.load()
 
+        # the caches are encrypted with the key derived from the key of the loaded database file
+        response_cache = None
+        if args.cache or args.replay:
+            response_cache = ResponseCache(
+                Path(f'{database_path}.cache'),
+                database.protection,
+                args.cache_size * 1024 ** 2,
+            )
+        session_store = SessionStore(Path(f'{database_path}.session'), database.protection)
+
         if args.update:
             try:
-                update_data(database, login, arbiko_password, user_agent, args.start_date, args.end_date)
+                update_data(
+                    database,
+                    login,
+                    arbiko_password,
+                    user_agent,
+                    args.start_date,
+                    args.end_date,
+                    max_workers=args.workers,
+                    use_async=args.use_async,
+                    only_new=not args.refetch,
+                    checkpoint_path=Path(f'{database_path}.checkpoint'),
+                    policy=RequestPolicy(timeout=args.timeout, max_retries=args.retries, rate=args.rate),
+                    response_cache=response_cache,
+                    replay=args.replay,
+                    shard_days=args.shard_days,
+                    shard_retries=args.shard_retries,
+                    session_store=session_store,
+                )
             except ValueError as error:
                 print(error)
             except LoginError as error:
                 print(error)
+            except CacheMissError as error:
+                print(error)
 
         if args.refresh:
             try:
-                refresh_data(database, login, database_password, user_agent)
+                refresh_data(
+                    database,
+                    login,
+                    arbiko_password,
+                    user_agent,
+                    session_store,
+                    args.overlap_days,
+                    max_workers=args.workers,
+                    use_async=args.use_async,
+                    policy=RequestPolicy(timeout=args.timeout, max_retries=args.retries, rate=args.rate),
+                    response_cache=response_cache,
+                    shard_days=args.shard_days,
+                    shard_retries=args.shard_retries,
+                )
             except DatabaseError as error:
                 print(error)
+            except LoginError as error:
+                print(error)
 
         if args.search:
+            query_cache = QueryCache(args.search_cache)
             try:
                 while True:
-                    draw_table(search(database))
+                    draw_table(search(
+                        database,
+                        match_all=not args.any_word,
+                        columns=args.search_columns,
+                        by_relevance=args.by_relevance,
+                        limit=args.limit,
+                        query_cache=query_cache,
+                    ))
+                    if args.debug:
+                        print(f'Search cache: {query_cache.hits} hits, {query_cache.misses} misses, '
+                              f'{len(query_cache.entries)} results, {query_cache.size / 1024:.0f} kB')
             except ExitException:
                 pass
@@ -1,17 +1,31 @@
 """The collections of the tests for the tools/arbiko.py module."""
+import asyncio
+from collections import Counter
 from dataclasses import dataclass
-from datetime import datetime
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from datetime import date, datetime, timedelta
 from json import load
+from time import perf_counter, sleep
 from unittest.mock import patch, MagicMock
-from requests import Session
+from requests import HTTPError, Response, Session
 from pathlib import Path
 
 from pytest import MonkeyPatch, fixture
+import httpx
 import pytest
 import responses
 
-from tools.arbiko import Arbiko
-from tools.exceptions import LoginError
+from tools.arbiko import Arbiko, AsyncArbiko, _select_orders, split_date_range
+from tools.cache import OemNumberCache, ResponseCache, SessionStore
+from tools.container import PBKDF2, KeyDerivation
+from tools.exceptions import CacheMissError, LoginError
+from tools.protection import Protection
+from tools.throttle import RequestPolicy
+
+# the cheap key derivation of the database file encrypting the caches
+KEY_DERIVATION = KeyDerivation(PBKDF2, 1000)
 
 
 @dataclass
@@ -51,35 +65,43 @@ class RequestMock(object):
     """Mock request method.
 
     Methods:
-        post(*args, **kwargs): mock the post method in the Session object.
+        request(method: str, url: str, **kwargs): mock the request method in the Session object.
     """
     def __init__(self, *args, **kwargs):
         self.cookies = {}
 
-    def post(self, *args, **kwargs):
-        """Mock the post method in the Session object.
+    def request(self, method: str, url: str, **kwargs) -> Response:
+        """Mock the request method in the Session object.
 
         Args:
-            *args: various arguments
+            method (str): the http method
+            url (str): the requested url
             **kwargs: various keyword arguments
+
+        Returns:
+            response (Response): the empty response with the 200 status code
         """
-        if args[0] == ArbikoUrls.login_url:
+        if method == 'POST' and url == ArbikoUrls.login_url:
             if kwargs['data']['passwd'] == 'incorrect_password':
                 self.cookies = {'logged': ''}
             elif kwargs['data']['passwd'] == 'correct_password':
                 self.cookies = {'logged': 'yes'}
 
+        response = Response()
+        response.status_code = 200
+
+        return response
+
 
 @pytest.fixture()
 def no_requests(monkeypatch: MonkeyPatch):
-    """Fixture for patching the 'post' and the 'request' methods of the Session class
+    """Fixture for patching the 'request' method of the Session class
         to mock HTTP requests.
 
     Args:
         monkeypatch: the pytest monkeypatch fixture object
     """
-    monkeypatch.setattr(Session, 'post', RequestMock.post)
-    monkeypatch.setattr(Session, 'request', RequestMock)
+    monkeypatch.setattr(Session, 'request', RequestMock.request)
 
 
 @pytest.fixture(params=['incorrect_password', 'correct_password'], name='arbiko')
@@ -166,18 +188,391 @@ def test_parse_server_responses(mock_get_oem_number: MagicMock):
         expected_response = file.read()
     responses.add(responses.GET, ArbikoUrls.order_url, body=expected_response)
 
-    with Arbiko('login', 'correct_password', 'user_agent') as arbiko:
+    with Arbiko('login', 'correct_password', 'user_agent', max_workers=1) as arbiko:
         response = arbiko.get_order_history('2013-11-29', '2013-11-29')
 
     with open('tests/responses/expected_result_get_order_history.json') as file:
         expected_result = load(file)
 
     expected_result['215044']['date'] = datetime(2014, 3, 24)
+    expected_result['215044']['status'] = 'zrealizowane'
 
     assert response == expected_result
     assert mock_get_oem_number.call_count == 3
 
 
+@responses.activate
+def test_get_order_history_concurrently():
+    """Test case for fetching the order page and the oem numbers concurrently
+        with an artificial latency of the server.
+    """
+    delay = 0.5
+
+    def delayed_response(body: str):
+        """Return the callback responding with the passed body after the delay."""
+        def callback(_):
+            sleep(delay)
+            return 200, {}, body
+        return callback
+
+    headers = {'set-cookie': 'logged=yes'}
+    responses.add(responses.POST, ArbikoUrls.login_url, adding_headers=headers)
+    with open('tests/responses/expected_response_post_history_url.txt') as file:
+        responses.add(responses.POST, ArbikoUrls.history_url, body=file.read())
+    with open('tests/responses/expected_response_get_order_url.txt') as file:
+        responses.add_callback(responses.GET, ArbikoUrls.order_url, callback=delayed_response(file.read()))
+    with open('tests/responses/expected_good_response_post_search_url.txt') as file:
+        responses.add_callback(responses.POST, ArbikoUrls.search_url, callback=delayed_response(file.read()))
+
+    with Arbiko('login', 'correct_password', 'user_agent', max_workers=4) as arbiko:
+        start = perf_counter()
+        response = arbiko.get_order_history('2013-11-29', '2013-11-29')
+        elapsed = perf_counter() - start
+
+    with open('tests/responses/expected_result_get_order_history.json') as file:
+        expected_result = load(file)
+
+    products = response['215044']['products']
+    assert list(response) == ['215044']
+    assert [product['catalog_number'] for product in products] == [
+        product['catalog_number'] for product in expected_result['215044']['products']
+    ]
+    assert all(product['oem_number'] == 'N/A RL1-2120-000 RL1-3307-000' for product in products)
+    # one order page and three oem lookups in serial take 4 * delay
+    assert elapsed < 3 * delay
+
+
+@responses.activate
+def test_get_order_history_uses_oem_cache():
+    """Test case for skipping the oem number requests of the cached catalog numbers."""
+    headers = {'set-cookie': 'logged=yes'}
+    responses.add(responses.POST, ArbikoUrls.login_url, adding_headers=headers)
+    with open('tests/responses/expected_response_post_history_url.txt') as file:
+        responses.add(responses.POST, ArbikoUrls.history_url, body=file.read())
+    with open('tests/responses/expected_response_get_order_url.txt') as file:
+        responses.add(responses.GET, ArbikoUrls.order_url, body=file.read())
+    with open('tests/responses/expected_good_response_post_search_url.txt') as file:
+        search = responses.add(responses.POST, ArbikoUrls.search_url, body=file.read())
+
+    oem_cache = OemNumberCache()
+    oem_cache.set('4459 4875', '12341234')
+    oem_cache.set('4440 6696', 'abc123as')
+
+    with Arbiko('login', 'correct_password', 'user_agent', oem_cache=oem_cache) as arbiko:
+        response = arbiko.get_order_history('2013-11-29', '2013-11-29')
+
+    oem_numbers = [product['oem_number'] for product in response['215044']['products']]
+    assert oem_numbers == ['12341234', 'abc123as', 'N/A RL1-2120-000 RL1-3307-000']
+    assert search.call_count == 1
+    assert oem_cache.get('4440 3689') == 'N/A RL1-2120-000 RL1-3307-000'
+
+
+@responses.activate
+def test_get_order_list():
+    """Test case for parsing the history list without fetching the order details."""
+    headers = {'set-cookie': 'logged=yes'}
+    responses.add(responses.POST, ArbikoUrls.login_url, adding_headers=headers)
+    with open('tests/responses/expected_response_post_history_url.txt') as file:
+        responses.add(responses.POST, ArbikoUrls.history_url, body=file.read())
+
+    with Arbiko('login', 'correct_password', 'user_agent') as arbiko:
+        response = arbiko.get_order_list('2013-11-29', '2013-11-29')
+
+    assert response == [{
+        'url': 'zob_zam.php3?id=208290',
+        'order_number': '206576',
+        'date': '2013-11-29',
+        'status': 'zrealizowane',
+    }]
+
+
+@pytest.mark.parametrize(
+    'known_orders, expected_numbers',
+    (
+        (None, ['1', '2', '3']),
+        ({}, ['1', '2', '3']),
+        ({1: None, 3: None}, ['2']),
+        ({1: 'zrealizowane', 2: 'w realizacji', 3: None}, ['2']),
+    ),
+)
+def test_select_orders(known_orders: dict, expected_numbers: list):
+    """Test case for selecting the unseen orders and the orders with the changed status.
+
+    Args:
+        known_orders (dict): the stored order numbers with their status
+        expected_numbers (list): the order numbers to fetch
+    """
+    orders = [
+        {'url': f'zob_zam.php3?id={number}', 'order_number': str(number), 'date': '', 'status': 'zrealizowane'}
+        for number in (1, 2, 3)
+    ]
+
+    result = _select_orders(orders, known_orders)
+
+    assert [order['order_number'] for order in result] == expected_numbers
+
+
+@pytest.mark.parametrize(
+    'start_date, end_date, days, expected_result',
+    (
+        ('2022-01-01', '2022-03-10', None, [('2022-01-01', '2022-03-10')]),
+        ('2022-01-01', '2022-03-10', 31, [
+            ('2022-01-01', '2022-01-31'), ('2022-02-01', '2022-03-03'), ('2022-03-04', '2022-03-10'),
+        ]),
+        (date(2022, 1, 1), date(2022, 1, 2), 1, [('2022-01-01', '2022-01-01'), ('2022-01-02', '2022-01-02')]),
+        ('2022-01-02', '2022-01-01', 7, []),
+    ),
+)
+def test_split_date_range(start_date, end_date, days: int, expected_result: list):
+    """Test case for splitting the time period into the shards.
+
+    Args:
+        start_date (str | date): start date of the time period
+        end_date (str | date): end date of the time period
+        days (int): the number of days of a shard
+        expected_result (list): the expected shards
+    """
+    assert split_date_range(start_date, end_date, days) == expected_result
+
+
+@responses.activate
+def test_get_order_lists_isolates_failed_shards():
+    """Test case for fetching the history lists of the shards when one of them fails."""
+    headers = {'set-cookie': 'logged=yes'}
+    responses.add(responses.POST, ArbikoUrls.login_url, adding_headers=headers)
+    with open('tests/responses/expected_response_post_history_url.txt') as file:
+        content = file.read()
+
+    def history_callback(request):
+        if 'data_od=2013-12-01' in request.body:
+            return 500, {}, ''
+        return 200, {}, content
+
+    responses.add_callback(responses.POST, ArbikoUrls.history_url, callback=history_callback)
+
+    policy = RequestPolicy(max_retries=0)
+    with Arbiko('login', 'correct_password', 'user_agent', policy=policy) as arbiko:
+        result = arbiko.get_order_lists([('2013-11-01', '2013-11-30'), ('2013-12-01', '2013-12-31')])
+
+    assert result[0][0] == ('2013-11-01', '2013-11-30')
+    assert [order['order_number'] for order in result[0][1]] == ['206576']
+    assert result[1][0] == ('2013-12-01', '2013-12-31')
+    assert isinstance(result[1][1], HTTPError)
+
+
+@responses.activate
+def test_get_order_history_skips_known_orders():
+    """Test case for skipping the order pages of the known orders."""
+    headers = {'set-cookie': 'logged=yes'}
+    responses.add(responses.POST, ArbikoUrls.login_url, adding_headers=headers)
+    with open('tests/responses/expected_response_post_history_url.txt') as file:
+        responses.add(responses.POST, ArbikoUrls.history_url, body=file.read())
+
+    with Arbiko('login', 'correct_password', 'user_agent') as arbiko:
+        response = arbiko.get_order_history('2013-11-29', '2013-11-29', {206576: None})
+
+    assert response == {}
+
+
+def test_get_order_history_replay(tmp_path: Path):
+    """Test case for fetching the order history only from the response cache in the replay mode.
+
+    Args:
+        tmp_path (Path): the pytest temporary directory
+    """
+    response_cache = ResponseCache(tmp_path / 'cache', Protection('password', tmp_path / 'db.db', KEY_DERIVATION))
+
+    with responses.RequestsMock() as mocked_responses:
+        headers = {'set-cookie': 'logged=yes'}
+        mocked_responses.add(responses.POST, ArbikoUrls.login_url, adding_headers=headers)
+        with open('tests/responses/expected_response_post_history_url.txt') as file:
+            mocked_responses.add(responses.POST, ArbikoUrls.history_url, body=file.read())
+        with open('tests/responses/expected_response_get_order_url.txt') as file:
+            mocked_responses.add(responses.GET, ArbikoUrls.order_url, body=file.read())
+        with open('tests/responses/expected_good_response_post_search_url.txt') as file:
+            mocked_responses.add(responses.POST, ArbikoUrls.search_url, body=file.read())
+
+        with Arbiko('login', 'correct_password', 'user_agent', response_cache=response_cache) as arbiko:
+            expected_result = arbiko.get_order_history('2013-11-29', '2013-11-29')
+
+    with responses.RequestsMock():
+        with Arbiko('login', 'password', 'user_agent', response_cache=response_cache, replay=True) as arbiko:
+            result = arbiko.get_order_history('2013-11-29', '2013-11-29')
+
+            with pytest.raises(CacheMissError):
+                arbiko.get_order_history('2013-11-30', '2013-11-30')
+
+    assert result == expected_result
+    assert arbiko.stats.requests == 0
+
+
+def test_get_oem_number_fetched_live_with_response_cache(tmp_path: Path):
+    """Test case for requesting the search result again after the oem number cache entry expired,
+        even if the search result is in the response cache.
+
+    Args:
+        tmp_path (Path): the pytest temporary directory
+    """
+    response_cache = ResponseCache(tmp_path / 'cache', Protection('password', tmp_path / 'db.db', KEY_DERIVATION))
+    oem_cache = OemNumberCache(negative_ttl=timedelta(0))
+
+    with responses.RequestsMock() as mocked_responses:
+        mocked_responses.add(responses.POST, ArbikoUrls.login_url, adding_headers={'set-cookie': 'logged=yes'})
+        with open('tests/responses/expected_wrong_response_post_search_url.txt') as file:
+            search = mocked_responses.add(responses.POST, ArbikoUrls.search_url, body=file.read())
+
+        with Arbiko('login', 'password', 'user_agent', oem_cache=oem_cache, response_cache=response_cache) as arbiko:
+            results = [arbiko._get_cached_oem_number('0000 0000') for _ in range(2)]
+
+    assert results == ['???? ????', '???? ????']
+    assert search.call_count == 2
+
+
+@pytest.fixture(name='session_store')
+def fixture_session_store(tmp_path: Path) -> SessionStore:
+    """Fixture for creating an instance of the SessionStore class.
+
+    Args:
+        tmp_path (Path): the pytest temporary directory
+
+    Returns:
+        (SessionStore): an empty session store
+    """
+    return SessionStore(tmp_path / 'db.db.session', Protection('password', tmp_path / 'db.db', KEY_DERIVATION))
+
+
+def test_login_retried_after_server_error():
+    """Test case for retrying the login of the Arbiko class after the server error within the request policy."""
+    policy = RequestPolicy(max_retries=1, backoff=0.01)
+    with responses.RequestsMock() as mocked_responses:
+        mocked_responses.add(responses.POST, ArbikoUrls.login_url, status=503)
+        login = mocked_responses.add(responses.POST, ArbikoUrls.login_url, adding_headers={'set-cookie': 'logged=yes'})
+        arbiko = Arbiko('login', 'correct_password', 'user_agent', policy=policy)
+
+        assert arbiko.login() is True
+
+    assert login.call_count == 1
+    assert arbiko.stats.requests == 2
+    assert arbiko.stats.retries == 1
+
+
+def test_login_reuses_saved_session(session_store: SessionStore):
+    """Test case for skipping the login when the saved session is still logged in.
+
+    Args:
+        session_store (SessionStore): an instance of the SessionStore class
+    """
+    with responses.RequestsMock() as mocked_responses:
+        login = mocked_responses.add(responses.POST, ArbikoUrls.login_url, adding_headers={'set-cookie': 'logged=yes'})
+        with Arbiko('login', 'correct_password', 'user_agent', session_store=session_store):
+            pass
+
+    with responses.RequestsMock() as mocked_responses:
+        with open('tests/responses/expected_response_post_history_url.txt') as file:
+            probe = mocked_responses.add(responses.GET, ArbikoUrls.history_url, body=file.read())
+        with Arbiko('login', 'correct_password', 'user_agent', session_store=session_store):
+            pass
+
+    assert login.call_count == 1
+    assert probe.call_count == 1
+    assert probe.calls[0].request.headers['Cookie'] == 'logged=yes'
+
+
+@pytest.mark.parametrize(
+    'login_form',
+    (
+        '<form name=loguj method=post action=loguj1.php3><input type=text name=user>'
+        '<input type=password name=passwd></form>',
+        '<form><input type="text" name="user"><input type="password" name="passwd"></form>',
+    )
+)
+def test_login_if_saved_session_expired(login_form: str, session_store: SessionStore):
+    """Test case for the login when the saved session has expired.
+
+    Args:
+        login_form (str): the login form served instead of the history page, with unquoted or quoted attributes
+        session_store (SessionStore): an instance of the SessionStore class
+    """
+    with responses.RequestsMock() as mocked_responses:
+        mocked_responses.add(responses.POST, ArbikoUrls.login_url, adding_headers={'set-cookie': 'logged=yes'})
+        with Arbiko('login', 'correct_password', 'user_agent', session_store=session_store):
+            pass
+
+    with responses.RequestsMock() as mocked_responses:
+        probe = mocked_responses.add(responses.GET, ArbikoUrls.history_url, body=login_form)
+        login = mocked_responses.add(
+            responses.POST, ArbikoUrls.login_url, adding_headers={'set-cookie': 'logged=yes; Path=/arbos'},
+        )
+        with Arbiko('login', 'correct_password', 'user_agent', session_store=session_store) as arbiko:
+            cookies = [(cookie.name, cookie.path) for cookie in arbiko.session.cookies]
+
+    assert probe.call_count == 1
+    assert login.call_count == 1
+    assert cookies == [('logged', '/arbos')]
+
+
+def test_async_login_reuses_saved_session(session_store: SessionStore, monkeypatch: MonkeyPatch):
+    """Test case for skipping the login of the AsyncArbiko class when the saved session is still logged in.
+
+    Args:
+        session_store (SessionStore): an instance of the SessionStore class
+        monkeypatch: the pytest monkeypatch fixture object
+    """
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append((request.method, str(request.url), request.headers.get('cookie')))
+        return server_responses_handler(request)
+
+    transport = httpx.MockTransport(handler)
+    monkeypatch.setattr('tools.arbiko.AsyncClient', partial(httpx.AsyncClient, transport=transport))
+
+    async def login():
+        async with AsyncArbiko('login', 'correct_password', 'user_agent', session_store=session_store):
+            pass
+
+    asyncio.run(login())
+    asyncio.run(login())
+
+    assert requests == [
+        ('POST', ArbikoUrls.login_url, None),
+        ('GET', ArbikoUrls.history_url, 'logged=yes'),
+    ]
+
+
+def test_async_login_if_saved_session_expired(session_store: SessionStore, monkeypatch: MonkeyPatch):
+    """Test case for the login of the AsyncArbiko class when the saved session has expired
+        and the site serves the login form with the unquoted attributes.
+
+    Args:
+        session_store (SessionStore): an instance of the SessionStore class
+        monkeypatch: the pytest monkeypatch fixture object
+    """
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append((request.method, str(request.url)))
+        if request.method == 'GET' and str(request.url) == ArbikoUrls.history_url:
+            return httpx.Response(200, text='<form name=loguj method=post><input type=password name=passwd></form>')
+        return server_responses_handler(request)
+
+    transport = httpx.MockTransport(handler)
+    monkeypatch.setattr('tools.arbiko.AsyncClient', partial(httpx.AsyncClient, transport=transport))
+
+    async def login():
+        async with AsyncArbiko('login', 'correct_password', 'user_agent', session_store=session_store):
+            pass
+
+    asyncio.run(login())
+    asyncio.run(login())
+
+    assert requests == [
+        ('POST', ArbikoUrls.login_url),
+        ('GET', ArbikoUrls.history_url),
+        ('POST', ArbikoUrls.login_url),
+    ]
+
+
 @pytest.mark.parametrize(
     'catalog_number, expected_result',
     (
@@ -212,3 +607,303 @@ def test_get_oem_number(catalog_number: str, expected_result: str, capsys: fixtu
     if expected_result == '???? ????':
         assert out == 'Problem with product number: 0000 0000\n'
     assert result == expected_result
+
+
+@pytest.mark.parametrize('parser', ('lxml', 'html.parser'))
+@responses.activate
+def test_get_oem_number_if_search_response_empty(parser: str):
+    """Test case for returning the unknown OEM number if the search response is empty.
+
+    Args:
+        parser (str): name of the html parser backend
+    """
+    responses.add(responses.POST, ArbikoUrls.login_url, headers={'set-cookie': 'logged=yes'})
+    responses.add(responses.POST, ArbikoUrls.search_url, body='')
+
+    with Arbiko('login', 'password', 'user_agent', parser=parser) as arbiko:
+        result = arbiko.get_oem_number('4440 3689')
+
+    assert result == '???? ????'
+
+
+def server_responses_handler(request: httpx.Request) -> httpx.Response:
+    """Return the stored Arbiko server response for the passed request.
+
+    Args:
+        request (httpx.Request): the request sent by the async client
+
+    Returns:
+        (httpx.Response): the stored server response
+    """
+    url = str(request.url)
+    if url == ArbikoUrls.login_url:
+        password = dict(httpx.QueryParams(request.content.decode()))['passwd']
+        logged = 'yes' if password == 'correct_password' else ''
+        return httpx.Response(200, headers={'set-cookie': f'logged={logged}'})
+
+    files = {
+        ArbikoUrls.history_url: 'tests/responses/expected_response_post_history_url.txt',
+        ArbikoUrls.order_url: 'tests/responses/expected_response_get_order_url.txt',
+        ArbikoUrls.search_url: 'tests/responses/expected_good_response_post_search_url.txt',
+    }
+    with open(files[url]) as file:
+        return httpx.Response(200, text=file.read())
+
+
+@pytest.fixture(name='async_client')
+def fixture_async_client(monkeypatch: MonkeyPatch):
+    """Fixture for patching the async client of the AsyncArbiko class
+        to respond with the stored server responses.
+
+    Args:
+        monkeypatch: the pytest monkeypatch fixture object
+    """
+    transport = httpx.MockTransport(server_responses_handler)
+    monkeypatch.setattr('tools.arbiko.AsyncClient', partial(httpx.AsyncClient, transport=transport))
+
+
+def test_async_login(arbiko: fixture, async_client: fixture):
+    """Test case for the login of the AsyncArbiko class used as an async context manager.
+
+    Args:
+        arbiko(Arbiko): an instance of the Arbiko class with the tested password
+        async_client: fixture for mocking HTTP requests
+    """
+    async def login():
+        async with AsyncArbiko('login', arbiko.password, 'user_agent'):
+            pass
+
+    if arbiko.password == 'incorrect_password':
+        with pytest.raises(LoginError):
+            asyncio.run(login())
+
+    if arbiko.password == 'correct_password':
+        asyncio.run(login())
+
+
+@responses.activate
+def test_async_get_order_history_parity(async_client: fixture):
+    """Test case for the parity of the order history fetched by the Arbiko and the AsyncArbiko classes.
+
+    Args:
+        async_client: fixture for mocking HTTP requests
+    """
+    headers = {'set-cookie': 'logged=yes'}
+    responses.add(responses.POST, ArbikoUrls.login_url, adding_headers=headers)
+    with open('tests/responses/expected_response_post_history_url.txt') as file:
+        responses.add(responses.POST, ArbikoUrls.history_url, body=file.read())
+    with open('tests/responses/expected_response_get_order_url.txt') as file:
+        responses.add(responses.GET, ArbikoUrls.order_url, body=file.read())
+    with open('tests/responses/expected_good_response_post_search_url.txt') as file:
+        responses.add(responses.POST, ArbikoUrls.search_url, body=file.read())
+
+    with Arbiko('login', 'correct_password', 'user_agent') as arbiko:
+        expected_result = arbiko.get_order_history('2013-11-29', '2013-11-29')
+
+    async def get_order_history():
+        async with AsyncArbiko('login', 'correct_password', 'user_agent') as async_arbiko:
+            return await async_arbiko.get_order_history('2013-11-29', '2013-11-29')
+
+    result = asyncio.run(get_order_history())
+
+    assert result == expected_result
+    assert list(result) == ['215044']
+    assert result['215044']['date'] == datetime(2014, 3, 24)
+
+
+@pytest.mark.parametrize(
+    'catalog_number, expected_result',
+    (
+        ('4440 3689', 'N/A RL1-2120-000 RL1-3307-000'),
+        ('0000 0000', '???? ????')
+    )
+)
+def test_async_get_oem_number(catalog_number: str, expected_result: str, monkeypatch: MonkeyPatch):
+    """Test case for retrieving the OEM number with the AsyncArbiko class.
+
+    Args:
+        catalog_number (str): the catalog number to retrieving the OEM number for
+        expected_result (str): the expected OEM number for the given catalog number
+        monkeypatch: the pytest monkeypatch fixture object
+    """
+    if expected_result != '???? ????':
+        input_file = Path('tests/responses/expected_good_response_post_search_url.txt')
+    else:
+        input_file = Path('tests/responses/expected_wrong_response_post_search_url.txt')
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if str(request.url) == ArbikoUrls.login_url:
+            return httpx.Response(200, headers={'set-cookie': 'logged=yes'})
+        return httpx.Response(200, text=input_file.read_text())
+
+    transport = httpx.MockTransport(handler)
+    monkeypatch.setattr('tools.arbiko.AsyncClient', partial(httpx.AsyncClient, transport=transport))
+
+    async def get_oem_number():
+        async with AsyncArbiko('login', 'password', 'user_agent') as arbiko:
+            return await arbiko.get_oem_number(catalog_number)
+
+    assert asyncio.run(get_oem_number()) == expected_result
+
+
+def test_async_cached_oem_number_retried_after_failure(monkeypatch: MonkeyPatch):
+    """Test case for fetching the oem number again after the previous lookup has failed.
+
+    Args:
+        monkeypatch: the pytest monkeypatch fixture object
+    """
+    responses = iter((
+        httpx.ConnectError('connection refused'),
+        Path('tests/responses/expected_good_response_post_search_url.txt').read_text(),
+    ))
+
+    async def get_oem_number(arbiko: AsyncArbiko, catalog_number: str) -> str:
+        response = next(responses)
+        if isinstance(response, Exception):
+            raise response
+        return arbiko.parser.oem_number(response)
+
+    monkeypatch.setattr(AsyncArbiko, 'get_oem_number', get_oem_number)
+
+    async def lookup():
+        arbiko = AsyncArbiko('login', 'password', 'user_agent')
+        with pytest.raises(httpx.ConnectError):
+            await arbiko._get_cached_oem_number('4440 3689')
+        oem_number = await arbiko._get_cached_oem_number('4440 3689')
+        return oem_number, arbiko.pending
+
+    assert asyncio.run(lookup()) == ('N/A RL1-2120-000 RL1-3307-000', {})
+
+
+class StubServerHandler(BaseHTTPRequestHandler):
+    """The handler of the local stub server injecting the delays and the failures.
+
+    Paths:
+        /flaky: fails with the status 503 twice, then responds
+        /slow: responds after the delay once, then responds immediately
+        /down: always fails with the status 503
+    """
+    hits = Counter()
+
+    def do_GET(self):
+        """Respond to the GET request according to the path."""
+        self.hits[self.path] += 1
+        hits = self.hits[self.path]
+
+        if self.path == '/slow' and hits == 1:
+            sleep(0.5)
+        if self.path == '/down' or (self.path == '/flaky' and hits <= 2):
+            self.send_response(503)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, *_):
+        """Don't log the requests."""
+
+
+@pytest.fixture(name='stub_server')
+def fixture_stub_server():
+    """Fixture for running the local stub server.
+
+    Yields:
+        (str): url of the stub server
+    """
+    StubServerHandler.hits.clear()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubServerHandler)
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield f'http://127.0.0.1:{server.server_port}'
+
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(name='limited_arbiko')
+def fixture_limited_arbiko():
+    """Fixture for creating an instance of Arbiko with the short timeout and backoff.
+
+    Yields:
+        (Arbiko): an instance of the Arbiko class with the open session
+    """
+    arbiko = Arbiko(
+        'login', 'password', 'user_agent',
+        policy=RequestPolicy(timeout=0.2, max_retries=3, backoff=0.01, rate=100.0),
+    )
+    with Session() as arbiko.session:
+        yield arbiko
+
+
+@pytest.mark.parametrize('path', ('/flaky', '/slow'))
+def test_request_retries(path: str, stub_server: str, limited_arbiko: Arbiko):
+    """Test case for retrying the request after the server errors and the timeouts.
+
+    Args:
+        path (str): the path of the stub server
+        stub_server (str): url of the stub server
+        limited_arbiko (Arbiko): an instance of the Arbiko class
+    """
+    response = limited_arbiko._request('GET', stub_server + path)
+
+    expected_retries = 2 if path == '/flaky' else 1
+    assert response.text == 'ok'
+    assert StubServerHandler.hits[path] == expected_retries + 1
+    assert limited_arbiko.stats.retries == expected_retries
+    assert limited_arbiko.stats.failures == 0
+    assert limited_arbiko.limiter.rate < 100.0
+
+
+def test_request_fails_after_all_retries(stub_server: str, limited_arbiko: Arbiko):
+    """Test case for raising the error after all retries failed.
+
+    Args:
+        stub_server (str): url of the stub server
+        limited_arbiko (Arbiko): an instance of the Arbiko class
+    """
+    with pytest.raises(HTTPError):
+        limited_arbiko._request('GET', stub_server + '/down')
+
+    assert StubServerHandler.hits['/down'] == 4
+    assert limited_arbiko.stats.retries == 3
+    assert limited_arbiko.stats.failures == 1
+
+
+def test_request_throttled(stub_server: str):
+    """Test case for waiting for the rate limit.
+
+    Args:
+        stub_server (str): url of the stub server
+    """
+    arbiko = Arbiko('login', 'password', 'user_agent', policy=RequestPolicy(rate=10.0))
+    with Session() as arbiko.session:
+        for _ in range(12):
+            arbiko._request('GET', stub_server + '/ok')
+
+    assert arbiko.stats.requests == 12
+    assert arbiko.stats.throttle_wait > 0
+
+
+def test_async_request_retries(stub_server: str):
+    """Test case for retrying the request of the AsyncArbiko class after the server errors and the timeouts.
+
+    Args:
+        stub_server (str): url of the stub server
+    """
+    async def request():
+        arbiko = AsyncArbiko(
+            'login', 'password', 'user_agent',
+            policy=RequestPolicy(timeout=0.2, max_retries=3, backoff=0.01, rate=100.0),
+        )
+        arbiko.semaphore = asyncio.Semaphore(1)
+        async with httpx.AsyncClient() as arbiko.session:
+            result = [await arbiko._request('GET', stub_server + path) for path in ('/flaky', '/slow')]
+        return arbiko, result
+
+    arbiko, result = asyncio.run(request())
+
+    assert result == ['ok', 'ok']
+    assert arbiko.stats.retries == 3
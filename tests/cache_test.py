@@ -0,0 +1,285 @@
+"""The collections of the tests for the tools/cache.py module."""
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from threading import Event
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch, MagicMock
+
+from requests.cookies import RequestsCookieJar, create_cookie
+import pytest
+
+from tools.cache import OemNumberCache, QueryCache, ResponseCache, SessionStore, search_number
+from tools.container import PBKDF2, KeyDerivation
+from tools.database import Database
+from tools.models import OemNumber, Order, Product
+from tools.protection import Protection
+
+# the cheap key derivation of the database file encrypting the caches
+KEY_DERIVATION = KeyDerivation(PBKDF2, 1000)
+
+
+@pytest.fixture(name='database')
+@patch('tools.database.Protection.save_database_dump')
+def database_connection(mock_protection: MagicMock) -> Database:
+    """Fixture for creating an instance of the Database class.
+
+    Args:
+        mock_protection (MagicMock): the patched 'save_database_dump' method of the Protection class
+
+    Returns:
+        (Database): database session
+    """
+    with Database(Path('database_path.db'), 'password') as database:
+        database.create_database()
+        return database
+
+
+@pytest.mark.parametrize(
+    'catalog_number, expected_result',
+    (
+        ('04459 4875', '4459 4875'),
+        ('4459 4875', '4459 4875'),
+    ),
+)
+def test_search_number(catalog_number: str, expected_result: str):
+    """Test case for stripping the leading zero of the catalog number.
+
+    Args:
+        catalog_number (str): catalog number stored in the order
+        expected_result (str): catalog number to search the product
+    """
+    assert search_number(catalog_number) == expected_result
+
+
+@pytest.mark.parametrize(
+    'oem_number, age, expected_result',
+    (
+        ('RL1-2120', timedelta(days=30), 'RL1-2120'),
+        ('RL1-2120', timedelta(days=200), None),
+        ('???? ????', timedelta(days=1), '???? ????'),
+        ('???? ????', timedelta(days=30), None),
+    ),
+)
+def test_get_expired_entries(oem_number: str, age: timedelta, expected_result: str):
+    """Test case for the time to live of the positive and the negative entries.
+
+    Args:
+        oem_number (str): cached oem number
+        age (timedelta): age of the cached entry
+        expected_result (str): expected result of the 'get' method
+    """
+    cache = OemNumberCache(ttl=timedelta(days=180), negative_ttl=timedelta(days=7))
+    cache.entries['4440 3689'] = (oem_number, datetime.now() - age)
+
+    assert cache.get('4440 3689') == expected_result
+
+
+def test_get_or_fetch_coalesces_concurrent_lookups():
+    """Test case for sharing one request by the concurrent lookups of the same catalog number."""
+    cache = OemNumberCache()
+    started = Event()
+    fetch = MagicMock(side_effect=lambda _: started.wait(1) and 'RL1-2120')
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(cache.get_or_fetch, '4440 3689', fetch) for _ in range(4)]
+        started.set()
+        result = [future.result() for future in futures]
+
+    assert result == ['RL1-2120'] * 4
+    fetch.assert_called_once_with('4440 3689')
+    assert cache.get_or_fetch('4440 3689', fetch) == 'RL1-2120'
+    fetch.assert_called_once()
+
+
+def test_save_and_load(database: Database):
+    """Test case for persisting the entries in the database.
+
+    Args:
+        database (Database): an instance of the 'Database' class
+    """
+    cache = OemNumberCache(database.session)
+    cache.set('4440 3689', 'RL1-2120')
+    cache.set('0000 0000', '???? ????')
+    cache.save()
+
+    assert database.session.query(OemNumber).count() == 2
+    loaded_cache = OemNumberCache(database.session)
+    assert loaded_cache.get('4440 3689') == 'RL1-2120'
+    assert loaded_cache.get('0000 0000') == '???? ????'
+
+
+def test_load_oem_numbers_of_stored_products(database: Database):
+    """Test case for using the oem numbers of the products already stored in the database.
+
+    Args:
+        database (Database): an instance of the 'Database' class
+    """
+    order = Order(order_number=1, date=date(2022, 12, 13))
+    database.session.add(order)
+    database.session.add_all([
+        Product(catalog_number='04459 4875', oem_number='RL1-2120', description='Beben'),
+        Product(catalog_number='4440 6696', oem_number='???? ????', description='Rolka'),
+    ])
+    database.session.commit()
+
+    cache = OemNumberCache(database.session)
+
+    assert cache.get('4459 4875') == 'RL1-2120'
+    assert cache.get('4440 6696') is None
+    cache.save()
+    assert database.session.query(OemNumber).count() == 1
+
+
+@pytest.fixture(name='response_cache')
+def fixture_response_cache(tmp_path: Path) -> ResponseCache:
+    """Fixture for creating an instance of the ResponseCache class.
+
+    Args:
+        tmp_path (Path): the pytest temporary directory
+
+    Returns:
+        (ResponseCache): an empty response cache
+    """
+    return ResponseCache(tmp_path / 'cache', Protection('password', tmp_path / 'db.db', KEY_DERIVATION))
+
+
+def test_response_cache_key():
+    """Test case for the keys of the requests."""
+    key = ResponseCache.key('POST', 'http://arbiko.pl', {'keyw': '4440 3689'})
+
+    assert key == ResponseCache.key('POST', 'http://arbiko.pl', {'keyw': '4440 3689'})
+    assert key != ResponseCache.key('POST', 'http://arbiko.pl', {'keyw': '4440 3688'})
+    assert key != ResponseCache.key('POST', 'http://arbiko.pl', {'keyw': '4440 3689'}, tag='zrealizowane')
+
+
+def test_response_cache_stores_encrypted_content(response_cache: ResponseCache):
+    """Test case for storing and reading the encrypted response.
+
+    Args:
+        response_cache (ResponseCache): an instance of the ResponseCache class
+    """
+    response_cache.set('key', '<html>Rolka HP LJ P2035</html>')
+
+    assert response_cache.get('key') == '<html>Rolka HP LJ P2035</html>'
+    assert response_cache.get('missing') is None
+    assert b'Rolka' not in (response_cache.directory / 'key').read_bytes()
+
+
+def test_response_cache_misses_undecryptable_content(tmp_path: Path):
+    """Test case for fetching again the response encrypted with the other key, e.g. of the older version.
+
+    Args:
+        tmp_path (Path): the pytest temporary directory
+    """
+    ResponseCache(tmp_path / 'cache', Protection('other password', tmp_path / 'db.db', KEY_DERIVATION)) \
+        .set('key', 'response')
+    response_cache = ResponseCache(tmp_path / 'cache', Protection('password', tmp_path / 'db.db', KEY_DERIVATION))
+
+    assert response_cache.get('key') is None
+    assert (response_cache.entries, response_cache.size) == ({}, 0)
+    assert not (response_cache.directory / 'key').exists()
+
+
+def test_response_cache_evicts_least_recently_used(tmp_path: Path):
+    """Test case for removing the least recently used responses above the maximum size.
+
+    Args:
+        tmp_path (Path): the pytest temporary directory
+    """
+    protection = Protection('password', tmp_path / 'db.db', KEY_DERIVATION)
+    response_cache = ResponseCache(tmp_path / 'cache', protection)
+    response_cache.set('first', 'first response')
+    entry_size = response_cache.size
+    response_cache.max_size = 2 * entry_size
+
+    response_cache.set('second', 'second response')
+    response_cache.get('first')
+    response_cache.set('third', 'third response')
+
+    assert response_cache.get('second') is None
+    assert response_cache.get('first') == 'first response'
+    assert sorted(path.name for path in response_cache.directory.iterdir()) == ['first', 'third']
+    assert ResponseCache(tmp_path / 'cache', protection).size == response_cache.size
+
+
+def test_session_store_save_and_load(tmp_path: Path):
+    """Test case for saving and restoring the encrypted cookies of the session.
+
+    Args:
+        tmp_path (Path): the pytest temporary directory
+    """
+    protection = Protection('password', tmp_path / 'db.db', KEY_DERIVATION)
+    session_store = SessionStore(tmp_path / 'db.db.session', protection)
+    jar = RequestsCookieJar()
+    jar.set_cookie(create_cookie('logged', 'yes', domain='arbiko.pl', path='/arbos'))
+    jar.set_cookie(create_cookie('expired', 'yes', domain='arbiko.pl', expires=1))
+    session_store.save(jar)
+
+    restored_jar = RequestsCookieJar()
+
+    assert session_store.load(restored_jar) is True
+    assert [(cookie.name, cookie.value, cookie.domain, cookie.path) for cookie in restored_jar] == [
+        ('logged', 'yes', 'arbiko.pl', '/arbos'),
+    ]
+    assert b'logged' not in session_store.path.read_bytes()
+
+
+def test_session_store_load_if_session_is_not_saved(tmp_path: Path):
+    """Test case for restoring the missing or undecryptable cookies.
+
+    Args:
+        tmp_path (Path): the pytest temporary directory
+    """
+    path = tmp_path / 'db.db.session'
+    protection = Protection('password', tmp_path / 'db.db', KEY_DERIVATION)
+    other_protection = Protection('other password', tmp_path / 'db.db', KEY_DERIVATION)
+    jar = RequestsCookieJar()
+    jar.set_cookie(create_cookie('logged', 'yes'))
+    SessionStore(path, protection).save(jar)
+
+    assert SessionStore(tmp_path / 'missing.session', protection).load(jar) is False
+    assert SessionStore(path, other_protection).load(RequestsCookieJar()) is False
+
+    SessionStore(path, protection).remove()
+    assert not path.exists()
+
+
+def test_query_cache_returns_cached_result():
+    """Test case for searching the repeated query once and counting the hits and the misses."""
+    query_cache = QueryCache()
+    search = MagicMock(return_value=[(1, 'Rolka')])
+
+    assert query_cache.get_or_search(('rolka',), (1, 1), search) == [(1, 'Rolka')]
+    assert query_cache.get_or_search(('rolka',), (1, 1), search) == [(1, 'Rolka')]
+
+    search.assert_called_once()
+    assert (query_cache.hits, query_cache.misses) == (1, 1)
+
+
+def test_query_cache_cleared_if_state_changed():
+    """Test case for searching the query again after the database was changed."""
+    query_cache = QueryCache()
+    query_cache.get_or_search(('rolka',), (1, 1), lambda: [(1, 'Rolka')])
+
+    assert query_cache.get_or_search(('rolka',), (2, 1), lambda: [(2, 'Rolka')]) == [(2, 'Rolka')]
+    assert query_cache.get_or_search(('rolka',), (2, 2), lambda: []) == []
+    assert (query_cache.hits, query_cache.misses) == (0, 3)
+
+
+def test_query_cache_evicts_least_recently_used():
+    """Test case for removing the least recently used results above the maximum number and size."""
+    query_cache = QueryCache(max_entries=2)
+    for query in ('a', 'b', 'a', 'c'):
+        query_cache.get_or_search(query, (0, 0), lambda: [(query,)])
+
+    assert list(query_cache.entries) == ['a', 'c']
+
+    size = query_cache.size
+    query_cache.max_size = size
+    query_cache.get_or_search('d', (0, 0), lambda: [('d',)])
+
+    assert list(query_cache.entries) == ['c', 'd']
+    assert query_cache.size <= size
+
+    query_cache.get_or_search('large', (0, 0), lambda: [('x' * size,)])
+    assert 'large' not in query_cache.entries
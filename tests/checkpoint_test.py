@@ -0,0 +1,57 @@
+"""The collections of the tests for the tools/checkpoint.py module."""
+from pathlib import Path
+
+from tools.checkpoint import Checkpoint
+
+
+def test_load_if_checkpoint_doesnt_exist(tmp_path: Path):
+    """Test case for loading the checkpoint if there is no interrupted update.
+
+    Args:
+        tmp_path (Path): the pytest temporary directory
+    """
+    checkpoint = Checkpoint(tmp_path / 'db.checkpoint', '2022-01-01', '2022-12-31')
+
+    assert checkpoint.load() is False
+    assert checkpoint.orders == []
+    assert checkpoint.start_date == '2022-01-01'
+
+
+def test_extend_load_and_remove(tmp_path: Path):
+    """Test case for saving, loading and removing the checkpoint.
+
+    Args:
+        tmp_path (Path): the pytest temporary directory
+    """
+    path = tmp_path / 'db.checkpoint'
+    checkpoint = Checkpoint(path, '2022-01-01', '2022-12-31')
+    checkpoint.extend(['215044'])
+    checkpoint.extend(('215045',))
+
+    loaded_checkpoint = Checkpoint(path, '2023-01-01', '2023-12-31')
+
+    assert loaded_checkpoint.load() is True
+    assert loaded_checkpoint.start_date == '2022-01-01'
+    assert loaded_checkpoint.end_date == '2022-12-31'
+    assert loaded_checkpoint.orders == [215044, 215045]
+    assert list(tmp_path.iterdir()) == [path]
+
+    loaded_checkpoint.remove()
+    assert not path.exists()
+
+
+def test_add_shard(tmp_path: Path):
+    """Test case for saving and loading the completed shards.
+
+    Args:
+        tmp_path (Path): the pytest temporary directory
+    """
+    path = tmp_path / 'db.checkpoint'
+    checkpoint = Checkpoint(path, '2022-01-01', '2022-12-31')
+    checkpoint.add_shard(('2022-01-01', '2022-01-31'))
+
+    loaded_checkpoint = Checkpoint(path, '2022-01-01', '2022-12-31')
+
+    assert loaded_checkpoint.load() is True
+    assert loaded_checkpoint.shards == [('2022-01-01', '2022-01-31')]
+    assert loaded_checkpoint.orders == []
@@ -0,0 +1,223 @@
+"""The collections of the tests for the tools/container.py module."""
+from io import BytesIO
+import os
+
+import pytest
+
+from tools import container
+from tools.exceptions import CorruptedFileError
+
+KEY = bytes(range(32))
+KEY_DERIVATION = container.KeyDerivation(container.PBKDF2, 1000, 0, 0, bytes(16))
+
+
+def key_for(key_derivation: container.KeyDerivation) -> bytes:
+    """Return the test key for the key derivation of the test containers."""
+    assert key_derivation == KEY_DERIVATION
+    return KEY
+
+
+def encrypted(data: bytes, chunk_size: int = 4, compression: container.Compression = container.Compression()) -> bytes:
+    """Return the container of the data.
+
+    Args:
+        data (bytes): the data to encrypt
+        chunk_size (int): the size of the chunk in bytes
+        compression (Compression): the compression of the chunks
+
+    Returns:
+        (bytes): the content of the container
+    """
+    file = BytesIO()
+    container.write(file, data, KEY, KEY_DERIVATION, compression, chunk_size=chunk_size, max_workers=2)
+    return file.getvalue()
+
+
+def chunk_offsets(content: bytes) -> list:
+    """Return the offsets of the chunk records of the container."""
+    offsets = []
+    offset = container.HEADER.size
+    while True:
+        offsets.append(offset)
+        length = container.CHUNK_LENGTH.unpack_from(content, offset)[0]
+        offset += container.CHUNK_LENGTH.size + (length & ~container.CHUNK_MARKS)
+        if length & container.LAST_CHUNK:
+            return offsets
+
+
+@pytest.mark.parametrize('data', (b'', b'abc', b'abcd', b'abcdefghijklm', os.urandom(1000)))
+def test_write_and_read(data: bytes):
+    """Test case for encrypting and decrypting the data of any size.
+
+    Args:
+        data (bytes): the data to encrypt
+    """
+    content = encrypted(data)
+
+    assert container.is_container(content)
+    assert len(chunk_offsets(content)) == max(1, -(-len(data) // 4))
+    assert container.read(BytesIO(content), key_for, max_workers=2) == data
+
+
+def test_read_with_wrong_key():
+    """Test case for decrypting the container with the wrong key."""
+    with pytest.raises(CorruptedFileError):
+        container.read(BytesIO(encrypted(b'abcdefghijklm')), lambda _: bytes(32))
+
+
+def test_read_tampered_chunk():
+    """Test case for decrypting the container with the modified chunk."""
+    content = bytearray(encrypted(b'abcdefghijklm'))
+    content[chunk_offsets(content)[1] + container.CHUNK_LENGTH.size] ^= 1
+
+    with pytest.raises(CorruptedFileError, match='chunk 1'):
+        container.read(BytesIO(content), key_for)
+
+
+def test_read_reordered_chunks():
+    """Test case for decrypting the container with the swapped chunks."""
+    content = encrypted(b'abcdefghijklm')
+    first, second, third, _ = chunk_offsets(content)
+    content = content[:first] + content[second:third] + content[first:second] + content[third:]
+
+    with pytest.raises(CorruptedFileError, match='chunk 0'):
+        container.read(BytesIO(content), key_for)
+
+
+@pytest.mark.parametrize('cut', (1, container.MAC_SIZE, container.MAC_SIZE + 1))
+def test_read_cut_off_file(cut: int):
+    """Test case for decrypting the container without the end of the file.
+
+    Args:
+        cut (int): the number of the removed bytes
+    """
+    content = encrypted(b'abcdefghijklm')
+
+    with pytest.raises(CorruptedFileError):
+        container.read(BytesIO(content[:-cut]), key_for)
+
+
+def test_read_modified_mac():
+    """Test case for decrypting the container with the modified file authentication."""
+    content = bytearray(encrypted(b'abcdefghijklm'))
+    content[-1] ^= 1
+
+    with pytest.raises(CorruptedFileError, match='file failed'):
+        container.read(BytesIO(content), key_for)
+
+
+def test_read_modified_key_derivation():
+    """Test case for decrypting the container with the modified salt of the header."""
+    content = bytearray(encrypted(b'abcdefghijklm'))
+    content[container.PREFIX.size + 8] ^= 1
+
+    with pytest.raises(CorruptedFileError, match='chunk 0'):
+        container.read(BytesIO(content), lambda _: KEY)
+
+
+@pytest.mark.parametrize('algorithm, cost', ((container.PBKDF2, 1000), (container.SCRYPT, 2 ** 10)))
+def test_key_derivation(algorithm: int, cost: int):
+    """Test case for deriving the key with the salt and the parameters.
+
+    Args:
+        algorithm (int): the key derivation function
+        cost (int): the cost of the key derivation
+    """
+    key_derivation = container.KeyDerivation(algorithm, cost, 8, 1)
+    key = key_derivation.derive(b'password')
+
+    assert len(key) == 32
+    assert key_derivation.derive(b'password') == key
+    assert container.KeyDerivation(algorithm, cost, 8, 1).derive(b'password') != key
+
+
+@pytest.mark.parametrize('key_derivation', (
+    container.KeyDerivation(3, 1000),
+    container.KeyDerivation(container.SCRYPT, 1000),
+))
+def test_key_derivation_with_unknown_parameters(key_derivation: container.KeyDerivation):
+    """Test case for deriving the key with the unknown algorithm or the invalid parameters.
+
+    Args:
+        key_derivation (KeyDerivation): the key derivation read from the header
+    """
+    with pytest.raises(CorruptedFileError):
+        key_derivation.derive(b'password')
+
+
+@pytest.mark.parametrize('codec', container.AVAILABLE_CODECS)
+def test_write_and_read_compressed(codec: str):
+    """Test case for compressing the chunks before the encryption.
+
+    Args:
+        codec (str): the compression codec
+    """
+    data = b'SQLite format 3\x00' * 768 + os.urandom(1000)
+    content = encrypted(data, chunk_size=4096, compression=container.Compression(codec))
+
+    lengths = [container.CHUNK_LENGTH.unpack_from(content, offset)[0] for offset in chunk_offsets(content)]
+    compressed = [bool(length & container.COMPRESSED_CHUNK) for length in lengths]
+    assert container.read(BytesIO(content), key_for) == data
+    assert content[container.PREFIX.size + 24] == container.CODECS[codec]
+    # the chunk of the random bytes doesn't get smaller
+    assert compressed == ([True, True, True, False] if codec != 'none' else [False] * 4)
+    assert len(content) < len(data) or codec == 'none'
+
+
+def test_read_modified_compressed_mark():
+    """Test case for decrypting the container with the removed mark of the compressed chunk."""
+    content = bytearray(encrypted(b'a' * 100, chunk_size=100))
+    offset = chunk_offsets(content)[0]
+    content[offset] &= ~(container.COMPRESSED_CHUNK >> 24)
+
+    with pytest.raises(CorruptedFileError, match='chunk 0'):
+        container.read(BytesIO(content), key_for)
+
+
+@pytest.mark.parametrize('codec', ('zlib', 'lzma'))
+def test_decompress_chunk_longer_than_chunk_size(codec: str):
+    """Test case for decompressing the chunk expanding beyond the chunk size.
+
+    Args:
+        codec (str): the compression codec
+    """
+    compression = container.Compression(codec)
+
+    with pytest.raises(CorruptedFileError, match='longer'):
+        compression.decompress(compression.compress(bytes(1000)), 999)
+
+
+def test_compression_with_unknown_codec():
+    """Test case for the unknown compression codec."""
+    with pytest.raises(ValueError):
+        container.Compression('gzip')
+
+
+@pytest.mark.parametrize(
+    'codec, level',
+    (('zlib', 10), ('zlib', -2), ('lzma', 10), ('lzma', -1), ('zstd', 23), ('zstd', -129), ('none', 1), ('zlib', 200)),
+)
+def test_compression_with_invalid_level(codec: str, level: int):
+    """Test case for the compression level out of the range of the codec.
+
+    Args:
+        codec (str): the compression codec
+        level (int): the invalid compression level
+    """
+    with pytest.raises(ValueError, match=codec):
+        container.Compression(codec, level)
+
+
+@pytest.mark.parametrize('codec', container.AVAILABLE_CODECS)
+def test_write_and_read_with_extreme_levels(codec: str):
+    """Test case for saving and reading the container with the lowest and the highest level of the codec.
+
+    Args:
+        codec (str): the compression codec
+    """
+    data = b'SQLite format 3\x00' * 768
+    levels = container.LEVELS[codec]
+
+    for level in (levels.start, levels.stop - 1):
+        content = encrypted(data, chunk_size=4096, compression=container.Compression(codec, level))
+        assert container.read(BytesIO(content), key_for) == data
@@ -1,11 +1,22 @@
 """The collections of the tests for the tools/database.py module."""
 from pathlib import Path
 
-from unittest.mock import patch, call
+from datetime import date
+from unittest.mock import patch
+from sqlalchemy import desc, inspect, select, text
+from sqlalchemy.exc import IntegrityError
 import pytest
 
 import tools.database
+from tools.container import PBKDF2, KeyDerivation
 from tools.database import Database
+from tools.exceptions import CorruptedFileError
+from tools.models import Base, Order, OrderProduct, Product
+from tools.protection import Protection
+from tools.search import SEARCH_INDEXES, search_order_products
+
+# the cheap key derivation of the saved test files
+KEY_DERIVATION = KeyDerivation(PBKDF2, 1000)
 
 
 @patch('tools.database.Database.create_session')
@@ -46,15 +57,17 @@ def test_create_database_if_exists(mock_path, mock_base):
     mock_path.assert_called_once()
 
 
+@patch('tools.database.create_search_index')
 @patch('tools.models.Base.metadata.create_all')
 @patch('tools.database.Path.exists', return_value=False)
-def test_create_database_if_not_exists(mock_path, mock_base):
+def test_create_database_if_not_exists(mock_path, mock_base, mock_create_search_index):
     """Test that the database file was created if the 'create_database' method was called
         and the database file don't exist.
 
     Args:
         mock_path: mock object for 'tools.database.Path.exists' method
         mock_base: mock object for 'tools.models.Base.metadata.create_all' method
+        mock_create_search_index: mock object for 'tools.database.create_search_index' function
     """
     database = Database(Path('database.db'), 'password')
 
@@ -62,6 +75,7 @@ def test_create_database_if_not_exists(mock_path, mock_base):
 
     mock_base.assert_called_once()
     mock_path.assert_called_once()
+    mock_create_search_index.assert_called_once()
 
 
 @patch('tools.database.Session')
@@ -86,33 +100,333 @@ def test_dump_database(mock_create_engine):
     Args:
         mock_create_engine: mock object for 'tools.database.create_engine' method
     """
-    expected_result = 'some data'
-    mock_create_engine.return_value.raw_connection.return_value.iterdump.return_value = expected_result
+    connection = mock_create_engine.return_value.raw_connection.return_value
+    connection.driver_connection.serialize.return_value = b'SQLite format 3\x00image'
     database = Database(Path('db.db'), 'password')
 
     result = database.dump()
     mock_create_engine.assert_called()
 
-    assert result == b's\no\nm\ne\n \nd\na\nt\na\n'
+    assert result == b'SQLite format 3\x00image'
+    connection.close.assert_called_once()
+
+
+def stored_database() -> Database:
+    """Return the database with the stored order of the product with the semicolon in the description."""
+    database = Database(Path('db.db'), 'password')
+    database.create_session()
+    database.create_database()
+    order = Order(order_number=215044, date=date(2014, 3, 24), status='zrealizowane')
+    product = Product(catalog_number='4440 3689', oem_number='00qwerty', description='Rolka; HP LJ P2035')
+    database.session.add(OrderProduct(order=order, product=product, quantity=2))
+    database.session.commit()
+
+    return database
+
 
+def older_text_dump(database: Database) -> bytes:
+    """Return the sql text dump of the database without the full-text indexes, as stored before the image format."""
+    lines = database.engine.raw_connection().driver_connection.iterdump()
+    return '\n'.join(
+        line for line in lines
+        if not any(name in line for name in SEARCH_INDEXES) and 'writable_schema' not in line
+    ).encode('utf-8')
 
-@patch('tools.database.text')
-@patch('tools.database.Protection.decrypt_file', return_value='script1')
-@patch('tools.database.Session.execute')
-def test_load_data_to_database(mock_session, mock_protection, mock_text):
-    """Test the 'load' method of the 'Database' class to ensure data is loaded correctly.
+
+@pytest.mark.parametrize('file_format', ('image', 'sql text'))
+def test_load_data_to_database(file_format: str):
+    """Test the 'load' method of the 'Database' class loading the image and the older sql text dump.
 
     Args:
-        mock_session: mock object for 'tools.database.Session.execute' method
-        mock_protection: mock object for 'tools.database.Protection.decrypt_file' method
-        mock_text: mock object for 'tools.database.text' method
+        file_format (str): the format of the stored database
+    """
+    stored = stored_database()
+    if file_format == 'image':
+        content = stored.dump()
+    else:
+        content = older_text_dump(stored)
+
+    database = Database(Path('db.db'), 'password')
+    database.create_session()
+    with patch('tools.database.Protection.decrypt_file', return_value=content) as mock_decrypt_file:
+        database.load()
+
+    mock_decrypt_file.assert_called_once()
+    line = database.session.query(OrderProduct).one()
+    assert (line.order.order_number, line.product.description, line.quantity) == (215044, 'Rolka; HP LJ P2035', 2)
+    assert [row.id for row in search_order_products(database.session, 'rolka hp')] == [line.id]
+    assert database.dump().startswith(b'SQLite format 3\x00')
+
+
+def test_migrate_deduplicates_older_database():
+    """Test the 'migrate' method upgrading the database stored without the status, the search keys and the indexes.
+        The lines of the same product in one order are summed, the lines of the order stored twice are dropped.
     """
     database = Database(Path('db.db'), 'password')
     database.create_session()
+    scripts = (
+        'CREATE TABLE products (id INTEGER NOT NULL, catalog_number VARCHAR, oem_number VARCHAR, '
+        'description VARCHAR, PRIMARY KEY (id))',
+        'CREATE TABLE orders (id INTEGER NOT NULL, order_number INTEGER, date DATE, PRIMARY KEY (id))',
+        'CREATE TABLE orders_products (id INTEGER NOT NULL, order_id INTEGER, product_id INTEGER, '
+        'quantity INTEGER, PRIMARY KEY (id))',
+        "INSERT INTO products VALUES (1, '4440 3689', '00qwerty', 'Rolka'), (2, '4440 3689', '00qwerty', 'Rolka'), "
+        "(3, '4459 4875', '12341234', 'Beben')",
+        "INSERT INTO orders VALUES (1, 215044, '2014-03-24'), (2, 215044, '2014-03-24'), (3, 215045, '2014-03-25')",
+        'INSERT INTO orders_products VALUES (1, 1, 1, 1), (2, 1, 3, 2), (3, 2, 2, 1), (4, 2, 3, 2), (5, 3, 2, 4), '
+        '(6, 3, 1, 3)',
+    )
+    with database.engine.begin() as connection:
+        for script in scripts:
+            connection.execute(text(script))
+    Base.metadata.create_all(database.engine)
+
+    with database.engine.begin() as connection:
+        Database.migrate(connection)
+
+    with database.engine.begin() as connection:
+        products = connection.execute(text('SELECT id, catalog_key, oem_key FROM products ORDER BY id')).all()
+        orders = connection.execute(text('SELECT id, order_number FROM orders ORDER BY id')).all()
+        lines = connection.execute(
+            text('SELECT id, order_id, product_id, quantity FROM orders_products ORDER BY id')
+        ).all()
+        indexes = {index['name'] for index in inspect(connection).get_indexes('orders_products')}
+        columns = [column['name'] for column in inspect(connection).get_columns('orders')]
+        product_indexes = {index['name'] for index in inspect(connection).get_indexes('products')}
+        keys = connection.execute(text("SELECT rowid FROM products_keys WHERE products_keys MATCH '594'")).all()
+
+        assert products == [(1, '44403689', 'QWERTY'), (3, '44594875', '12341234')]
+        assert {'ix_products_catalog_key', 'ix_products_oem_key'} <= product_indexes
+        assert keys == [(3,)]
+        assert orders == [(1, 215044), (3, 215045)]
+        assert lines == [(1, 1, 1, 1), (2, 1, 3, 2), (5, 3, 1, 7)]
+        assert indexes == {'uq_orders_products_order_product', 'ix_orders_products_product_id'}
+        assert columns == ['id', 'order_number', 'date', 'status']
+        with pytest.raises(IntegrityError):
+            connection.execute(text("INSERT INTO orders (order_number) VALUES (215044)"))
+
 
+def query_plan(database: Database, statement) -> list:
+    """Return the details of the query plan of the statement.
+
+    Args:
+        database (Database): an instance of the 'Database' class
+        statement: the sqlalchemy statement
+
+    Returns:
+        (list): the details of the query plan steps
+    """
+    sql = statement.compile(database.engine, compile_kwargs={'literal_binds': True})
+    return [row[3] for row in database.session.execute(text(f'EXPLAIN QUERY PLAN {sql}'))]
+
+
+@pytest.mark.parametrize(
+    'name, indexes',
+    (
+        ('refresh', ['ix_orders_date']),
+        ('search by catalog number', ['uq_products_identity', 'ix_orders_products_product_id']),
+        ('known order', ['uq_orders_order_number']),
+        ('product identity', ['uq_products_identity']),
+        ('order lines', ['uq_orders_products_order_product']),
+    ),
+)
+def test_queries_use_indexes(name: str, indexes: list):
+    """Test that the hot queries search the indexes instead of scanning the tables.
+
+    Args:
+        name (str): name of the tested query
+        indexes (list): names of the indexes expected in the query plan
+    """
+    database = Database(Path('db.db'), 'password')
+    database.create_session()
+    database.create_database()
+    statements = {
+        'refresh': select(Order).order_by(desc(Order.date)).limit(1),
+        'search by catalog number': select(OrderProduct).join(Product).join(Order)
+        .where(Product.catalog_number == '4440 3689').order_by(Order.date),
+        'known order': select(Order.id).where(Order.order_number == 215044),
+        'product identity': select(Product.id).where(
+            Product.catalog_number == '4440 3689', Product.oem_number == '00qwerty', Product.description == 'Rolka',
+        ),
+        'order lines': select(OrderProduct).where(OrderProduct.order_id == 1),
+    }
+
+    plan = query_plan(database, statements[name])
+
+    assert not [step for step in plan if step.startswith('SCAN') and 'INDEX' not in step], plan
+    for index in indexes:
+        assert any(index in step for step in plan), plan
+
+
+@pytest.mark.parametrize('file_format, change, expected_result', (
+    ('image', False, None),
+    ('image', True, 'journal'),
+    ('sql text', False, 'file'),
+))
+def test_save_on_exit_only_if_changed(file_format: str, change: bool, expected_result: str):
+    """Test that the database is saved on exit only if it was changed or loaded from the older format.
+        The changes of the loaded image are appended to the journal.
+
+    Args:
+        file_format (str): the format of the stored database
+        change (bool): store the order after the load
+        expected_result (str): the database is saved to the file or to the journal, not saved if None
+    """
+    stored = stored_database()
+    if file_format == 'image':
+        content = stored.dump()
+    else:
+        content = older_text_dump(stored)
+
+    with patch('tools.database.Protection.decrypt_file', return_value=content), \
+            patch('tools.database.Protection.save_database_dump') as mock_save_database_dump, \
+            patch('tools.database.Journal.append') as mock_append:
+        with Database(Path('db.db'), 'password') as database:
+            database.load()
+            database.session.query(OrderProduct).all()
+            if change:
+                database.session.add(Order(order_number=215045, date=date(2014, 3, 25)))
+                database.session.commit()
+
+    assert mock_save_database_dump.called is (expected_result == 'file')
+    assert mock_append.called is (expected_result == 'journal')
+
+
+def saved_database(path: Path) -> Database:
+    """Return the database loaded from the file with the stored order.
+
+    Args:
+        path (Path): database path
+
+    Returns:
+        (Database): the loaded database with the open session
+    """
+    stored = stored_database()
+    stored.protection = Protection('password', path, KEY_DERIVATION)
+    stored.protection.save_database_dump(stored.dump())
+
+    database = Database(path, 'password', KEY_DERIVATION)
+    database.create_session()
     database.load()
+    return database
+
+
+def test_save_changes_to_journal(tmp_path: Path):
+    """Test that the changed rows are appended to the journal and replayed on the next load.
+
+    Args:
+        tmp_path (Path): the pytest temporary directory
+    """
+    database = saved_database(tmp_path / 'database.db')
+    saved_file = database.database_path.read_bytes()
+    order = Order(order_number=215045, date=date(2014, 3, 25))
+    database.session.add(OrderProduct(order=order, product_id=1, quantity=5))
+    database.session.query(Product).update({Product.description: 'Rolka HP LJ P2035'})
+    database.session.delete(database.session.get(OrderProduct, 1))
+    database.session.commit()
+
+    database.save()
+    database.session.query(Order).filter(Order.order_number == 215044).update({Order.status: 'anulowane'})
+    database.session.commit()
+    database.save()
+
+    assert database.database_path.read_bytes() == saved_file
+    assert database.journal.path.exists()
+    with Database(database.database_path, 'password') as loaded:
+        loaded.load()
+        assert not loaded.is_changed()
+        lines = loaded.session.query(OrderProduct).all()
+        assert [(line.order.order_number, line.product.description, line.quantity) for line in lines] == [
+            (215045, 'Rolka HP LJ P2035', 5),
+        ]
+        assert loaded.session.query(Order.status).order_by(Order.id).all() == [('anulowane',), (None,)]
+        assert [row.id for row in search_order_products(loaded.session, 'rolka hp p2035')] == [lines[0].id]
+
+
+def test_not_saved_after_failed_load(tmp_path: Path):
+    """Test that the database isn't saved on exit after the load has failed, e.g. with the wrong password,
+        so the error of the load is raised and the files are kept.
+
+    Args:
+        tmp_path (Path): the pytest temporary directory
+    """
+    database = saved_database(tmp_path / 'database.db')
+    saved_file = database.database_path.read_bytes()
+
+    with pytest.raises(CorruptedFileError):
+        with Database(database.database_path, 'wrong password') as loaded:
+            loaded.load()
+
+    with pytest.raises(ValueError):
+        with Database(database.database_path, 'password'):
+            raise ValueError
+
+    assert database.database_path.read_bytes() == saved_file
+    assert not database.journal.path.exists()
+
+
+@pytest.mark.parametrize('damage', ('tampered', 'cut off'))
+def test_load_damaged_journal(damage: str, tmp_path: Path):
+    """Test that the complete segment failing the authentication fails the load without touching the files,
+        the segment cut off by the interrupted save is skipped and the previous segments are replayed.
+
+    Args:
+        damage (str): the damage of the last segment
+        tmp_path (Path): the pytest temporary directory
+    """
+    database = saved_database(tmp_path / 'database.db')
+    for order_number in (215045, 215046):
+        database.session.add(Order(order_number=order_number, date=date(2014, 3, 25)))
+        database.session.commit()
+        database.save()
+    saved_file = database.database_path.read_bytes()
+    journal = bytearray(database.journal.path.read_bytes())
+    if damage == 'tampered':
+        journal[-40] ^= 1
+    else:
+        journal = journal[:-10]
+    database.journal.path.write_bytes(journal)
+
+    if damage == 'tampered':
+        with pytest.raises(CorruptedFileError):
+            with Database(database.database_path, 'password') as loaded:
+                loaded.load()
+
+        assert database.database_path.read_bytes() == saved_file
+        assert database.journal.path.read_bytes() == journal
+    else:
+        with Database(database.database_path, 'password') as loaded:
+            loaded.load()
+            assert [order.order_number for order in loaded.session.query(Order)] == [215044, 215045]
+
+
+@pytest.mark.parametrize('compaction', ('schema', 'full journal'))
+def test_save_compacts_journal(compaction: str, tmp_path: Path):
+    """Test that the whole database file is saved and the journal is removed
+        if the schema was changed or the journal is full.
+
+    Args:
+        compaction (str): the reason of saving the whole database file
+        tmp_path (Path): the pytest temporary directory
+    """
+    database = saved_database(tmp_path / 'database.db')
+    database.session.add(Order(order_number=215045, date=date(2014, 3, 25)))
+    database.session.commit()
+    database.save()
+    saved_file = database.database_path.read_bytes()
+
+    database.session.add(Order(order_number=215046, date=date(2014, 3, 26)))
+    database.session.commit()
+    if compaction == 'schema':
+        database.session.execute(text('CREATE INDEX ix_orders_status ON orders (status)'))
+        database.save()
+    else:
+        with patch('tools.journal.COMPACTION_RATIO', 0), patch('tools.journal.MIN_COMPACTION_SIZE', 0):
+            database.save()
 
-    calls = [call(mock_text('script1'))]
-    mock_session.assert_has_calls(calls)
-    mock_protection.assert_called_once()
-    assert mock_session.call_count == 1
+    assert database.database_path.read_bytes() != saved_file
+    assert not database.journal.path.exists()
+    loaded = Database(database.database_path, 'password')
+    loaded.create_session()
+    loaded.load()
+    assert [order.order_number for order in loaded.session.query(Order)] == [215044, 215045, 215046]
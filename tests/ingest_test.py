@@ -0,0 +1,183 @@
+"""The collections of the tests for the tools/ingest.py module."""
+from datetime import date
+from json import load
+from pathlib import Path
+from unittest.mock import patch, MagicMock
+
+import pytest
+
+from tools.checkpoint import Checkpoint
+from tools.database import Database
+from tools.ingest import OrderIngest
+from tools.models import Order, OrderProduct, Product
+
+
+@pytest.fixture(name='database')
+@patch('tools.database.Protection.save_database_dump')
+def database_connection(mock_protection: MagicMock) -> Database:
+    """Fixture for creating an instance of the Database class.
+
+    Args:
+        mock_protection (MagicMock): the patched 'save_database_dump' method of the Protection class
+
+    Returns:
+        (Database): database session
+    """
+    with Database(Path('database_path.db'), 'password') as database:
+        database.create_database()
+        return database
+
+
+def order_details(*products: tuple, order_date: str = '2014-3-24') -> dict:
+    """Return the order details with the passed products.
+
+    Args:
+        *products (tuple): the catalog numbers, the oem numbers and the descriptions of the products
+        order_date (str): the order date in format YYYY-MM-DD
+
+    Returns:
+        (dict): the order details
+    """
+    return {
+        'date': order_date,
+        'products': [
+            {'catalog_number': catalog_number, 'oem_number': oem_number, 'description': description, 'quantity': '1'}
+            for catalog_number, oem_number, description in products
+        ],
+    }
+
+
+def test_add_and_flush(database: Database):
+    """Test case for writing the orders with the new and the stored products.
+
+    Args:
+        database (Database): an instance of the 'Database' class
+    """
+    database.session.add(Product(catalog_number='4459 4875', oem_number='12341234', description='Beben CN iR2230 '))
+    database.session.commit()
+    with open('tests/responses/expected_result_get_order_history.json') as file:
+        order_history = load(file)
+
+    ingest = OrderIngest(database.session)
+    for order_number, details in order_history.items():
+        ingest.add(order_number, details)
+    ingest.add('215045', order_details(('4440 6696', 'abc123as', 'Rolka HP LJ P3005N'), order_date='2014-3-25'))
+    assert database.session.query(Order).count() == 0
+    ingest.flush()
+
+    assert [(order.order_number, order.date) for order in database.session.query(Order).order_by(Order.id)] == [
+        (215044, date(2014, 3, 24)), (215045, date(2014, 3, 25)),
+    ]
+    assert database.session.query(Product).count() == 3
+    lines = database.session.query(OrderProduct).order_by(OrderProduct.id).all()
+    assert [(line.order.order_number, line.product.catalog_number, line.quantity) for line in lines] == [
+        (215044, '4459 4875', 1), (215044, '4440 6696', 1), (215044, '4440 3689', 1), (215045, '4440 6696', 1),
+    ]
+    assert lines[0].product_id == 1
+
+
+def test_add_flushes_full_batches(database: Database, tmp_path: Path):
+    """Test case for writing the batches and marking the written orders in the checkpoint.
+
+    Args:
+        database (Database): an instance of the 'Database' class
+        tmp_path (Path): the pytest temporary directory
+    """
+    checkpoint = Checkpoint(tmp_path / 'db.checkpoint', '2014-01-01', '2014-12-31')
+    ingest = OrderIngest(database.session, checkpoint, batch_size=2)
+    for order_number in ('1', '2', '3'):
+        ingest.add(order_number, order_details(('4440 3689', '00qwerty', 'Rolka HP LJ P2035 ')))
+
+    assert database.session.query(Order).count() == 2
+    assert checkpoint.orders == [1, 2]
+
+    ingest.flush()
+
+    assert database.session.query(Order).count() == 3
+    assert database.session.query(Product).count() == 1
+    assert checkpoint.orders == [1, 2, 3]
+
+
+def test_flush_rolls_back_failed_batch(database: Database):
+    """Test case for keeping the database and the product index unchanged after the failed batch.
+
+    Args:
+        database (Database): an instance of the 'Database' class
+    """
+    ingest = OrderIngest(database.session)
+    ingest.add('1', order_details(('4440 3689', '00qwerty', 'Rolka HP LJ P2035 ')))
+    ingest.add('2', {'date': 'unknown', 'products': []})
+
+    with pytest.raises(ValueError):
+        ingest.flush()
+
+    assert database.session.query(Product).count() == 0
+    assert ingest.products == {}
+
+
+def test_flush_upserts_stored_orders(database: Database):
+    """Test case for storing the same orders again without the duplicates.
+
+    Args:
+        database (Database): an instance of the 'Database' class
+    """
+    details = order_details(('4440 3689', '00qwerty', 'Rolka HP LJ P2035 '), ('4440 6696', 'abc123as', 'Rolka'))
+    store = OrderIngest(database.session)
+    store.add('215044', details)
+    store.flush()
+
+    # the product stored after the index was loaded
+    ingest = OrderIngest(database.session)
+    database.session.add(Product(catalog_number='4459 4875', oem_number='12341234', description='Beben CN iR2230 '))
+    database.session.commit()
+    details['products'][0]['quantity'] = '3'
+    ingest.add('215044', details)
+    ingest.add('215045', order_details(('4459 4875', '12341234', 'Beben CN iR2230 ')))
+    ingest.flush()
+
+    assert database.session.query(Order).count() == 2
+    assert database.session.query(Product).count() == 3
+    lines = database.session.query(OrderProduct).order_by(OrderProduct.id).all()
+    assert [(line.order_id, line.product_id, line.quantity) for line in lines] == [(1, 1, 3), (1, 2, 1), (2, 3, 1)]
+
+
+def test_flush_replaces_lines_of_stored_orders(database: Database):
+    """Test case for updating the status and the lines of the order stored again.
+
+    Args:
+        database (Database): an instance of the 'Database' class
+    """
+    details = order_details(('4440 3689', '00qwerty', 'Rolka HP LJ P2035 '), ('4440 6696', 'abc123as', 'Rolka'))
+    ingest = OrderIngest(database.session)
+    ingest.add('215044', {**details, 'status': 'w realizacji'})
+    ingest.flush()
+
+    ingest.add('215044', {**details, 'products': details['products'][1:], 'status': 'zrealizowane'})
+    ingest.flush()
+
+    order = database.session.query(Order).one()
+    assert (order.order_number, order.status) == (215044, 'zrealizowane')
+    assert [line.product.catalog_number for line in database.session.query(OrderProduct)] == ['4440 6696']
+
+
+def test_flush_sums_quantities_of_repeated_product(database: Database):
+    """Test case for storing the product listed twice in the order as one line with the summed quantity,
+        the order stored again or queued twice in the batch keeps the same quantity.
+
+    Args:
+        database (Database): an instance of the 'Database' class
+    """
+    details = order_details(('4440 3689', '00qwerty', 'Rolka'), ('4440 3689', '00qwerty', 'Rolka'))
+    details['products'][0]['quantity'] = '2'
+    details['products'][1]['quantity'] = '3'
+    ingest = OrderIngest(database.session)
+    ingest.add('215044', details)
+    ingest.flush()
+
+    assert [(line.product_id, line.quantity) for line in database.session.query(OrderProduct)] == [(1, 5)]
+
+    ingest.add('215044', details)
+    ingest.add('215044', details)
+    ingest.flush()
+
+    assert [(line.product_id, line.quantity) for line in database.session.query(OrderProduct)] == [(1, 5)]
@@ -0,0 +1,107 @@
+"""The collections of the tests for the tools/journal.py module."""
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from tools import container
+from tools.exceptions import CorruptedFileError
+from tools.journal import Journal
+from tools.protection import Protection
+
+
+@pytest.fixture(name='journal')
+def fixture_journal(tmp_path: Path) -> Journal:
+    """Fixture for creating an instance of the Journal class following the saved database file.
+
+    Args:
+        tmp_path (Path): the pytest temporary directory
+
+    Returns:
+        (Journal): the empty journal
+    """
+    protection = Protection('password', tmp_path / 'database.db', container.KeyDerivation(container.PBKDF2, 1000))
+    protection.save_database_dump(b'SQLite format 3\x00' * 1000)
+    return Journal(tmp_path / 'database.db.journal', protection)
+
+
+def test_append_and_read(journal: Journal):
+    """Test case for reading the appended segments in order.
+
+    Args:
+        journal (Journal): an instance of the Journal class
+    """
+    first = {'orders': {'columns': ['id', 'order_number'], 'keys': [1], 'rows': [[1, 215044]]}}
+    second = {'orders': {'columns': ['id', 'order_number'], 'keys': [1], 'rows': []}}
+
+    journal.append(first)
+    journal.append(second)
+
+    assert b'215044' not in journal.path.read_bytes()
+    assert Journal(journal.path, journal.protection).read() == [first, second]
+
+
+def test_read_skips_segments_of_replaced_database_file(journal: Journal):
+    """Test case for skipping the segments written before the database file was saved again.
+
+    Args:
+        journal (Journal): an instance of the Journal class
+    """
+    journal.append({'orders': {'columns': ['id'], 'keys': [1], 'rows': [[1]]}})
+    journal.protection.save_database_dump(b'SQLite format 3\x00')
+
+    assert journal.read() == []
+    assert journal.size == journal.path.stat().st_size
+
+
+def test_append_overwrites_cut_off_segment(journal: Journal):
+    """Test case for skipping the segment cut off by the interrupted save and overwriting it.
+
+    Args:
+        journal (Journal): an instance of the Journal class
+    """
+    first = {'orders': {'columns': ['id'], 'keys': [1], 'rows': [[1]]}}
+    journal.append(first)
+    complete = journal.path.read_bytes()
+    journal.append({'orders': {'columns': ['id'], 'keys': [2], 'rows': [[2]]}})
+    journal.path.write_bytes(journal.path.read_bytes()[:-10])
+
+    assert journal.read() == [first]
+    assert journal.size == len(complete)
+
+    second = {'products': {'columns': ['id'], 'keys': [3], 'rows': [[3]]}}
+    journal.append(second)
+    assert journal.read() == [first, second]
+
+
+def test_read_tampered_segment(journal: Journal):
+    """Test case for reading the complete segment failing the authentication.
+
+    Args:
+        journal (Journal): an instance of the Journal class
+    """
+    journal.append({'orders': {'columns': ['id'], 'keys': [1], 'rows': [[1]]}})
+    content = bytearray(journal.path.read_bytes())
+    content[-40] ^= 1
+    journal.path.write_bytes(content)
+
+    with pytest.raises(CorruptedFileError):
+        journal.read()
+
+
+@patch('tools.journal.MIN_COMPACTION_SIZE', 0)
+def test_is_full_and_remove(journal: Journal):
+    """Test case for compacting the journal longer than the part of the database file.
+
+    Args:
+        journal (Journal): an instance of the Journal class
+    """
+    assert journal.is_full() is False
+
+    rows = [[number, f'{number:08}'] for number in range(2000)]
+    journal.append({'products': {'columns': ['id', 'oem_number'], 'keys': [row[0] for row in rows], 'rows': rows}})
+    assert journal.is_full() is True
+
+    journal.remove()
+    assert journal.path.exists() is False
+    assert journal.is_full() is False
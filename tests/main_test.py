@@ -3,27 +3,70 @@ from datetime import date
 from json import load
 from unittest.mock import patch, MagicMock
 from pathlib import Path
-from requests import Session
+from requests import ConnectionError as RequestsConnectionError, Session
+from sqlalchemy import event
 
 import pytest
 from pytest import MonkeyPatch
 
-from tools.arbiko import Arbiko
+from tools.arbiko import Arbiko, AsyncArbiko
+from tools.cache import QueryCache
+from tools.container import PBKDF2, KeyDerivation
 from tools.database import Database
 from tools.exceptions import DatabaseError
 from tools.models import Order, OrderProduct, Product
-from main import update_data, refresh_data
+from tools.throttle import RequestPolicy
+from main import draw_table, search, update_data, refresh_data
 
 
 class ArbikoMock:
     """Mock Arbiko class.
 
     Methods:
+        get_order_list (*_): mock the 'get_order_list' method of the Arbiko class
+        iter_orders (*_): mock the 'iter_orders' method of the Arbiko class
         get_order_history (*_): mock the 'get_order_history' method of the Arbiko class
     """
     def __init__(self, *_):
         """Constructor"""
 
+    @staticmethod
+    def get_order_list(*_):
+        """Mock the 'get_order_list' method of the Arbiko class.
+
+        Returns:
+            (list): the history list
+        """
+        return ['zob_zam.php3?id=208290']
+
+    @staticmethod
+    async def get_order_list_async(*_):
+        """Mock the 'get_order_list' method of the AsyncArbiko class.
+
+        Returns:
+            (list): the history list
+        """
+        return ArbikoMock.get_order_list()
+
+    @staticmethod
+    async def iter_orders_async(*_):
+        """Mock the 'iter_orders' method of the AsyncArbiko class.
+
+        Yields:
+            (tuple): the order number and the order details of the expected response
+        """
+        for order in ArbikoMock.get_order_history().items():
+            yield order
+
+    @staticmethod
+    def iter_orders(*_):
+        """Mock the 'iter_orders' method of the Arbiko class.
+
+        Returns:
+            (Iterator): the order numbers and the order details of the expected response
+        """
+        return iter(ArbikoMock.get_order_history().items())
+
     @staticmethod
     def get_order_history(*_):
         """Mock the 'get_order_history' method of the Arbiko class.
@@ -64,6 +107,22 @@ def database_connection(mock_protection: MagicMock) -> Database:
         return database
 
 
+@pytest.fixture(name='saved_database')
+def fixture_saved_database(tmp_path: Path) -> Database:
+    """Fixture for creating an instance of the Database class saved to the temporary directory.
+
+    Args:
+        tmp_path (Path): the pytest temporary directory
+
+    Returns:
+        (Database): database session
+    """
+    database = Database(tmp_path / 'database.db', 'password', KeyDerivation(PBKDF2, 1000))
+    database.create_session()
+    database.create_database()
+    return database
+
+
 @pytest.mark.parametrize(
     'start_date, end_date', (
         (None, None),
@@ -90,7 +149,8 @@ def test_update_data(
         monkeypatch (MonkeyPatch): the pytest monkeypatch fixture object
         database (Database): an instance of the 'Database' class
     """
-    monkeypatch.setattr(Arbiko, 'get_order_history', ArbikoMock.get_order_history)
+    monkeypatch.setattr(Arbiko, 'get_order_list', ArbikoMock.get_order_list)
+    monkeypatch.setattr(Arbiko, 'iter_orders', ArbikoMock.iter_orders)
 
     assert len(database.session.query(Order).all()) == 0
     assert len(database.session.query(Product).all()) == 0
@@ -108,29 +168,284 @@ def test_update_data(
     assert len(database.session.query(OrderProduct).all()) == 3
 
 
+@patch('tools.arbiko.AsyncArbiko.login', return_value=True)
+def test_update_data_async(mock_arbiko_login: MagicMock, monkeypatch: MonkeyPatch, database: Database):
+    """Test 'update_data' method of the 'main.py' module with the asyncio client.
+
+    Args:
+        mock_arbiko_login (MagicMock): the patched 'login' method of the 'AsyncArbiko' class
+        monkeypatch (MonkeyPatch): the pytest monkeypatch fixture object
+        database (Database): an instance of the 'Database' class
+    """
+    monkeypatch.setattr(AsyncArbiko, 'get_order_list', ArbikoMock.get_order_list_async)
+    monkeypatch.setattr(AsyncArbiko, 'iter_orders', ArbikoMock.iter_orders_async)
+
+    update_data(database, 'login', 'password', 'user_agent', '2021-01-12', '2022-01-12', use_async=True)
+
+    mock_arbiko_login.assert_called_once()
+    assert len(database.session.query(Order).all()) == 1
+    assert len(database.session.query(Product).all()) == 3
+    assert len(database.session.query(OrderProduct).all()) == 3
+
+
+@patch('tools.arbiko.Arbiko.iter_orders', return_value=iter(()))
+@patch('tools.arbiko.Arbiko.get_order_list', side_effect=ArbikoMock.get_order_list)
+@patch('tools.arbiko.Arbiko.login', return_value=True)
+def test_update_data_skips_known_orders(
+        mock_arbiko_login: MagicMock,
+        mock_get_order_list: MagicMock,
+        mock_iter_orders: MagicMock,
+        database: Database,
+):
+    """Test 'update_data' function passes the stored order numbers to skip them.
+
+    Args:
+        mock_arbiko_login (MagicMock): the patched 'login' method of the 'Arbiko' class
+        mock_get_order_list (MagicMock): the patched 'get_order_list' method of the 'Arbiko' class
+        mock_iter_orders (MagicMock): the patched 'iter_orders' method of the 'Arbiko' class
+        database (Database): an instance of the 'Database' class
+    """
+    database.session.add(Order(order_number=215044, date=date(2014, 3, 24)))
+    database.session.commit()
+
+    update_data(database, 'login', 'password', 'user_agent', '2014-01-01', '2014-12-31')
+    mock_get_order_list.assert_called_once_with('2014-01-01', '2014-12-31')
+    mock_iter_orders.assert_called_once_with(['zob_zam.php3?id=208290'], {215044: None})
+
+    update_data(database, 'login', 'password', 'user_agent', '2014-01-01', '2014-12-31', only_new=False)
+    mock_iter_orders.assert_called_with(['zob_zam.php3?id=208290'], None)
+
+
+@patch('tools.arbiko.Arbiko.login', return_value=True)
+def test_update_data_interrupted_and_resumed(
+        mock_arbiko_login: MagicMock,
+        monkeypatch: MonkeyPatch,
+        saved_database: Database,
+        tmp_path: Path,
+):
+    """Test 'update_data' function keeps the committed orders of the interrupted update
+        and resumes it from the checkpoint.
+
+    Args:
+        mock_arbiko_login (MagicMock): the patched 'login' method of the 'Arbiko' class
+        monkeypatch (MonkeyPatch): the pytest monkeypatch fixture object
+        saved_database (Database): an instance of the 'Database' class saved to the temporary directory
+        tmp_path (Path): the pytest temporary directory
+    """
+    database = saved_database
+    checkpoint_path = tmp_path / 'database.db.checkpoint'
+    order = ArbikoMock.get_order_history()['215044']
+
+    def interrupted_orders(*_):
+        yield '215044', order
+        raise ConnectionError
+
+    monkeypatch.setattr(Arbiko, 'get_order_list', ArbikoMock.get_order_list)
+    monkeypatch.setattr(Arbiko, 'iter_orders', interrupted_orders)
+    with pytest.raises(ConnectionError):
+        update_data(
+            database, 'login', 'password', 'user_agent', '2014-01-01', '2014-12-31',
+            checkpoint_path=checkpoint_path,
+        )
+
+    assert len(database.session.query(Order).all()) == 1
+    assert len(database.session.query(OrderProduct).all()) == 3
+    assert load(open(checkpoint_path)) == {
+        'start_date': '2014-01-01', 'end_date': '2014-12-31', 'orders': [215044], 'shards': [],
+    }
+
+    mock_get_order_list = MagicMock(return_value=[])
+    mock_iter_orders = MagicMock(return_value=iter(()))
+    monkeypatch.setattr(Arbiko, 'get_order_list', mock_get_order_list)
+    monkeypatch.setattr(Arbiko, 'iter_orders', mock_iter_orders)
+    update_data(database, 'login', 'password', 'user_agent', only_new=False, checkpoint_path=checkpoint_path)
+
+    mock_get_order_list.assert_called_once_with('2014-01-01', '2014-12-31')
+    mock_iter_orders.assert_called_once_with([], {215044: None})
+    assert not checkpoint_path.exists()
+
+
+@pytest.mark.parametrize('start_date, end_date', ((None, None), ('2014-01-01', None), (None, '2014-12-31')))
+def test_update_data_replay_requires_dates(start_date: str, end_date: str, database: Database):
+    """Test 'update_data' function refuses to replay the cached responses without the dates of the cached update,
+        the cached history lists are keyed by the dates of the shards, so today's date would miss them.
+
+    Args:
+        start_date (str): date to start search data
+        end_date (str): date to end search data
+        database (Database): an instance of the 'Database' class
+    """
+    with patch('main.Arbiko') as mock_arbiko, pytest.raises(ValueError) as error:
+        update_data(database, 'login', 'password', 'user_agent', start_date, end_date, replay=True)
+
+    assert str(error.value) == 'The replay requires the start date and the end date of the cached update.'
+    mock_arbiko.assert_not_called()
+
+
+@patch('tools.arbiko.Arbiko.login', return_value=True)
+def test_update_data_saves_batch_before_checkpoint(
+        mock_arbiko_login: MagicMock,
+        monkeypatch: MonkeyPatch,
+        saved_database: Database,
+        tmp_path: Path,
+):
+    """Test 'update_data' function saves every batch to the disk before it is marked in the checkpoint,
+        so the orders of the checkpoint are kept when the process is killed without saving the database.
+
+    Args:
+        mock_arbiko_login (MagicMock): the patched 'login' method of the 'Arbiko' class
+        monkeypatch (MonkeyPatch): the pytest monkeypatch fixture object
+        saved_database (Database): an instance of the 'Database' class saved to the temporary directory
+        tmp_path (Path): the pytest temporary directory
+    """
+    checkpoint_path = tmp_path / 'database.db.checkpoint'
+    order = ArbikoMock.get_order_history()['215044']
+
+    def killed_orders(*_):
+        yield '215044', order
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(Arbiko, 'get_order_list', ArbikoMock.get_order_list)
+    monkeypatch.setattr(Arbiko, 'iter_orders', killed_orders)
+    with pytest.raises(KeyboardInterrupt):
+        update_data(
+            saved_database, 'login', 'password', 'user_agent', '2014-01-01', '2014-12-31',
+            checkpoint_path=checkpoint_path,
+        )
+
+    # the killed process never exits the database context, the new process loads the saved files
+    restored = Database(tmp_path / 'database.db', 'password')
+    restored.create_session()
+    restored.load()
+
+    assert load(open(checkpoint_path))['orders'] == [215044]
+    assert [order.order_number for order in restored.session.query(Order)] == [215044]
+    assert len(restored.session.query(OrderProduct).all()) == 3
+
+
+@patch('tools.arbiko.Arbiko.iter_orders', return_value=iter(()))
+@patch('tools.arbiko.Arbiko.login', return_value=True)
+def test_update_data_retries_failed_shards(
+        mock_arbiko_login: MagicMock,
+        mock_iter_orders: MagicMock,
+        monkeypatch: MonkeyPatch,
+        saved_database: Database,
+        tmp_path: Path,
+):
+    """Test 'update_data' function retries only the failed shards.
+
+    Args:
+        mock_arbiko_login (MagicMock): the patched 'login' method of the 'Arbiko' class
+        mock_iter_orders (MagicMock): the patched 'iter_orders' method of the 'Arbiko' class
+        monkeypatch (MonkeyPatch): the pytest monkeypatch fixture object
+        saved_database (Database): an instance of the 'Database' class saved to the temporary directory
+        tmp_path (Path): the pytest temporary directory
+    """
+    database = saved_database
+    checkpoint_path = tmp_path / 'database.db.checkpoint'
+    requested_shards = []
+    failures = [RequestsConnectionError(), RequestsConnectionError()]
+
+    def get_order_list(_, start_date: str, end_date: str):
+        requested_shards.append((start_date, end_date))
+        if start_date == '2014-02-01' and failures:
+            raise failures.pop()
+        return []
+
+    monkeypatch.setattr(Arbiko, 'get_order_list', get_order_list)
+    update_data(
+        database, 'login', 'password', 'user_agent', '2014-01-01', '2014-03-15',
+        checkpoint_path=checkpoint_path, shard_days=31, shard_retries=0,
+    )
+
+    assert sorted(requested_shards) == [
+        ('2014-01-01', '2014-01-31'), ('2014-02-01', '2014-03-03'), ('2014-03-04', '2014-03-15'),
+    ]
+    assert load(open(checkpoint_path))['shards'] == [['2014-01-01', '2014-01-31'], ['2014-03-04', '2014-03-15']]
+
+    requested_shards.clear()
+    update_data(
+        database, 'login', 'password', 'user_agent', '2014-01-01', '2014-03-15',
+        checkpoint_path=checkpoint_path, shard_days=31, shard_retries=1,
+    )
+
+    assert requested_shards == [('2014-02-01', '2014-03-03')] * 2
+    assert not checkpoint_path.exists()
+
+
+@pytest.mark.parametrize(
+    'overlap_days, start_date', (
+        (7, date(2022, 12, 6)),
+        (0, date(2022, 12, 13)),
+    ),
+)
 @patch('main.update_data')
-def test_refresh_data_if_database_exists(mock_update_data: MagicMock, database: Database):
-    """Test 'refresh_data' function if database exists.
+def test_refresh_data_if_database_exists(
+        mock_update_data: MagicMock,
+        overlap_days: int,
+        start_date: date,
+        database: Database,
+):
+    """Test 'refresh_data' function if database exists, the options of the requests are passed to the update.
 
     Args:
         mock_update_data (MagicMock): the patched 'update_data' function of the 'main.py' module
+        overlap_days (int): the number of days scanned again
+        start_date (date): the expected start date of the update
         database (Database): an instance of the 'Database' class
     """
-    order = Order(order_number=1, date=date(2022, 12, 13))
-    database.session.add(order)
+    database.session.add(Order(order_number=1, date=date(2022, 12, 11)))
+    database.session.add(Order(order_number=2, date=date(2022, 12, 13)))
     database.session.commit()
 
-    refresh_data(database, 'login0', 'password-99!', 'user-agent')
+    policy = RequestPolicy(timeout=5.0)
+    refresh_data(
+        database, 'login0', 'password-99!', 'user-agent', overlap_days=overlap_days,
+        max_workers=8, use_async=True, policy=policy, shard_days=31, shard_retries=2,
+    )
 
     mock_update_data.assert_called_once_with(
         database=database,
         login='login0',
         password='password-99!',
         user_agent='user-agent',
-        start_date=date(2022, 12, 14)
+        start_date=start_date,
+        max_workers=8,
+        use_async=True,
+        policy=policy,
+        response_cache=None,
+        shard_days=31,
+        shard_retries=2,
+        session_store=None,
     )
 
 
+@patch('tools.arbiko.Arbiko.iter_orders', return_value=iter(()))
+@patch('tools.arbiko.Arbiko.get_order_list', side_effect=ArbikoMock.get_order_list)
+@patch('tools.arbiko.Arbiko.login', return_value=True)
+def test_update_data_compares_order_status(
+        mock_arbiko_login: MagicMock,
+        mock_get_order_list: MagicMock,
+        mock_iter_orders: MagicMock,
+        database: Database,
+):
+    """Test 'update_data' function passes the status of the stored orders to fetch the changed orders again.
+
+    Args:
+        mock_arbiko_login (MagicMock): the patched 'login' method of the 'Arbiko' class
+        mock_get_order_list (MagicMock): the patched 'get_order_list' method of the 'Arbiko' class
+        mock_iter_orders (MagicMock): the patched 'iter_orders' method of the 'Arbiko' class
+        database (Database): an instance of the 'Database' class
+    """
+    database.session.add(Order(order_number=215044, date=date(2014, 3, 24), status='w realizacji'))
+    database.session.add(Order(order_number=215045, date=date(2014, 3, 25)))
+    database.session.commit()
+
+    update_data(database, 'login', 'password', 'user_agent', '2014-01-01', '2014-12-31')
+
+    mock_iter_orders.assert_called_once_with(['zob_zam.php3?id=208290'], {215044: 'w realizacji', 215045: None})
+
+
 def test_refresh_data_if_database_doesnt_exists(database: Database):
     """Test case to verify the behavior of the `refresh_data` function when the database doesn't exist.
 
@@ -143,3 +458,100 @@ def test_refresh_data_if_database_doesnt_exists(database: Database):
     assert error.type == DatabaseError
     assert str(error.value) == 'It looks like the database is empty. First, try to update it.'
     assert len(database.session.query(Order).all()) == 0
+
+
+@pytest.mark.parametrize('phrases, match_all, expected_result', (
+    ('44403689', True, [215044]),
+    ('4459 4875', True, [215045]),
+    ('044403689', True, [215044]),
+    ('4440-3689', True, [215044]),
+    ('4440368', True, [215044]),
+    ('44403698', True, [215044]),
+    ('1200', True, [215046]),
+    ('1200 mm', True, [215046]),
+    ('1k0819644b', True, [215047]),
+    ('1K0 819 644 B', True, [215047]),
+    ('1K0819645B', True, [215047]),
+    ('Rolka HP', True, [215044]),
+    ('rolka beben', True, []),
+    ('rolka beben', False, [215044, 215045]),
+))
+def test_search(phrases: str, match_all: bool, expected_result: list, database: Database):
+    """Test case for searching the order lines by the full, partial or mistyped number and in the full-text index.
+
+    Args:
+        phrases (str): the typed phrases
+        match_all (bool): find the products with all words
+        expected_result (list): the order numbers of the found order lines
+        database (Database): an instance of the 'Database' class
+    """
+    for number, (catalog_number, description) in enumerate((
+        ('4440 3689', 'Rolka HP LJ P2035'), ('4459 4875', 'Bęben CN iR2230'), ('4470 0012', 'Pasek 1200 mm'),
+        ('1K0 819 644 B', 'Czujnik ABS'),
+    )):
+        order = Order(order_number=215044 + number, date=date(2014, 3, 24 + number))
+        product = Product(catalog_number=catalog_number, oem_number='00qwerty', description=description)
+        database.session.add(OrderProduct(order=order, product=product, quantity=1))
+    database.session.commit()
+
+    with patch('builtins.input', return_value=phrases):
+        result = search(database, match_all)
+
+    assert sorted(line.order_number for line in result) == expected_result
+
+
+def test_search_with_query_cache(database: Database):
+    """Test case for taking the repeated normalized query from the cache until the database is changed.
+
+    Args:
+        database (Database): an instance of the 'Database' class
+    """
+    product = Product(catalog_number='4440 3689', oem_number='RM1-46', description='Rolka HP LJ P2035')
+    database.session.add(OrderProduct(order=Order(order_number=215044, date=date(2014, 3, 24)), product=product))
+    database.session.commit()
+    query_cache = QueryCache()
+    statements = []
+    event.listen(database.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+
+    with patch('builtins.input', side_effect=['4440 3689', '4440  3689 ', ' Rolka  hp', 'rolka hp']):
+        for _ in range(4):
+            assert [line.order_number for line in search(database, query_cache=query_cache)] == [215044]
+
+    assert (query_cache.hits, query_cache.misses) == (2, 2)
+    assert len(statements) == 4
+
+    database.session.add(OrderProduct(order=Order(order_number=215045, date=date(2014, 3, 25)), product=product))
+    database.session.commit()
+    with patch('builtins.input', return_value='rolka hp'):
+        assert [line.order_number for line in search(database, query_cache=query_cache)] == [215044, 215045]
+
+    assert (query_cache.hits, query_cache.misses) == (2, 3)
+
+
+@pytest.mark.parametrize('phrases, expected_statements', (('rolka', 1), ('44403689', 3)))
+def test_search_and_draw_table_with_one_query(phrases: str, expected_statements: int, database: Database,
+                                              capsys: pytest.CaptureFixture):
+    """Test case for drawing the found order lines of the many orders and products with one statement,
+        the number lookup finds the products and searches the full-text index with two more statements.
+
+    Args:
+        phrases (str): the typed phrases
+        expected_statements (int): the number of the executed statements
+        database (Database): an instance of the 'Database' class
+        capsys (CaptureFixture): the pytest fixture capturing the output
+    """
+    for number in range(50):
+        order = Order(order_number=215044 + number, date=date(2014, 3, 24))
+        product = Product(catalog_number='4440 3689', oem_number=f'RM1-{number}', description='Rolka HP LJ P2035')
+        database.session.add(OrderProduct(order=order, product=product, quantity=number))
+    database.session.commit()
+    database.session.expunge_all()
+    statements = []
+    event.listen(database.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+
+    with patch('builtins.input', return_value=phrases):
+        draw_table(search(database))
+
+    assert len(statements) == expected_statements
+    output = capsys.readouterr().out
+    assert '215093' in output and 'RM1-49' in output
@@ -0,0 +1,130 @@
+"""The collections of the tests for the tools/parsers.py module."""
+from datetime import datetime
+
+import pytest
+
+from tools.parsers import PARSERS, get_parser
+
+
+def read_response(name: str) -> str:
+    """Return the content of the stored server response.
+
+    Args:
+        name (str): the file name of the stored response
+
+    Returns:
+        (str): the stored response
+    """
+    with open(f'tests/responses/{name}') as file:
+        return file.read()
+
+
+@pytest.fixture(params=sorted(PARSERS), name='parser')
+def fixture_parser(request: pytest.FixtureRequest):
+    """Fixture for creating every available parser.
+
+    Args:
+        request: The pytest request object
+    """
+    return get_parser(request.param)
+
+
+def test_order_list(parser):
+    """Test case for parsing the history list with the same output as the 'html.parser' backend.
+
+    Args:
+        parser: an instance of the tested parser
+    """
+    content = read_response('expected_response_post_history_url.txt')
+
+    result = parser.order_list(content)
+
+    assert result == get_parser('html.parser').order_list(content)
+    assert result == [{
+        'url': 'zob_zam.php3?id=208290',
+        'order_number': '206576',
+        'date': '2013-11-29',
+        'status': 'zrealizowane',
+    }]
+
+
+def test_order(parser):
+    """Test case for parsing the order page with the same output as the 'html.parser' backend.
+
+    Args:
+        parser: an instance of the tested parser
+    """
+    content = read_response('expected_response_get_order_url.txt')
+
+    order_number, order_details = parser.order(content)
+
+    assert (order_number, order_details) == get_parser('html.parser').order(content)
+    assert order_number == '215044'
+    assert order_details['date'] == datetime(2014, 3, 24)
+    assert [product['catalog_number'] for product in order_details['products']] == [
+        '4459 4875', '4440 6696', '4440 3689',
+    ]
+
+
+def test_oem_number(parser):
+    """Test case for parsing the search result with the same output as the 'html.parser' backend.
+
+    Args:
+        parser: an instance of the tested parser
+    """
+    content = read_response('expected_good_response_post_search_url.txt')
+
+    assert parser.oem_number(content) == 'N/A RL1-2120-000 RL1-3307-000'
+
+
+def test_oem_number_if_product_not_found(parser):
+    """Test case for raising 'IndexError' if the search result doesn't contain the product.
+
+    Args:
+        parser: an instance of the tested parser
+    """
+    content = read_response('expected_wrong_response_post_search_url.txt')
+
+    with pytest.raises(IndexError):
+        parser.oem_number(content)
+
+
+@pytest.mark.parametrize('method', ('order_list', 'order', 'oem_number'))
+@pytest.mark.parametrize(
+    'content',
+    (
+        '',
+        'Service Unavailable',
+        '<form name=loguj method=post><input type=password name=passwd></form>',
+        '<table></table>' * 5,
+    )
+)
+def test_parse_unexpected_page(parser, method: str, content: str):
+    """Test case for raising 'IndexError' by every parser if the page is empty or isn't the expected page.
+
+    Args:
+        parser: an instance of the tested parser
+        method (str): the name of the tested parser method
+        content (str): the empty or the unexpected page
+    """
+    with pytest.raises(IndexError):
+        getattr(parser, method)(content)
+
+
+def test_order_list_if_search_result_passed(parser):
+    """Test case for raising 'IndexError' if the search result is parsed as the history list.
+
+    Args:
+        parser: an instance of the tested parser
+    """
+    content = read_response('expected_good_response_post_search_url.txt')
+
+    with pytest.raises(IndexError):
+        parser.order_list(content)
+
+
+def test_get_default_parser():
+    """Test case for choosing the fastest available parser by default."""
+    expected_name = 'lxml' if 'lxml' in PARSERS else 'html.parser'
+
+    assert type(get_parser()) is type(PARSERS[expected_name]())
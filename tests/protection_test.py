@@ -1,13 +1,24 @@
 """The collections of the tests for the 'tools.protection.py' module"""
+import base64
+import gzip
+import hmac
+import struct
+from dataclasses import replace
+from hashlib import sha256
 from pathlib import Path
 from unittest.mock import patch, MagicMock
 
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, InvalidToken
 from pytest import MonkeyPatch, fixture
 import pytest
 
+from tools import container
+from tools.container import KeyDerivation
 from tools.protection import Protection
 
+# the cheap key derivation of the saved test files
+KEY_DERIVATION = KeyDerivation(container.PBKDF2, 1000)
+
 
 class GzipOpenMock:
     """Mock 'gzip.open' method."""
@@ -41,7 +52,7 @@ def fixture_protection(monkeypatch: MonkeyPatch):
         protection: a Protection object configured with the specified password and database path
     """
     monkeypatch.setattr('tools.protection.gzip.open', GzipOpenMock)
-    protection = Protection('password', Path('database_path/database.db'))
+    protection = Protection('password', Path('database_path/database.db'), KEY_DERIVATION)
 
     return protection
 
@@ -89,31 +100,163 @@ def test_decrypt_data(mock_decrypt: MagicMock, protection: Protection):
     mock_decrypt.assert_called_once_with('some data')
 
 
-@patch('tools.protection.Protection.decrypt', return_value=b'expected decrypted data')
-def test_decrypt_file(mock_decrypt: MagicMock, protection: Protection):
-    """Test case for the 'decrypt_file' method of the Protection class.
+def test_decrypt_older_file(tmp_path: Path):
+    """Test case for the 'decrypt_file' method of the Protection class reading the older gzip file.
 
     Args:
-        mock_decrypt (MagicMock): the patched 'decrypt' method of the Protection class
-        protection (Protection): an instance of the Protection class
+        tmp_path (Path): the pytest temporary directory
+    """
+    protection = Protection('password', tmp_path / 'database.db')
+    legacy_key = Fernet(base64.urlsafe_b64encode(protection.derive_key()))
+    with gzip.open(protection.database_path, 'wb') as file:
+        file.write(legacy_key.encrypt(b'expected decrypted data'))
+
+    assert protection.decrypt_file() == b'expected decrypted data'
+    assert protection.outdated is True
+
+
+def test_encrypt_with_key_of_file(tmp_path: Path):
+    """Test case for encrypting the data of the caches with the key derived from the key of the database file,
+        not with the fixed salt of the older files.
+
+    Args:
+        tmp_path (Path): the pytest temporary directory
     """
-    decrypted_file_data = protection.decrypt_file()
+    protection = Protection('password', tmp_path / 'database.db', KEY_DERIVATION)
+    protection.save_database_dump(b'saved database')
+    encrypted = protection.encrypt(b'cookies')
+
+    loaded = Protection('password', protection.database_path)
+    loaded.decrypt_file()
+    other_salt = Protection('password', tmp_path / 'other.db', replace(KEY_DERIVATION, salt=bytes(16)))
+    legacy_key = Fernet(base64.urlsafe_b64encode(protection.derive_key()))
 
-    assert decrypted_file_data == 'expected decrypted data'
-    mock_decrypt.assert_called_once_with('some data, 123')
+    assert loaded.decrypt(encrypted) == b'cookies'
+    with pytest.raises(InvalidToken):
+        other_salt.decrypt(encrypted)
+    with pytest.raises(InvalidToken):
+        legacy_key.decrypt(encrypted)
 
 
-@patch.object(GzipOpenMock, 'write')
-@patch('tools.protection.Protection.encrypt', return_value=b'expected encrypted data')
-def test_save_database_dump(mock_encrypt: MagicMock, mock_gzip: MagicMock, protection: Protection):
+@pytest.mark.parametrize('database_dump', (b'', b'dumped database', bytes(range(256)) * 10000))
+def test_save_database_dump(database_dump: bytes, tmp_path: Path):
     """Test case for the 'save_database_dump' method of the Protection class.
 
     Args:
-        mock_encrypt (MagicMock): the patched 'encrypt' method of the Protection class
-        mock_gzip (MagicMock): the patched 'open' method of the gzip object
+        database_dump (bytes): the saved database dump
+        tmp_path (Path): the pytest temporary directory
+    """
+    protection = Protection('password', tmp_path / 'database.db', KEY_DERIVATION)
+
+    protection.save_database_dump(database_dump)
+
+    content = protection.database_path.read_bytes()
+    assert content.startswith(container.MAGIC)
+    assert database_dump[:1000] not in content or not database_dump
+    assert protection.decrypt_file() == database_dump
+    assert protection.outdated is False
+
+
+def test_save_database_dump_keeps_file_after_failure(tmp_path: Path):
+    """Test case for keeping the saved database when the next save fails.
+
+    Args:
+        tmp_path (Path): the pytest temporary directory
+    """
+    protection = Protection('password', tmp_path / 'database.db', KEY_DERIVATION)
+    protection.save_database_dump(b'saved database')
+
+    with patch('tools.protection.container.write', side_effect=OSError):
+        with pytest.raises(OSError):
+            protection.save_database_dump(b'next database')
+
+    assert protection.decrypt_file() == b'saved database'
+    protection.save_database_dump(b'next database')
+    assert protection.decrypt_file() == b'next database'
+    assert [path.name for path in tmp_path.iterdir()] == ['database.db']
+
+
+def test_derive_key_once(protection: Protection):
+    """Test case for deriving the key once per key derivation.
+
+    Args:
         protection (Protection): an instance of the Protection class
     """
-    protection.save_database_dump(b'dumped database')
+    with patch.object(KeyDerivation, 'derive', return_value=bytes(32)) as mock_derive:
+        assert protection.derive_key(KEY_DERIVATION) == bytes(32)
+        assert protection.derive_key(KEY_DERIVATION) == bytes(32)
+    legacy_key = protection.derive_key()
+
+    mock_derive.assert_called_once_with(b'password')
+    assert protection.derive_key() == legacy_key != bytes(32)
 
-    mock_gzip.assert_called_once_with(b'expected encrypted data')
-    mock_encrypt.assert_called_once_with(b'dumped database')
+
+def test_save_with_key_derivation_of_read_file(tmp_path: Path):
+    """Test case for saving the file again with the salt and the parameters it was read with.
+
+    Args:
+        tmp_path (Path): the pytest temporary directory
+    """
+    Protection('password', tmp_path / 'database.db', KEY_DERIVATION).save_database_dump(b'saved database')
+    protection = Protection('password', tmp_path / 'database.db')
+
+    assert protection.decrypt_file() == b'saved database'
+    assert protection.key_derivation == KEY_DERIVATION
+    assert protection.outdated is False
+    with patch.object(KeyDerivation, 'derive') as mock_derive:
+        protection.save_database_dump(b'next database')
+        assert protection.decrypt_file() == b'next database'
+
+    mock_derive.assert_not_called()
+
+
+def test_decrypt_file_with_other_key_derivation(tmp_path: Path):
+    """Test case for marking the file read with the other key derivation parameters as outdated.
+
+    Args:
+        tmp_path (Path): the pytest temporary directory
+    """
+    Protection('password', tmp_path / 'database.db', KEY_DERIVATION).save_database_dump(b'saved database')
+    tuned = KeyDerivation(container.PBKDF2, 2000)
+    protection = Protection('password', tmp_path / 'database.db', tuned)
+
+    assert protection.decrypt_file() == b'saved database'
+    assert protection.outdated is True
+    assert protection.key_derivation == tuned
+
+
+def test_decrypt_first_container_version(tmp_path: Path):
+    """Test case for reading the container without the key derivation in the header.
+
+    Args:
+        tmp_path (Path): the pytest temporary directory
+    """
+    protection = Protection('password', tmp_path / 'database.db')
+    cipher, mac_key = container._subkeys(protection.derive_key())
+    header = container.HEADERS[1].pack(container.MAGIC, 1, 1024, bytes(8))
+    encrypted = cipher.encrypt(bytes(12), b'saved database', header + struct.pack('>I?', 0, True))
+    mac = hmac.new(mac_key, header + encrypted[-container.TAG_SIZE:], sha256).digest()
+    protection.database_path.write_bytes(
+        header + container.CHUNK_LENGTH.pack(len(encrypted) | container.LAST_CHUNK) + encrypted + mac
+    )
+
+    assert protection.decrypt_file() == b'saved database'
+    assert protection.outdated is True
+
+
+def test_save_database_dump_compressed(tmp_path: Path):
+    """Test case for compressing the dump with the passed codec before the encryption.
+
+    Args:
+        tmp_path (Path): the pytest temporary directory
+    """
+    database_dump = b'SQLite format 3\x00' * 10000
+    sizes = {}
+    for codec in ('none', 'zlib', 'lzma'):
+        protection = Protection('password', tmp_path / f'{codec}.db', KEY_DERIVATION, container.Compression(codec))
+        protection.save_database_dump(database_dump)
+        sizes[codec] = protection.database_path.stat().st_size
+        assert protection.decrypt_file() == database_dump
+
+    assert sizes['none'] > len(database_dump) > 100 * sizes['zlib']
+    assert sizes['zlib'] > sizes['lzma']
@@ -0,0 +1,291 @@
+"""The collections of the tests for the tools/search.py module."""
+from datetime import date
+from pathlib import Path
+
+import pytest
+from sqlalchemy import event, text
+
+from tools.database import Database
+from tools.models import Order, OrderProduct, Product
+from tools.search import (
+    find_products_by_number, match_query, number_key, search_order_products, search_order_products_by_number,
+    similarity,
+)
+
+
+@pytest.fixture(name='database')
+def fixture_database() -> Database:
+    """Fixture for creating the database with the ordered products.
+
+    Returns:
+        (Database): the database with the open session
+    """
+    database = Database(Path('database.db'), 'password')
+    database.create_session()
+    database.create_database()
+    products = [
+        Product(catalog_number='4440 3689', oem_number='RM1-4554-000', description='Rolka HP LJ P2035'),
+        Product(catalog_number='4459 4875', oem_number='FM2-5533', description='Bęben CN iR2230'),
+        Product(catalog_number='4440 6696', oem_number='RL1-1802', description='Rolka pobierająca Canon'),
+    ]
+    for number, product in enumerate(products + products[:1]):
+        order = Order(order_number=215044 + number, date=date(2014, 3, 24 - number))
+        database.session.add(OrderProduct(order=order, product=product, quantity=number + 1))
+    database.session.commit()
+
+    return database
+
+
+def found(database: Database, phrases: str, match_all: bool = True, **options) -> list:
+    """Return the order numbers and the catalog numbers of the found order lines."""
+    return [
+        (line.order_number, line.catalog_number)
+        for line in search_order_products(database.session, phrases, match_all, **options)
+    ]
+
+
+@pytest.mark.parametrize('phrases, expected_result', (
+    ('rolka', '"rolka"*'),
+    (' rolka  hp ', '"rolka"* AND "hp"*'),
+    ('rm1-4554 "x', '"rm1-4554"* AND """x"*'),
+    ('', ''),
+))
+def test_match_query(phrases: str, expected_result: str):
+    """Test case for building the full-text query of the words.
+
+    Args:
+        phrases (str): the searched words
+        expected_result (str): the FTS5 query
+    """
+    assert match_query(phrases) == expected_result
+
+
+def test_match_query_any_word():
+    """Test case for building the full-text query matching any word."""
+    assert match_query('rolka hp', match_all=False) == '"rolka"* OR "hp"*'
+
+
+def test_match_query_in_columns():
+    """Test case for building the full-text query matching the words in the passed columns."""
+    assert match_query('rolka hp', columns=('oem_number', 'description')) == \
+        '{oem_number description} : ("rolka"* AND "hp"*)'
+    assert match_query('rolka', columns=('description', 'catalog_number', 'oem_number')) == '"rolka"*'
+    with pytest.raises(ValueError):
+        match_query('rolka', columns=('quantity',))
+
+
+@pytest.mark.parametrize('phrases, expected_result', (
+    ('rolka hp', [(215047, '4440 3689'), (215044, '4440 3689')]),
+    ('ROL P20', [(215047, '4440 3689'), (215044, '4440 3689')]),
+    ('rm1-4554', [(215047, '4440 3689'), (215044, '4440 3689')]),
+    ('beben', [(215045, '4459 4875')]),
+    ('4459', [(215045, '4459 4875')]),
+    ('rolka beben', []),
+    ('"', []),
+    ('', []),
+))
+def test_search_order_products(database: Database, phrases: str, expected_result: list):
+    """Test case for finding the order lines with all words as the prefixes, ordered by the order date.
+
+    Args:
+        database (Database): the database with the ordered products
+        phrases (str): the searched words
+        expected_result (list): the order numbers and the catalog numbers of the found order lines
+    """
+    assert found(database, phrases) == expected_result
+
+
+def test_search_order_products_any_word_by_relevance(database: Database):
+    """Test case for finding the order lines with any word, the products matching more words first.
+
+    Args:
+        database (Database): the database with the ordered products
+    """
+    assert found(database, 'rolka canon', match_all=False, by_relevance=True) == [
+        (215046, '4440 6696'), (215047, '4440 3689'), (215044, '4440 3689'),
+    ]
+
+
+def test_search_index_follows_products(database: Database):
+    """Test case for keeping the full-text index in sync with the changed and removed products.
+
+    Args:
+        database (Database): the database with the ordered products
+    """
+    database.session.get(Product, 1).description = 'Wałek HP LJ P2035'
+    database.session.delete(database.session.get(OrderProduct, 2))
+    database.session.delete(database.session.get(Product, 2))
+    database.session.commit()
+
+    assert found(database, 'rolka hp') == []
+    assert found(database, 'wałek') == [(215047, '4440 3689'), (215044, '4440 3689')]
+    assert found(database, 'beben') == []
+
+
+def test_search_order_products_any_word_by_date(database: Database):
+    """Test case for returning every line of the products matching more words once, ordered by the order date.
+
+    Args:
+        database (Database): the database with the ordered products
+    """
+    assert found(database, 'rolka canon hp', match_all=False) == [
+        (215047, '4440 3689'), (215046, '4440 6696'), (215044, '4440 3689'),
+    ]
+    assert found(database, 'rolka canon hp', match_all=False, limit=2) == [
+        (215047, '4440 3689'), (215046, '4440 6696'),
+    ]
+
+
+def test_search_order_products_in_columns(database: Database):
+    """Test case for matching the words only in the passed columns.
+
+    Args:
+        database (Database): the database with the ordered products
+    """
+    assert found(database, 'rl1 rolka', columns=('oem_number', 'description')) == [(215046, '4440 6696')]
+    assert found(database, 'rl1 rolka', columns=('description',)) == []
+    assert found(database, '4459', columns=('oem_number', 'description')) == []
+
+
+def test_search_order_products_with_one_query(database: Database):
+    """Test case for finding the order lines of the multi-word search with one statement.
+
+    Args:
+        database (Database): the database with the ordered products
+    """
+    statements = []
+    event.listen(database.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+
+    result = search_order_products(database.session, 'rolka canon hp beben', match_all=False)
+
+    assert len(statements) == 1
+    assert len(result) == len({line.id for line in result}) == 4
+
+
+@pytest.mark.parametrize('number, expected_result', (
+    ('44403689', '44403689'),
+    ('0044 40-3689', '44403689'),
+    ('rm1-4554.000', 'RM14554000'),
+    ('000', ''),
+))
+def test_number_key(number: str, expected_result: str):
+    """Test case for normalizing the typed number as the stored search keys.
+
+    Args:
+        number (str): the typed number
+        expected_result (str): the search key
+    """
+    assert number_key(number) == expected_result
+
+
+def test_number_key_as_database(database: Database):
+    """Test case for computing the same search keys of the stored numbers by the database.
+
+    Args:
+        database (Database): the database with the ordered products
+    """
+    for product in database.session.query(Product):
+        assert product.catalog_key == number_key(product.catalog_number)
+        assert product.oem_key == number_key(product.oem_number)
+
+
+@pytest.mark.parametrize('key, other, expected_result', (
+    ('44403689', '44403689', (2, 1.0)),
+    ('4440', '44403689', (1, 0.5)),
+    ('44403698', '44403689', (0, 8 / 12)),
+    ('44403689', '44594875', (0, 0.0)),
+    ('44', None, (0, 0.0)),
+))
+def test_similarity(key: str, other: str, expected_result: tuple):
+    """Test case for scoring the similarity of the search keys.
+
+    Args:
+        key (str): the search key of the typed number
+        other (str): the search key of the stored number
+        expected_result (tuple): the kind of the match and the score
+    """
+    assert similarity(key, other) == pytest.approx(expected_result)
+
+
+@pytest.mark.parametrize('number, expected_result', (
+    ('044403689', [1]),
+    ('4440 3689', [1]),
+    ('4440', [1, 3]),
+    ('4440 36', [1]),
+    ('rm1 4554', [1]),
+    ('44406969', [3]),
+    ('FM2 5533', [2]),
+    ('99999999', []),
+    ('0', []),
+))
+def test_find_products_by_number(database: Database, number: str, expected_result: list):
+    """Test case for finding the products by the full, the partial and the mistyped catalog or oem number,
+        only by the best kind of the match.
+
+    Args:
+        database (Database): the database with the ordered products
+        number (str): the typed number
+        expected_result (list): the ids of the found products, the most similar first
+    """
+    assert [product_id for product_id, _ in find_products_by_number(database.session, number)] == expected_result
+
+
+def test_find_products_by_number_follows_products(database: Database):
+    """Test case for finding the products by the changed numbers.
+
+    Args:
+        database (Database): the database with the ordered products
+    """
+    database.session.get(Product, 3).oem_number = 'RL1-2120-000'
+    database.session.commit()
+
+    assert find_products_by_number(database.session, 'rl1 2120') == [(3, pytest.approx(0.7))]
+    assert find_products_by_number(database.session, 'rl1-1802') == []
+
+
+def test_number_key_lookup_uses_index(database: Database):
+    """Test case for looking up the search keys by the indexes instead of scanning the products.
+
+    Args:
+        database (Database): the database with the ordered products
+    """
+    for column in ('catalog_key', 'oem_key'):
+        plan = database.session.execute(
+            text(f'EXPLAIN QUERY PLAN SELECT id FROM products WHERE {column} = :key'), {'key': '44403689'},
+        ).all()
+        assert f'ix_products_{column}' in ' '.join(row[-1] for row in plan)
+
+
+def test_search_order_products_by_number(database: Database):
+    """Test case for finding the order lines of the most similar products first, each by the order date.
+
+    Args:
+        database (Database): the database with the ordered products
+    """
+    result = search_order_products_by_number(database.session, '4440')
+
+    assert [(line.order_number, line.catalog_number) for line in result] == [
+        (215047, '4440 3689'), (215044, '4440 3689'), (215046, '4440 6696'),
+    ]
+    assert len(search_order_products_by_number(database.session, '4440', limit=2)) == 2
+    assert search_order_products_by_number(database.session, '99999999') == []
+
+
+def test_search_order_products_by_number_in_description(database: Database):
+    """Test case for finding the lines of the products with the number in the description
+        after the lines of the products with the similar catalog or oem number.
+
+    Args:
+        database (Database): the database with the ordered products
+    """
+    database.session.get(Product, 3).description = 'Rolka do 4459 4875'
+    database.session.commit()
+
+    result = search_order_products_by_number(database.session, '4459 4875')
+
+    assert [(line.order_number, line.catalog_number) for line in result] == [
+        (215045, '4459 4875'), (215046, '4440 6696'),
+    ]
+    assert [line.order_number for line in search_order_products_by_number(database.session, '4459 4875', 1)] == [
+        215045,
+    ]
@@ -0,0 +1,83 @@
+"""The collections of the tests for the tools/throttle.py module."""
+from unittest.mock import patch
+
+import pytest
+
+from tools.throttle import RateLimiter, RequestPolicy, RequestStats
+
+
+@pytest.mark.parametrize('attempt, expected_maximum', ((0, 0.5), (1, 1.0), (3, 4.0), (10, 30.0)))
+def test_backoff_delay(attempt: int, expected_maximum: float):
+    """Test case for the exponential backoff with the jitter.
+
+    Args:
+        attempt (int): the number of the failed attempt
+        expected_maximum (float): the expected maximum of the delay
+    """
+    policy = RequestPolicy(backoff=0.5, max_backoff=30.0)
+
+    with patch('tools.throttle.uniform', side_effect=lambda low, high: high) as mock_uniform:
+        assert policy.backoff_delay(attempt) == expected_maximum
+
+    mock_uniform.assert_called_once_with(0, expected_maximum)
+
+
+@patch('tools.throttle.monotonic', return_value=100.0)
+def test_reserve_waits_for_token(mock_monotonic):
+    """Test case for waiting for the token after the bucket is empty.
+
+    Args:
+        mock_monotonic: mock object for 'tools.throttle.monotonic' function
+    """
+    limiter = RateLimiter(RequestPolicy(rate=2.0))
+
+    assert [limiter.reserve() for _ in range(4)] == [0.0, 0.0, 0.5, 1.0]
+
+    mock_monotonic.return_value = 102.0
+    assert limiter.reserve() == 0.0
+
+
+@pytest.mark.parametrize(
+    'latency, failed, expected_rate',
+    (
+        (0.1, False, 4.1),
+        (3.0, False, 3.6),
+        (0.1, True, 2.0),
+    ),
+)
+def test_record_adapts_rate(latency: float, failed: bool, expected_rate: float):
+    """Test case for adapting the rate to the latency and the errors.
+
+    Args:
+        latency (float): the latency of the request
+        failed (bool): if the request failed
+        expected_rate (float): the expected rate after the request
+    """
+    limiter = RateLimiter(RequestPolicy(rate=4.0, target_latency=2.0))
+
+    limiter.record(latency, failed)
+
+    assert limiter.rate == pytest.approx(expected_rate)
+
+
+def test_rate_stays_within_limits():
+    """Test case for keeping the rate between the minimum and the maximum rate."""
+    limiter = RateLimiter(RequestPolicy(rate=1.0, min_rate=0.5, max_rate=1.2))
+
+    for _ in range(5):
+        limiter.record(0.1, failed=True)
+    assert limiter.rate == 0.5
+
+    for _ in range(20):
+        limiter.record(0.1)
+    assert limiter.rate == 1.2
+
+
+def test_stats():
+    """Test case for the report of the request counters."""
+    stats = RequestStats()
+
+    stats.add(requests=3, retries=1)
+    stats.add(requests=1, throttle_wait=0.5)
+
+    assert str(stats) == 'Requests: 4, retries: 1, failures: 0, throttle wait: 0.5s, backoff wait: 0.0s'
@@ -1,53 +1,285 @@
 """The module to scrape http://arbiko.pl site."""
-from datetime import datetime
-from requests import Session
+import asyncio
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from time import monotonic, sleep
+from requests import RequestException, Response, Session
+from requests.exceptions import ConnectionError as RequestConnectionError, Timeout
+from requests.adapters import HTTPAdapter
 
-from bs4 import BeautifulSoup
+from httpx import AsyncClient, HTTPError, Limits, TransportError
 
-from tools.exceptions import LoginError
+from tools.cache import OemNumberCache, ResponseCache, SessionStore, UNKNOWN_OEM_NUMBER
+from tools.exceptions import CacheMissError, LoginError
+from tools.parsers import get_parser
+from tools.throttle import RateLimiter, RequestPolicy, RequestStats
 
+BASE_URL = 'http://arbiko.pl/arbos/'
+HISTORY_URL = BASE_URL + 'search_zam.php3?ref=zamowienia'
+SEARCH_URL = BASE_URL + 'search_of.php3?ref=oferta'
+LOGIN_URL = BASE_URL + 'loguj1.php3'
+# the field of the history form, served only to the logged-in session, quoted or not
+HISTORY_FIELD = re.compile(r'name=["\']?filters(?=["\'\s/>])', re.IGNORECASE)
+# the errors failing a single shard of the order history
+SHARD_ERRORS = (RequestException, HTTPError, CacheMissError)
 
-class Arbiko:
-    """The collections of the tools to scrape arbiko.pl site.
-    The class has implemented the necessary methods to use as a context manager.
+
+def split_date_range(start_date, end_date, days: int = None) -> list:
+    """Split the time period into the shards of the passed number of days.
+
+    Args:
+        start_date (str | date): start date of the time period
+        end_date (str | date): end date of the time period
+        days (int): the number of days of a shard, the time period is not split if not passed
+
+    Returns:
+        shards (list): the start and the end dates of the shards in format YYYY-MM-DD
+    """
+    if not days:
+        return [(str(start_date), str(end_date))]
+
+    start = date.fromisoformat(str(start_date))
+    end = date.fromisoformat(str(end_date))
+
+    shards = []
+    while start <= end:
+        shard_end = min(end, start + timedelta(days=days - 1))
+        shards.append((str(start), str(shard_end)))
+        start = shard_end + timedelta(days=1)
+
+    return shards
+
+
+def _history_payload(start_date: str, end_date: str) -> dict:
+    """Return the payload of the order history search."""
+    return {
+        'filters': 'data_od,data_do,numer,stan',
+        'data_od': start_date,
+        'data_do': end_date,
+        'numer_zam': '',
+        'stan': '',
+        'sbm': 'Szukaj',
+    }
+
+
+def _select_orders(orders: list, known_orders: dict) -> list:
+    """Return the orders to fetch, the unseen orders and the known orders with the changed status.
+
+    Args:
+        orders (list): the listed orders
+        known_orders (dict): the stored order numbers with their status,
+            the status None means the order is never fetched again
+
+    Returns:
+        (list): the orders to fetch
+    """
+    if not known_orders:
+        return list(orders)
+
+    selected = []
+    for order in orders:
+        number = int(order['order_number']) if order['order_number'].isdigit() else order['order_number']
+        if number not in known_orders:
+            selected.append(order)
+        elif known_orders[number] is not None and known_orders[number] != order['status']:
+            selected.append(order)
+
+    return selected
+
+
+def _search_numbers(order_details: dict) -> list:
+    """Pop and return the catalog numbers to search the oem numbers for."""
+    return [product.pop('search_number') for product in order_details['products']]
+
+
+def _set_oem_numbers(order_details: dict, oem_numbers) -> dict:
+    """Fill the products with the oem numbers and return the order details.
+
+    Args:
+        order_details (dict): the order details
+        oem_numbers: oem numbers in the order of the products
+
+    Returns:
+        order_details (dict): the order details with the oem numbers
+    """
+    for product, oem_number in zip(order_details['products'], oem_numbers):
+        product['oem_number'] = oem_number
+
+    return order_details
+
+
+class BaseArbiko:
+    """The state, the request policy and the response cache shared by the Arbiko and the AsyncArbiko clients.
+    The clients only send the requests, with the threads or with asyncio.
 
     Methods:
-        login():
-        get_order_history(start_date: str, end_date: str): fetches and return the order history
-            for the passed time period
-        get_oem_number(catalog_number: str): fetches oem number for the passed catalog number
+        login(): login at arbiko.pl, implemented by the clients
     """
-    def __init__(self, username: str, password: str, user_agent: str):
+    def __init__(
+            self,
+            username: str,
+            password: str,
+            user_agent: str,
+            max_workers: int = 4,
+            oem_cache: OemNumberCache = None,
+            parser: str = None,
+            policy: RequestPolicy = None,
+            response_cache: ResponseCache = None,
+            replay: bool = False,
+            session_store: SessionStore = None,
+    ):
         """Construct all the necessary attributes for the arbiko object.
 
         Args:
             username (str): username to login in aribko.pl site
             password (str): password to login in aribko.pl site
             user_agent (str): user agent
+            max_workers (int): the maximum number of the concurrent requests
+            oem_cache (OemNumberCache): cache consulted before fetching the oem numbers
+            parser (str): name of the html parser backend, the fastest available if not passed
+            policy (RequestPolicy): timeouts, retries and rate limits of the requests
+            response_cache (ResponseCache): the on-disk cache of the order pages and the search results
+            replay (bool): read all responses from the response cache without connecting to the site
+            session_store (SessionStore): the saved cookies of the logged-in session reused instead of the login
         """
-        self.history_url = 'http://arbiko.pl/arbos/search_zam.php3?ref=zamowienia'
-        self.search_url = 'http://arbiko.pl/arbos/search_of.php3?ref=oferta'
-        self.login_url = 'http://arbiko.pl/arbos/loguj1.php3'
+        self.history_url = HISTORY_URL
+        self.search_url = SEARCH_URL
+        self.login_url = LOGIN_URL
         self.password = password
         self.username = username
 
         self.session = None
         self.user_agent = user_agent
+        self.max_workers = max(1, max_workers)
+        self.oem_cache = oem_cache if oem_cache is not None else OemNumberCache()
+        self.parser = get_parser(parser)
+        self.policy = policy if policy is not None else RequestPolicy()
+        self.limiter = RateLimiter(self.policy)
+        self.stats = RequestStats()
+        self.response_cache = response_cache
+        self.replay = replay
+        self.session_store = session_store
+
+    def _login_payload(self) -> dict:
+        """Return the payload of the login form."""
+        return {
+            'user': self.username,
+            'passwd': self.password,
+            'Submit': 'Loguj >>'
+        }
+
+    @staticmethod
+    def _is_logged_in(content: str) -> bool:
+        """Return True if the history page is served, False if the login form is served instead."""
+        return HISTORY_FIELD.search(content) is not None
+
+    def _cached_content(self, method: str, url: str, data: dict = None, tag: str = '', live: bool = False) -> tuple:
+        """The method returns the key of the request in the response cache and the cached content.
+
+        Args:
+            method (str): the http method
+            url (str): the requested url
+            data (dict): the payload of the request
+            tag (str): the additional part of the cache key, e.g. the status of the order
+            live (bool): request the content even if it is cached, unless the replay mode is on
 
+        Returns:
+            (tuple): the key, None without the response cache, and the content, None if it must be requested
+
+        Raises:
+            CacheMissError: if the response is not cached in the replay mode
+        """
+        key = None
+        if self.response_cache is not None:
+            key = self.response_cache.key(method, url, data, tag)
+            if self.replay or not live:
+                content = self.response_cache.get(key)
+                if content is not None:
+                    return key, content
+
+        if self.replay:
+            raise CacheMissError(f'The response of {url} is not cached.')
+
+        return key, None
+
+    def _cache_content(self, key: str, content: str):
+        """The method stores the requested content in the response cache.
+
+        Args:
+            key (str): the key of the request, the content isn't stored if None
+            content (str): the response content
+        """
+        if key is not None:
+            self.response_cache.set(key, content)
+
+
+class Arbiko(BaseArbiko):
+    """The collections of the tools to scrape arbiko.pl site.
+    The class has implemented the necessary methods to use as a context manager.
+    The session stays open for the whole context, its cookies can be saved to skip the login on the next run.
+
+    Methods:
+        login():
+        get_order_list(start_date: str, end_date: str): fetches the history list
+            without the order details
+        get_order_history(start_date: str, end_date: str, known_orders: dict): fetches and return
+            the order history for the passed time period
+        iter_order_history(start_date: str, end_date: str, known_orders: dict): yields the orders
+            of the order history as soon as they are fetched
+        get_order_lists(shards: list): fetches the history lists of the shards concurrently
+        iter_orders(orders: list, known_orders: dict): yields the details of the listed orders
+        get_oem_number(catalog_number: str): fetches oem number for the passed catalog number
+    """
     def __enter__(self):
-        if not self.login():
+        self._open_session()
+        if not self.replay and not self._restore_session() and not self.login():
+            self.session.close()
             raise LoginError
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        pass
+        if self.session_store is not None and not self.replay:
+            self.session_store.save(self.session.cookies)
+        self.session.close()
+
+    def _open_session(self):
+        """Open the session kept alive for the whole context."""
+        self.session = Session()
+        self._set_headers()
+        self._mount_adapter()
 
     def _set_headers(self):
-        """Set user agent in headers."""
+        """Set user agent in headers, the default headers keep the connections alive."""
         self.headers = {
             'User-Agent': self.user_agent
         }
-        self.session.headers = self.headers
+        self.session.headers.update(self.headers)
+
+    def _mount_adapter(self):
+        """Resize the connection pool to the number of the workers
+            sharing the logged-in session."""
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _restore_session(self) -> bool:
+        """The method restores the saved cookies and probes if the session is still logged in.
+
+        Returns:
+            True (bool): if the restored session is logged in
+            False (bool): if there is no saved session or it has expired
+        """
+        if self.session_store is None or not self.session_store.load(self.session.cookies):
+            return False
+
+        response = self._request('GET', self.history_url)
+        if response.ok and self._is_logged_in(response.text):
+            return True
+
+        self.session.cookies.clear()
+        return False
 
     def login(self) -> bool:
         """The method try to login at aribko.pl.
@@ -55,84 +287,210 @@ class Arbiko:
         Returns:
             True (bool): if login was correct
             False (bool): if login was incorrectly."""
-        login_payload = {
-            'user': self.username,
-            'passwd': self.password,
-            'Submit': 'Loguj >>'
-        }
-        with Session() as self.session:
-            self._set_headers()
-            self.session.post(self.login_url, data=login_payload)
-            if 'logged' in self.session.cookies:
-                if self.session.cookies['logged'] == 'yes':
-                    return True
-            return False
+        if self.session is None:
+            self._open_session()
+        self._request('POST', self.login_url, data=self._login_payload())
+        if 'logged' in self.session.cookies:
+            if self.session.cookies['logged'] == 'yes':
+                return True
+        return False
+
+    def _request(self, method: str, url: str, **kwargs) -> Response:
+        """The method sends the request within the rate limit and retries it
+            with the exponential backoff after the connection errors and the server errors.
+
+        Args:
+            method (str): the http method
+            url (str): the requested url
+            **kwargs: the keyword arguments of the request
+
+        Returns:
+            response (Response): the server response
+
+        Raises:
+            RequestConnectionError, Timeout, HTTPError: if the request failed after all retries
+        """
+        for attempt in range(self.policy.max_retries + 1):
+            delay = self.limiter.reserve()
+            if delay:
+                self.stats.add(throttle_wait=delay)
+                sleep(delay)
 
-    def get_order_history(self, start_date: str, end_date: str) -> dict:
+            start = monotonic()
+            self.stats.add(requests=1)
+            try:
+                response = self.session.request(method, url, timeout=self.policy.timeout, **kwargs)
+            except (RequestConnectionError, Timeout):
+                self.limiter.record(monotonic() - start, failed=True)
+                if attempt == self.policy.max_retries:
+                    self.stats.add(failures=1)
+                    raise
+            else:
+                failed = response.status_code >= 500
+                self.limiter.record(monotonic() - start, failed=failed)
+                if not failed:
+                    return response
+                if attempt == self.policy.max_retries:
+                    self.stats.add(failures=1)
+                    response.raise_for_status()
+
+            delay = self.policy.backoff_delay(attempt)
+            self.stats.add(retries=1, backoff_wait=delay)
+            sleep(delay)
+
+    def _fetch(self, method: str, url: str, data: dict = None, tag: str = '', live: bool = False) -> str:
+        """The method returns the response content from the response cache or requests it.
+
+        Args:
+            method (str): the http method
+            url (str): the requested url
+            data (dict): the payload of the request
+            tag (str): the additional part of the cache key, e.g. the status of the order
+            live (bool): request the content even if it is cached, unless the replay mode is on
+
+        Returns:
+            content (str): the response content
+
+        Raises:
+            CacheMissError: if the response is not cached in the replay mode
+        """
+        key, content = self._cached_content(method, url, data, tag, live)
+        if content is None:
+            content = self._request(method, url, data=data).text
+            self._cache_content(key, content)
+
+        return content
+
+    def get_order_history(self, start_date: str, end_date: str, known_orders: dict = None) -> dict:
         """The method fetches and return the order history
             for the passed time period.
 
         Args:
             start_date (str): start date to get order history
             end_date (str): end date to get order history
+            known_orders (dict): the stored order numbers with their status, the orders
+                are fetched only if they are unseen or their status has changed
 
         Returns:
-            result (dict): fetched data
+            (dict): fetched data
         """
-        history_payload = {
-            'filters': 'data_od,data_do,numer,stan',
-            'data_od': start_date,
-            'data_do': end_date,
-            'numer_zam': '',
-            'stan': '',
-            'sbm': 'Szukaj',
-        }
+        return dict(self.iter_order_history(start_date, end_date, known_orders))
+
+    def iter_order_history(self, start_date: str, end_date: str, known_orders: dict = None):
+        """The method fetches the order history for the passed time period
+            and yields every order as soon as it is ready.
+            The order pages and the oem numbers are fetched concurrently,
+            the orders are yielded in the order of the history list.
+
+        Args:
+            start_date (str): start date to get order history
+            end_date (str): end date to get order history
+            known_orders (dict): the stored order numbers with their status, the orders
+                are fetched only if they are unseen or their status has changed
+
+        Yields:
+            (tuple): order number and the order details
+        """
+        yield from self.iter_orders(self.get_order_list(start_date, end_date), known_orders)
+
+    def get_order_lists(self, shards: list) -> list:
+        """The method fetches the history lists of the shards concurrently.
+            The failure of a shard doesn't stop the other shards.
+
+        Args:
+            shards (list): the start and the end dates of the shards
+
+        Returns:
+            (list): the shards with their orders or with the error if the shard failed
+        """
+        def get_shard_order_list(shard: tuple) -> tuple:
+            try:
+                return shard, self.get_order_list(*shard)
+            except SHARD_ERRORS as error:
+                return shard, error
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(get_shard_order_list, shards))
 
-        response = self.session.post(self.history_url, data=history_payload)
+    def iter_orders(self, orders: list, known_orders: dict = None):
+        """The method fetches the details of the listed orders and yields every order
+            as soon as it is ready, in the order of the list.
+
+        Args:
+            orders (list): the orders of the history list
+            known_orders (dict): the stored order numbers with their status, the orders
+                are fetched only if they are unseen or their status has changed
 
-        document = BeautifulSoup(response.text, 'html.parser')
+        Yields:
+            (tuple): order number and the order details
+        """
+        orders = _select_orders(orders, known_orders)
 
-        tables = document.find_all('table')
-        orders = []
-        for row in tables[3]:
-            result = str(row.find_all()[11]).split("'")
-            if len(result) > 2:
-                orders.append(result[1])
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            window = deque()
+            for order in orders:
+                window.append(executor.submit(self._get_order, order['url'], order['status']))
+                if len(window) >= self.max_workers:
+                    yield self._complete_order(executor, *window.popleft().result())
+            while window:
+                yield self._complete_order(executor, *window.popleft().result())
 
-        result = {}
-        for order in orders:
-            order_url = 'http://arbiko.pl/arbos/' + order
+    def _complete_order(self, executor: ThreadPoolExecutor, order_number: str, order_details: dict) -> tuple:
+        """The method fetches the oem numbers of the order products.
 
-            content = self.session.get(order_url)
-            order = BeautifulSoup(content.text, 'html.parser')
+        Args:
+            executor (ThreadPoolExecutor): the executor to fetch the oem numbers concurrently
+            order_number (str): the order number
+            order_details (dict): the order details
 
-            tbody = order.tbody
-            order_number = order.find_all('p')[1].text.split(' ')[3].strip('Status')
-            trs = tbody.contents
+        Returns:
+            (tuple): order number and the order details
+        """
+        oem_numbers = executor.map(self._get_cached_oem_number, _search_numbers(order_details))
+
+        return order_number, _set_oem_numbers(order_details, oem_numbers)
+
+    def get_order_list(self, start_date: str, end_date: str) -> list:
+        """The method fetches the history list without the order details.
+
+        Args:
+            start_date (str): start date to get order history
+            end_date (str): end date to get order history
+
+        Returns:
+            (list): the orders with the relative url of the order page,
+                the order number, the date and the status
+        """
+        content = self._fetch('POST', self.history_url, _history_payload(start_date, end_date), live=True)
+
+        return self.parser.order_list(content)
+
+    def _get_order(self, order: str, status: str = '') -> tuple:
+        """The method fetches and parses the order page.
+
+        Args:
+            order (str): relative url of the order page
+            status (str): the order status, the page is fetched again after the status change
+
+        Returns:
+            (tuple): order number and the order details with the status of the history list
+        """
+        content = self._fetch('GET', BASE_URL + order, tag=status)
+        order_number, order_details = self.parser.order(content)
+        order_details['status'] = status
 
-            table = order.find_all('table')
-            tr = table[2].find_all_next('td')
+        return order_number, order_details
 
-            order_date = [int(num) for num in tr[-25].text.split('-')]
-            order_date = datetime(order_date[0], order_date[1], order_date[2])
+    def _get_cached_oem_number(self, catalog_number: str) -> str:
+        """The method returns the cached oem number or fetches it.
 
-            result[order_number] = {'date': order_date}
-            result[order_number]['products'] = []
-            for value in trs[1:]:
-                details = value.find_all('td')[1:]
-                if len(details) > 4:
-                    cat_num, desc, _, quantity, *_ = details
-                    # The catalog number can't start at zero
-                    cat_num_without_zero = cat_num.text[1:] if cat_num.text[0] == '0' else cat_num.text
-                    product = {
-                        'catalog_number': cat_num.text,
-                        'oem_number': self.get_oem_number(cat_num_without_zero),
-                        'description': desc.text,
-                        'quantity': quantity.text,
-                    }
-                    result[order_number]['products'].append(product)
+        Args:
+            catalog_number (str): product catalog number to get oem number
 
-        return result
+        Returns:
+            (str): oem number
+        """
+        return self.oem_cache.get_or_fetch(catalog_number, self.get_oem_number)
 
     def get_oem_number(self, catalog_number: str) -> str:
         """The method fetches and return oem number for the passed catalog number.
@@ -147,16 +505,320 @@ class Arbiko:
             'keyw': catalog_number,
         }
 
-        response = self.session.post(self.search_url, data=search_payload)
-        document = BeautifulSoup(response.text, 'html.parser')
+        # fetched only when the oem number cache entry is missing or expired, the cached search result
+        # is read only in the replay mode, so it doesn't outlive the ttl of the oem number cache
+        content = self._fetch('POST', self.search_url, search_payload, live=True)
+        try:
+            return self.parser.oem_number(content)
+
+        except IndexError:
+            print(f'Problem with product number: {catalog_number}')
+            return UNKNOWN_OEM_NUMBER
+
+
+class AsyncArbiko(BaseArbiko):
+    """The asyncio counterpart of the Arbiko class.
+    The class has implemented the necessary methods to use as an async context manager.
+    All requests share one connection pool, the fan-out is limited by a semaphore.
+    The cookies of the session can be saved to skip the login on the next run.
+
+    Methods:
+        login():
+        get_order_list(start_date: str, end_date: str): fetches the history list
+            without the order details
+        get_order_history(start_date: str, end_date: str, known_orders: dict): fetches and return
+            the order history for the passed time period
+        iter_order_history(start_date: str, end_date: str, known_orders: dict): yields the orders
+            of the order history as soon as they are fetched
+        get_order_lists(shards: list): fetches the history lists of the shards concurrently
+        iter_orders(orders: list, known_orders: dict): yields the details of the listed orders
+        get_oem_number(catalog_number: str): fetches oem number for the passed catalog number
+    """
+    def __init__(self, *args, **kwargs):
+        """Construct all the necessary attributes for the async arbiko object,
+            the arguments are the same as of the Arbiko class."""
+        super().__init__(*args, **kwargs)
+        self.semaphore = None
+        self.pending = {}
+
+    async def __aenter__(self):
+        self.semaphore = asyncio.Semaphore(self.max_workers)
+        self.session = AsyncClient(
+            headers={'User-Agent': self.user_agent},
+            limits=Limits(max_connections=self.max_workers),
+        )
+        if not self.replay and not await self._restore_session() and not await self.login():
+            await self.session.aclose()
+            raise LoginError
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if self.session_store is not None and not self.replay:
+            self.session_store.save(self.session.cookies.jar)
+        await self.session.aclose()
+
+    async def _request(self, method: str, url: str, **kwargs) -> str:
+        """Send the request when the semaphore and the rate limit allow and return the response content.
+            The request is retried with the exponential backoff after the connection errors
+            and the server errors.
+
+        Args:
+            method (str): the http method
+            url (str): the requested url
+            **kwargs: the keyword arguments of the request
+
+        Returns:
+            (str): the response content
+
+        Raises:
+            TransportError, HTTPStatusError: if the request failed after all retries
+        """
+        for attempt in range(self.policy.max_retries + 1):
+            delay = self.limiter.reserve()
+            if delay:
+                self.stats.add(throttle_wait=delay)
+                await asyncio.sleep(delay)
+
+            start = monotonic()
+            self.stats.add(requests=1)
+            try:
+                async with self.semaphore:
+                    response = await self.session.request(method, url, timeout=self.policy.timeout, **kwargs)
+            except TransportError:
+                self.limiter.record(monotonic() - start, failed=True)
+                if attempt == self.policy.max_retries:
+                    self.stats.add(failures=1)
+                    raise
+            else:
+                failed = response.status_code >= 500
+                self.limiter.record(monotonic() - start, failed=failed)
+                if not failed:
+                    return response.text
+                if attempt == self.policy.max_retries:
+                    self.stats.add(failures=1)
+                    response.raise_for_status()
+
+            delay = self.policy.backoff_delay(attempt)
+            self.stats.add(retries=1, backoff_wait=delay)
+            await asyncio.sleep(delay)
+
+    async def _restore_session(self) -> bool:
+        """The method restores the saved cookies and probes if the session is still logged in.
+
+        Returns:
+            True (bool): if the restored session is logged in
+            False (bool): if there is no saved session or it has expired
+        """
+        if self.session_store is None or not self.session_store.load(self.session.cookies.jar):
+            return False
+
+        content = await self._request('GET', self.history_url, follow_redirects=True)
+        if self._is_logged_in(content):
+            return True
+
+        self.session.cookies.clear()
+        return False
+
+    async def login(self) -> bool:
+        """The method try to login at aribko.pl.
+
+        Returns:
+            True (bool): if login was correct
+            False (bool): if login was incorrectly."""
+        await self._request('POST', self.login_url, data=self._login_payload())
+
+        return self.session.cookies.get('logged') == 'yes'
+
+    async def _fetch(self, method: str, url: str, data: dict = None, tag: str = '', live: bool = False) -> str:
+        """The method returns the response content from the response cache or requests it.
+
+        Args:
+            method (str): the http method
+            url (str): the requested url
+            data (dict): the payload of the request
+            tag (str): the additional part of the cache key, e.g. the status of the order
+            live (bool): request the content even if it is cached, unless the replay mode is on
+
+        Returns:
+            content (str): the response content
+
+        Raises:
+            CacheMissError: if the response is not cached in the replay mode
+        """
+        key, content = self._cached_content(method, url, data, tag, live)
+        if content is None:
+            content = await self._request(method, url, data=data)
+            self._cache_content(key, content)
+
+        return content
+
+    async def get_order_history(self, start_date: str, end_date: str, known_orders: dict = None) -> dict:
+        """The method fetches and return the order history
+            for the passed time period.
+
+        Args:
+            start_date (str): start date to get order history
+            end_date (str): end date to get order history
+            known_orders (dict): the stored order numbers with their status, the orders
+                are fetched only if they are unseen or their status has changed
+
+        Returns:
+            (dict): fetched data
+        """
+        return {
+            order_number: order_details
+            async for order_number, order_details in self.iter_order_history(start_date, end_date, known_orders)
+        }
+
+    async def iter_order_history(self, start_date: str, end_date: str, known_orders: dict = None):
+        """The method fetches the order history for the passed time period
+            and yields every order as soon as it is ready,
+            in the order of the history list.
+
+        Args:
+            start_date (str): start date to get order history
+            end_date (str): end date to get order history
+            known_orders (dict): the stored order numbers with their status, the orders
+                are fetched only if they are unseen or their status has changed
+
+        Yields:
+            (tuple): order number and the order details
+        """
+        async for order in self.iter_orders(await self.get_order_list(start_date, end_date), known_orders):
+            yield order
+
+    async def get_order_lists(self, shards: list) -> list:
+        """The method fetches the history lists of the shards concurrently.
+            The failure of a shard doesn't stop the other shards.
+
+        Args:
+            shards (list): the start and the end dates of the shards
+
+        Returns:
+            (list): the shards with their orders or with the error if the shard failed
+        """
+        async def get_shard_order_list(shard: tuple) -> tuple:
+            try:
+                return shard, await self.get_order_list(*shard)
+            except SHARD_ERRORS as error:
+                return shard, error
+
+        return list(await asyncio.gather(*(get_shard_order_list(shard) for shard in shards)))
+
+    async def iter_orders(self, orders: list, known_orders: dict = None):
+        """The method fetches the details of the listed orders and yields every order
+            as soon as it is ready, in the order of the list.
+
+        Args:
+            orders (list): the orders of the history list
+            known_orders (dict): the stored order numbers with their status, the orders
+                are fetched only if they are unseen or their status has changed
+
+        Yields:
+            (tuple): order number and the order details
+        """
+        orders = _select_orders(orders, known_orders)
+
+        window = deque()
+        try:
+            for order in orders:
+                window.append(asyncio.ensure_future(self._get_order(order['url'], order['status'])))
+                if len(window) >= self.max_workers:
+                    yield await self._complete_order(*await window.popleft())
+            while window:
+                yield await self._complete_order(*await window.popleft())
+        finally:
+            for task in window:
+                task.cancel()
+
+    async def _complete_order(self, order_number: str, order_details: dict) -> tuple:
+        """The method fetches the oem numbers of the order products.
+
+        Args:
+            order_number (str): the order number
+            order_details (dict): the order details
+
+        Returns:
+            (tuple): order number and the order details
+        """
+        oem_numbers = await asyncio.gather(
+            *(self._get_cached_oem_number(number) for number in _search_numbers(order_details))
+        )
+
+        return order_number, _set_oem_numbers(order_details, oem_numbers)
+
+    async def get_order_list(self, start_date: str, end_date: str) -> list:
+        """The method fetches the history list without the order details.
+
+        Args:
+            start_date (str): start date to get order history
+            end_date (str): end date to get order history
+
+        Returns:
+            (list): the orders with the relative url of the order page,
+                the order number, the date and the status
+        """
+        content = await self._fetch('POST', self.history_url, _history_payload(start_date, end_date), live=True)
+
+        return self.parser.order_list(content)
+
+    async def _get_order(self, order: str, status: str = '') -> tuple:
+        """The method fetches and parses the order page.
+
+        Args:
+            order (str): relative url of the order page
+            status (str): the order status, the page is fetched again after the status change
+
+        Returns:
+            (tuple): order number and the order details with the status of the history list
+        """
+        content = await self._fetch('GET', BASE_URL + order, tag=status)
+        order_number, order_details = self.parser.order(content)
+        order_details['status'] = status
+
+        return order_number, order_details
+
+    async def _get_cached_oem_number(self, catalog_number: str) -> str:
+        """The method returns the cached oem number or fetches it.
+            The concurrent lookups of the same catalog number share one request.
+
+        Args:
+            catalog_number (str): product catalog number to get oem number
+
+        Returns:
+            (str): oem number
+        """
+        oem_number = self.oem_cache.get(catalog_number)
+        if oem_number is not None:
+            return oem_number
+
+        if catalog_number in self.pending:
+            return await self.pending[catalog_number]
+
+        # the failed lookup is not kept, so the next lookup of the catalog number fetches it again
+        self.pending[catalog_number] = asyncio.ensure_future(self.get_oem_number(catalog_number))
         try:
-            table = document.find_all('table')[2]
-            tr = table.find_all_next('tr')[1]
-            td = tr.find_all_next('td')
-            oem_numbers = td[1].get_text(separator=' ')
+            oem_number = await self.pending[catalog_number]
+            self.oem_cache.set(catalog_number, oem_number)
+            return oem_number
+        finally:
+            del self.pending[catalog_number]
+
+    async def get_oem_number(self, catalog_number: str) -> str:
+        """The method fetches and return oem number for the passed catalog number.
 
-            return oem_numbers
+        Args:
+            catalog_number (str): product catalog number to get oem number
+
+        Returns:
+            (str): oem number or string "???? ????" if was error
+        """
+        # fetched only when the oem number cache entry is missing or expired, the cached search result
+        # is read only in the replay mode, so it doesn't outlive the ttl of the oem number cache
+        content = await self._fetch('POST', self.search_url, {'keyw': catalog_number}, live=True)
+        try:
+            return self.parser.oem_number(content)
 
         except IndexError:
             print(f'Problem with product number: {catalog_number}')
-            return '???? ????'
+            return UNKNOWN_OEM_NUMBER
@@ -0,0 +1,396 @@
+"""The collections of the caches to avoid repeated requests to arbiko.pl site and repeated searches."""
+import hashlib
+import json
+import sys
+import zlib
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from http.cookiejar import CookieJar
+from pathlib import Path
+from threading import Lock
+from typing import Callable, Hashable
+
+from cryptography.fernet import InvalidToken
+from requests.cookies import create_cookie
+from sqlalchemy.orm import Session
+
+from tools.models import OemNumber, Product
+from tools.protection import Protection
+
+UNKNOWN_OEM_NUMBER = '???? ????'
+
+
+def search_number(catalog_number: str) -> str:
+    """Return the catalog number used to search the product, the catalog number can't start at zero."""
+    return catalog_number[1:] if catalog_number.startswith('0') else catalog_number
+
+
+class OemNumberCache:
+    """The persistent cache of the oem numbers keyed by the catalog number.
+    The entries are loaded from the database once and kept in memory, so the cache
+    can be used by many threads. The new entries are written back by the 'save' method.
+
+    Methods:
+        get(catalog_number: str): return the cached oem number or None
+        set(catalog_number: str, oem_number: str): store the oem number
+        get_or_fetch(catalog_number: str, fetch: Callable): return the cached oem number
+            or fetch it once for all concurrent callers
+        save(): write the new entries to the database
+    """
+    def __init__(
+            self,
+            session: Session = None,
+            ttl: timedelta = timedelta(days=180),
+            negative_ttl: timedelta = timedelta(days=7),
+    ):
+        """Construct all the necessary attributes for the cache object.
+
+        Args:
+            session (Session): database session, the cache is kept only in memory if not passed
+            ttl (timedelta): time after which the oem number is fetched again
+            negative_ttl (timedelta): time after which the unknown oem number is fetched again
+        """
+        self.session = session
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.entries = {}
+        self.changed = set()
+        self.pending = {}
+        self.lock = Lock()
+
+        if session is not None:
+            self._load()
+
+    def _load(self):
+        """Load the cache entries and the oem numbers of the stored products."""
+        for entry in self.session.query(OemNumber):
+            self.entries[entry.catalog_number] = (entry.oem_number, entry.updated_at)
+
+        now = datetime.now()
+        products = self.session.query(Product.catalog_number, Product.oem_number) \
+            .filter(Product.oem_number != UNKNOWN_OEM_NUMBER)
+        for catalog_number, oem_number in products:
+            key = search_number(catalog_number or '')
+            if key and key not in self.entries:
+                self.entries[key] = (oem_number, now)
+                self.changed.add(key)
+
+    def _is_fresh(self, oem_number: str, updated_at: datetime) -> bool:
+        """Check if the entry has not expired."""
+        ttl = self.negative_ttl if oem_number == UNKNOWN_OEM_NUMBER else self.ttl
+        return datetime.now() - updated_at < ttl
+
+    def get(self, catalog_number: str):
+        """Return the cached oem number.
+
+        Args:
+            catalog_number (str): product catalog number
+
+        Returns:
+            (str): oem number or None if it is not cached or has expired
+        """
+        with self.lock:
+            entry = self.entries.get(catalog_number)
+        if entry is not None and self._is_fresh(*entry):
+            return entry[0]
+        return None
+
+    def set(self, catalog_number: str, oem_number: str):
+        """Store the oem number.
+
+        Args:
+            catalog_number (str): product catalog number
+            oem_number (str): oem number of the product
+        """
+        with self.lock:
+            self.entries[catalog_number] = (oem_number, datetime.now())
+            self.changed.add(catalog_number)
+
+    def get_or_fetch(self, catalog_number: str, fetch: Callable[[str], str]) -> str:
+        """Return the cached oem number or fetch it.
+            The concurrent lookups of the same catalog number share one request.
+
+        Args:
+            catalog_number (str): product catalog number
+            fetch (Callable): function fetching the oem number
+
+        Returns:
+            (str): oem number
+        """
+        oem_number = self.get(catalog_number)
+        if oem_number is not None:
+            return oem_number
+
+        with self.lock:
+            future = self.pending.get(catalog_number)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self.pending[catalog_number] = future
+
+        if not is_owner:
+            return future.result()
+
+        try:
+            oem_number = fetch(catalog_number)
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        else:
+            self.set(catalog_number, oem_number)
+            future.set_result(oem_number)
+            return oem_number
+        finally:
+            with self.lock:
+                del self.pending[catalog_number]
+
+    def save(self):
+        """Write the new and the refreshed entries to the database."""
+        if self.session is None:
+            return
+
+        with self.lock:
+            changed = {key: self.entries[key] for key in self.changed}
+            self.changed.clear()
+
+        for catalog_number, (oem_number, updated_at) in changed.items():
+            self.session.merge(OemNumber(
+                catalog_number=catalog_number,
+                oem_number=oem_number,
+                updated_at=updated_at,
+            ))
+        self.session.commit()
+
+
+class ResponseCache:
+    """The on-disk cache of the server responses.
+    Every response is compressed, encrypted and stored in a separate file named by the key.
+    The least recently used responses are removed when the cache exceeds the maximum size.
+
+    Methods:
+        key(method: str, url: str, data: dict, tag: str): return the key of the request
+        get(key: str): return the cached response or None
+        set(key: str, content: str): store the response
+    """
+    def __init__(self, directory: Path, protection: Protection, max_size: int = 256 * 1024 ** 2):
+        """Construct all the necessary attributes for the cache object.
+
+        Args:
+            directory (Path): directory of the cached responses
+            protection (Protection): protection to encrypt and decrypt the responses
+            max_size (int): the maximum size of the cache in bytes
+        """
+        self.directory = directory
+        self.protection = protection
+        self.max_size = max_size
+        self.lock = Lock()
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        files = sorted(self.directory.iterdir(), key=lambda path: path.stat().st_mtime)
+        # the files ordered from the least recently used
+        self.entries = {path.name: path.stat().st_size for path in files}
+        self.size = sum(self.entries.values())
+
+    @staticmethod
+    def key(method: str, url: str, data: dict = None, tag: str = '') -> str:
+        """Return the key of the request.
+
+        Args:
+            method (str): the http method
+            url (str): the requested url
+            data (dict): the payload of the request
+            tag (str): the additional part of the key, e.g. the status of the order
+
+        Returns:
+            (str): the key of the request
+        """
+        request = json.dumps([method, url, data or {}, tag], sort_keys=True, default=str)
+        return hashlib.sha256(request.encode('utf-8')).hexdigest()
+
+    def get(self, key: str):
+        """Return the cached response.
+
+        Args:
+            key (str): the key of the request
+
+        Returns:
+            (str): the cached response or None if it is not cached or it can't be decrypted
+        """
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries[key] = self.entries.pop(key)
+
+        path = self.directory / key
+        path.touch()
+        try:
+            content = self.protection.decrypt(path.read_bytes())
+        except InvalidToken:
+            # the response encrypted with the other key, e.g. of the older version, is fetched again
+            with self.lock:
+                self.size -= self.entries.pop(key, 0)
+            path.unlink(missing_ok=True)
+            return None
+
+        return zlib.decompress(content).decode('utf-8')
+
+    def set(self, key: str, content: str):
+        """Store the response and remove the least recently used responses above the maximum size.
+
+        Args:
+            key (str): the key of the request
+            content (str): the response content
+        """
+        data = self.protection.encrypt(zlib.compress(content.encode('utf-8')))
+        (self.directory / key).write_bytes(data)
+
+        with self.lock:
+            self.size += len(data) - self.entries.pop(key, 0)
+            self.entries[key] = len(data)
+            while self.size > self.max_size and len(self.entries) > 1:
+                oldest = next(iter(self.entries))
+                self.size -= self.entries.pop(oldest)
+                (self.directory / oldest).unlink(missing_ok=True)
+
+
+class SessionStore:
+    """The encrypted file of the cookies of the logged-in session.
+    The cookies are reused by the next run, so the login is needed only after the session has expired.
+
+    Methods:
+        load(jar: CookieJar): restore the saved cookies into the cookie jar
+        save(jar: CookieJar): save the cookies of the cookie jar
+        remove(): remove the saved cookies
+    """
+    def __init__(self, path: Path, protection: Protection):
+        """Construct all the necessary attributes for the session store object.
+
+        Args:
+            path (Path): file path of the saved cookies
+            protection (Protection): protection to encrypt and decrypt the cookies
+        """
+        self.path = path
+        self.protection = protection
+
+    def load(self, jar: CookieJar) -> bool:
+        """Restore the saved cookies into the cookie jar, the expired cookies are skipped.
+
+        Args:
+            jar (CookieJar): the cookie jar of the session
+
+        Returns:
+            True (bool): if any cookie was restored
+            False (bool): if there are no saved cookies or they can't be decrypted
+        """
+        if not self.path.exists():
+            return False
+
+        try:
+            cookies = json.loads(self.protection.decrypt(self.path.read_bytes()))
+        except (InvalidToken, ValueError):
+            return False
+
+        for cookie in cookies:
+            jar.set_cookie(create_cookie(**cookie))
+        jar.clear_expired_cookies()
+
+        return len(jar) > 0
+
+    def save(self, jar: CookieJar):
+        """Save the cookies of the cookie jar.
+
+        Args:
+            jar (CookieJar): the cookie jar of the session
+        """
+        cookies = [
+            {
+                'name': cookie.name,
+                'value': cookie.value,
+                'domain': cookie.domain,
+                'path': cookie.path,
+                'expires': cookie.expires,
+                'secure': cookie.secure,
+            }
+            for cookie in jar
+        ]
+
+        temporary_path = self.path.with_name(self.path.name + '.tmp')
+        temporary_path.write_bytes(self.protection.encrypt(json.dumps(cookies).encode('utf-8')))
+        temporary_path.replace(self.path)
+
+    def remove(self):
+        """Remove the saved cookies."""
+        self.path.unlink(missing_ok=True)
+
+
+def _rows_size(rows: list) -> int:
+    """Return the approximate size of the rows in memory in bytes."""
+    return sys.getsizeof(rows) + sum(
+        sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+        for row in rows
+    )
+
+
+class QueryCache:
+    """The in-memory cache of the search results keyed by the normalized query.
+    The least recently used results are removed when the cache exceeds the maximum number
+    of the entries or the maximum size. All results are removed when the state of the database
+    has changed, so the cached results are never older than the database.
+
+    Methods:
+        get_or_search(query: Hashable, state: tuple, search: Callable): return the cached result
+            or search it and cache it
+        clear(): remove all results
+    """
+    def __init__(self, max_entries: int = 128, max_size: int = 64 * 1024 ** 2):
+        """Construct all the necessary attributes for the cache object.
+
+        Args:
+            max_entries (int): the maximum number of the cached results
+            max_size (int): the maximum approximate size of the cached results in bytes
+        """
+        self.max_entries = max_entries
+        self.max_size = max_size
+        # the results and their sizes ordered from the least recently used
+        self.entries = {}
+        self.size = 0
+        self.state = None
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_search(self, query: Hashable, state: tuple, search: Callable[[], list]) -> list:
+        """Return the cached result of the query or search it and cache it.
+
+        Args:
+            query (Hashable): the normalized query with the options of the search
+            state (tuple): the state of the database, the cache is cleared if it has changed
+            search (Callable): the function searching the result of the query
+
+        Returns:
+            (list): the found rows
+        """
+        if state != self.state:
+            self.clear()
+            self.state = state
+
+        if query in self.entries:
+            self.hits += 1
+            self.entries[query] = self.entries.pop(query)
+            return list(self.entries[query][0])
+
+        self.misses += 1
+        rows = search()
+        size = _rows_size(rows)
+        if size <= self.max_size:
+            self.entries[query] = (list(rows), size)
+            self.size += size
+            while len(self.entries) > self.max_entries or self.size > self.max_size:
+                oldest = next(iter(self.entries))
+                self.size -= self.entries.pop(oldest)[1]
+
+        return rows
+
+    def clear(self):
+        """Remove all results."""
+        self.entries = {}
+        self.size = 0
@@ -0,0 +1,85 @@
+"""The checkpoint of the order history update to resume the interrupted update."""
+import json
+from pathlib import Path
+from typing import Iterable
+
+
+class Checkpoint:
+    """The checkpoint of the order history update.
+    It keeps the updated time period, the numbers of the already stored orders
+    and the completed shards of the time period.
+
+    Methods:
+        load(): load the checkpoint of the interrupted update
+        extend(order_numbers: Iterable): add the stored orders and save the checkpoint
+        add_shard(shard: tuple): add the completed shard and save the checkpoint
+        remove(): remove the checkpoint after the completed update
+    """
+    def __init__(self, path: Path, start_date: str, end_date: str):
+        """Construct all the necessary attributes for the checkpoint object.
+
+        Args:
+            path (Path): checkpoint file path
+            start_date (str): start date of the update
+            end_date (str): end date of the update
+        """
+        self.path = path
+        self.start_date = start_date
+        self.end_date = end_date
+        self.orders = []
+        self.shards = []
+
+    def load(self) -> bool:
+        """Load the checkpoint of the interrupted update.
+
+        Returns:
+            True (bool): if the interrupted update was found
+            False (bool): if there is no checkpoint
+        """
+        if not self.path.exists():
+            return False
+
+        with open(self.path) as file:
+            content = json.load(file)
+
+        self.start_date = content['start_date']
+        self.end_date = content['end_date']
+        self.orders = content['orders']
+        self.shards = [tuple(shard) for shard in content.get('shards', [])]
+        return True
+
+    def extend(self, order_numbers: Iterable):
+        """Add the stored orders and save the checkpoint once.
+
+        Args:
+            order_numbers (Iterable): numbers of the stored orders
+        """
+        self.orders.extend(int(order_number) for order_number in order_numbers)
+        self._save()
+
+    def add_shard(self, shard: tuple):
+        """Add the completed shard and save the checkpoint.
+
+        Args:
+            shard (tuple): the start and the end dates of the shard
+        """
+        self.shards.append(tuple(shard))
+        self._save()
+
+    def _save(self):
+        """Save the checkpoint."""
+        content = {
+            'start_date': self.start_date,
+            'end_date': self.end_date,
+            'orders': self.orders,
+            'shards': self.shards,
+        }
+
+        temporary_path = self.path.with_name(self.path.name + '.tmp')
+        with open(temporary_path, 'w') as file:
+            json.dump(content, file)
+        temporary_path.replace(self.path)
+
+    def remove(self):
+        """Remove the checkpoint after the completed update."""
+        self.path.unlink(missing_ok=True)
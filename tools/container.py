@@ -0,0 +1,349 @@
+"""The versioned container of the independently encrypted chunks of the database file.
+
+The file starts with the header: the magic bytes, the format version, the key derivation
+function with its parameters and the random salt, the compression codec with its level,
+the chunk size and the random nonce prefix. The first version of the format has no key
+derivation in the header, its key is derived with the fixed salt, the versions before
+the third one have no compression. Every chunk is compressed, kept uncompressed if it doesn't
+get smaller, encrypted with AES-GCM and stored with its length, the last and the compressed
+chunks are marked in the length. The chunk index and the marks are authenticated with
+the header, so the chunks can't be reordered, dropped or cut off. The file ends with
+the HMAC of the header and of all chunk tags.
+"""
+import hmac
+import lzma
+import os
+import struct
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from hashlib import sha256
+from typing import BinaryIO, Callable, Iterator, Optional
+import zlib
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+
+from tools.exceptions import CorruptedFileError
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+MAGIC = b'ARBIKO'
+VERSION = 3
+PREFIX = struct.Struct('>6sB')
+HEADERS = {
+    1: struct.Struct('>6sBI8s'),
+    2: struct.Struct('>6sBBIHB16sI8s'),
+    3: struct.Struct('>6sBBIHB16sBbI8s'),
+}
+HEADER = HEADERS[VERSION]
+CHUNK_LENGTH = struct.Struct('>I')
+LAST_CHUNK = 0x80000000
+COMPRESSED_CHUNK = 0x40000000
+CHUNK_MARKS = LAST_CHUNK | COMPRESSED_CHUNK
+TAG_SIZE = 16
+MAC_SIZE = 32
+CHUNK_SIZE = 1024 ** 2
+PBKDF2 = 1
+SCRYPT = 2
+SALT_SIZE = 16
+CODECS = {'none': 0, 'zlib': 1, 'lzma': 2, 'zstd': 3}
+DEFAULT_LEVELS = {'none': 0, 'zlib': 6, 'lzma': 6, 'zstd': 3}
+# the levels accepted by the codecs, stored in the header as a signed byte
+LEVELS = {'none': range(0, 1), 'zlib': range(-1, 10), 'lzma': range(0, 10), 'zstd': range(-128, 23)}
+AVAILABLE_CODECS = tuple(codec for codec in CODECS if codec != 'zstd' or zstandard is not None)
+
+
+@dataclass(frozen=True)
+class KeyDerivation:
+    """The key derivation function with its parameters and the salt stored in the header.
+
+    Attributes:
+        algorithm (int): PBKDF2 or SCRYPT
+        cost (int): the number of the iterations of PBKDF2 or the cpu and memory cost of scrypt
+        block_size (int): the block size of scrypt
+        parallelization (int): the parallelization of scrypt
+        salt (bytes): the random salt of the file
+
+    Methods:
+        derive(password: bytes): derive the 32 bytes key from the password
+    """
+    algorithm: int = SCRYPT
+    cost: int = 2 ** 17
+    block_size: int = 8
+    parallelization: int = 1
+    salt: bytes = field(default_factory=lambda: os.urandom(SALT_SIZE))
+
+    def derive(self, password: bytes) -> bytes:
+        """Derive the key from the password.
+
+        Args:
+            password (bytes): the password
+
+        Returns:
+            (bytes): 32 bytes key
+
+        Raises:
+            CorruptedFileError: if the algorithm or the parameters are unknown
+        """
+        try:
+            if self.algorithm == PBKDF2:
+                kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=self.salt, iterations=self.cost)
+            elif self.algorithm == SCRYPT:
+                kdf = Scrypt(salt=self.salt, length=32, n=self.cost, r=self.block_size, p=self.parallelization)
+            else:
+                raise CorruptedFileError(f'The key derivation {self.algorithm} is unknown.')
+            return kdf.derive(password)
+        except ValueError as error:
+            raise CorruptedFileError('The key derivation parameters are invalid.') from error
+
+
+@dataclass(frozen=True)
+class Compression:
+    """The compression codec of the chunks with its level stored in the header.
+
+    Attributes:
+        codec (str): the name of the codec, one of CODECS
+        level (int): the compression level of the codec, the default level of the codec if not passed
+
+    Methods:
+        compress(data: bytes): compress the chunk
+        decompress(data: bytes, max_size: int): decompress the chunk not longer than the passed size
+    """
+    codec: str = 'zlib'
+    level: Optional[int] = None
+
+    def __post_init__(self):
+        if self.codec not in CODECS:
+            raise ValueError(f'The compression codec {self.codec} is unknown.')
+        if self.codec == 'zstd' and zstandard is None:
+            raise ValueError('The zstd compression requires the zstandard package.')
+        if self.level is None:
+            object.__setattr__(self, 'level', DEFAULT_LEVELS[self.codec])
+        levels = LEVELS[self.codec]
+        if self.level not in levels:
+            raise ValueError(
+                f'The level of the {self.codec} compression must be from {levels.start} to {levels.stop - 1}.'
+            )
+
+    def compress(self, data: bytes) -> bytes:
+        """Compress and return the chunk."""
+        if self.codec == 'zlib':
+            return zlib.compress(data, self.level)
+        if self.codec == 'lzma':
+            return lzma.compress(data, preset=self.level)
+        if self.codec == 'zstd':
+            return zstandard.ZstdCompressor(level=self.level).compress(data)
+        return data
+
+    def decompress(self, data: bytes, max_size: int) -> bytes:
+        """Decompress and return the chunk.
+
+        Args:
+            data (bytes): the compressed chunk
+            max_size (int): the chunk size, the longer chunk is not decompressed
+
+        Returns:
+            (bytes): the decompressed chunk
+
+        Raises:
+            CorruptedFileError: if the chunk can't be decompressed or it is longer than the chunk size
+        """
+        try:
+            if self.codec == 'zlib':
+                decompressor = zlib.decompressobj()
+                content = decompressor.decompress(data, max_size)
+                complete = decompressor.eof and not decompressor.unconsumed_tail
+            elif self.codec == 'lzma':
+                decompressor = lzma.LZMADecompressor()
+                content = decompressor.decompress(data, max_size)
+                complete = decompressor.eof and not decompressor.unused_data
+            elif self.codec == 'zstd':
+                content = zstandard.ZstdDecompressor().decompress(data, max_output_size=max_size)
+                complete = len(content) <= max_size
+            else:
+                content, complete = bytes(data), True
+        except (zlib.error, lzma.LZMAError) as error:
+            raise CorruptedFileError('The chunk can\'t be decompressed.') from error
+        except Exception as error:
+            if zstandard is not None and isinstance(error, zstandard.ZstdError):
+                raise CorruptedFileError('The chunk can\'t be decompressed.') from error
+            raise
+
+        if not complete:
+            raise CorruptedFileError('The chunk is longer than the chunk size.')
+        return content
+
+
+def _compression(codec: int, level: int) -> Compression:
+    """Return the compression of the codec number and the level read from the header."""
+    names = {number: name for name, number in CODECS.items()}
+    try:
+        return Compression(names[codec], level)
+    except (KeyError, ValueError) as error:
+        raise CorruptedFileError(f'The compression codec {codec} is unknown or not available.') from error
+
+
+def is_container(prefix: bytes) -> bool:
+    """Check if the file starting with the passed bytes is the container."""
+    return prefix.startswith(MAGIC)
+
+
+def _subkeys(key: bytes) -> tuple:
+    """Return the chunk encryption key and the file authentication key derived from the key."""
+    material = HKDF(algorithm=hashes.SHA256(), length=64, salt=None, info=b'arbiko container').derive(key)
+    return AESGCM(material[:32]), material[32:]
+
+
+def _associated_data(header: bytes, index: int, last: bool, compressed: bool) -> bytes:
+    """Return the data authenticated with the chunk, the mark of the compressed chunk
+        is added only if it is set, as the older versions have no compressed chunks."""
+    return header + struct.pack('>I?', index, last) + (b'\x01' if compressed else b'')
+
+
+def _chunks(data: memoryview, chunk_size: int) -> Iterator[tuple]:
+    """Yield the index, the content and the mark of the last chunk of the data."""
+    count = max(1, -(-len(data) // chunk_size))
+    for index in range(count):
+        yield index, data[index * chunk_size:(index + 1) * chunk_size], index == count - 1
+
+
+def write(file: BinaryIO, data: bytes, key: bytes, key_derivation: KeyDerivation,
+          compression: Compression = Compression(), chunk_size: int = CHUNK_SIZE, max_workers: int = None):
+    """Compress and encrypt the data into the container.
+        The chunks are compressed and encrypted concurrently and written in order,
+        at most two chunks per worker are kept in memory.
+
+    Args:
+        file (BinaryIO): the file open for writing
+        data (bytes): the data to encrypt
+        key (bytes): the 32 bytes key
+        key_derivation (KeyDerivation): the derivation of the key stored in the header
+        compression (Compression): the compression of the chunks
+        chunk_size (int): the size of the chunk in bytes
+        max_workers (int): the number of the threads encrypting the chunks, the number of cpus if not passed
+    """
+    cipher, mac_key = _subkeys(key)
+    nonce_prefix = os.urandom(8)
+    header = HEADER.pack(
+        MAGIC, VERSION, key_derivation.algorithm, key_derivation.cost, key_derivation.block_size,
+        key_derivation.parallelization, key_derivation.salt, CODECS[compression.codec], compression.level,
+        chunk_size, nonce_prefix,
+    )
+    mac = hmac.new(mac_key, header, sha256)
+    file.write(header)
+
+    def encrypt(chunk: tuple) -> tuple:
+        index, content, last = chunk
+        compressed = compression.compress(content)
+        is_compressed = len(compressed) < len(content)
+        nonce = nonce_prefix + struct.pack('>I', index)
+        associated_data = _associated_data(header, index, last, is_compressed)
+        return last, is_compressed, cipher.encrypt(nonce, compressed if is_compressed else content, associated_data)
+
+    max_workers = max_workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        window = deque()
+        for chunk in _chunks(memoryview(data), chunk_size):
+            window.append(executor.submit(encrypt, chunk))
+            if len(window) >= 2 * max_workers:
+                _write_chunk(file, mac, *window.popleft().result())
+        while window:
+            _write_chunk(file, mac, *window.popleft().result())
+
+    file.write(mac.digest())
+
+
+def _write_chunk(file: BinaryIO, mac, last: bool, compressed: bool, encrypted: bytes):
+    """Write the encrypted chunk and add its tag to the file authentication."""
+    file.write(CHUNK_LENGTH.pack(
+        len(encrypted) | (LAST_CHUNK if last else 0) | (COMPRESSED_CHUNK if compressed else 0)
+    ))
+    file.write(encrypted)
+    mac.update(encrypted[-TAG_SIZE:])
+
+
+def read(file: BinaryIO, key_for: Callable[[Optional[KeyDerivation]], bytes], max_workers: int = None) -> bytearray:
+    """Decrypt and decompress the data of the container.
+        The chunks are decrypted and decompressed concurrently and joined in order.
+
+    Args:
+        file (BinaryIO): the file open for reading
+        key_for (Callable): return the 32 bytes key for the key derivation of the header,
+            None for the first version of the format
+        max_workers (int): the number of the threads decrypting the chunks, the number of cpus if not passed
+
+    Returns:
+        (bytearray): the decrypted data
+
+    Raises:
+        CorruptedFileError: if the file is not the container, a chunk or the whole file fails the authentication
+    """
+    header = _read_exactly(file, PREFIX.size)
+    magic, version = PREFIX.unpack(header)
+    if magic != MAGIC or version not in HEADERS:
+        raise CorruptedFileError('The file has an unknown format.')
+
+    header += _read_exactly(file, HEADERS[version].size - PREFIX.size)
+    compression = Compression('none')
+    if version == 1:
+        _, _, chunk_size, nonce_prefix = HEADERS[version].unpack(header)
+        key_derivation = None
+    elif version == 2:
+        _, _, *parameters, chunk_size, nonce_prefix = HEADERS[version].unpack(header)
+        key_derivation = KeyDerivation(*parameters)
+    else:
+        _, _, *parameters, codec, level, chunk_size, nonce_prefix = HEADERS[version].unpack(header)
+        key_derivation = KeyDerivation(*parameters)
+        compression = _compression(codec, level)
+
+    cipher, mac_key = _subkeys(key_for(key_derivation))
+    mac = hmac.new(mac_key, header, sha256)
+
+    def decrypt(index: int, encrypted: bytes, last: bool, compressed: bool) -> bytes:
+        nonce = nonce_prefix + struct.pack('>I', index)
+        try:
+            content = cipher.decrypt(nonce, encrypted, _associated_data(header, index, last, compressed))
+        except InvalidTag as error:
+            raise CorruptedFileError(f'The chunk {index} failed the authentication.') from error
+        return compression.decompress(content, chunk_size) if compressed else content
+
+    data = bytearray()
+    max_workers = max_workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        window = deque()
+        index = 0
+        last = False
+        while not last:
+            length = CHUNK_LENGTH.unpack(_read_exactly(file, CHUNK_LENGTH.size))[0]
+            last = bool(length & LAST_CHUNK)
+            if length & ~CHUNK_MARKS > chunk_size + TAG_SIZE:
+                raise CorruptedFileError(f'The chunk {index} is longer than the chunk size.')
+            encrypted = _read_exactly(file, length & ~CHUNK_MARKS)
+            mac.update(encrypted[-TAG_SIZE:])
+            window.append(executor.submit(decrypt, index, encrypted, last, bool(length & COMPRESSED_CHUNK)))
+            index += 1
+            if len(window) >= 2 * max_workers:
+                data += window.popleft().result()
+        while window:
+            data += window.popleft().result()
+
+    if not hmac.compare_digest(mac.digest(), _read_exactly(file, MAC_SIZE)) or file.read(1):
+        raise CorruptedFileError('The file failed the authentication.')
+
+    return data
+
+
+def _read_exactly(file: BinaryIO, size: int) -> bytes:
+    """Read the passed number of bytes or raise the error if the file is cut off."""
+    content = file.read(size)
+    if len(content) != size:
+        raise CorruptedFileError('The file is cut off.')
+    return content
@@ -1,40 +1,90 @@
 """The collections of tools to manage the database."""
 from pathlib import Path
-from sqlalchemy import create_engine, text
+from sqlalchemy import Connection, create_engine, inspect, text
+from sqlalchemy.schema import CreateColumn
 from sqlalchemy.orm import Session
 from typing import Type
 
 from tools.models import Base
+from tools.container import Compression, KeyDerivation
+from tools.journal import Journal
 from tools.protection import Protection
+from tools.search import SEARCH_INDEXES, create_search_index
+
+# the header of the sqlite image, the older files keep the sql text dump instead
+SQLITE_HEADER = b'SQLite format 3\x00'
+# the statements merging the duplicated rows stored before the unique indexes were added
+DEDUPLICATION_SCRIPTS = (
+    'CREATE TEMP TABLE kept_products AS SELECT id, MIN(id) OVER '
+    '(PARTITION BY catalog_number, oem_number, description) AS kept_id FROM products',
+    'UPDATE orders_products SET product_id = '
+    '(SELECT kept_id FROM kept_products WHERE kept_products.id = orders_products.product_id) '
+    'WHERE product_id IN (SELECT id FROM kept_products WHERE id != kept_id)',
+    'DELETE FROM products WHERE id IN (SELECT id FROM kept_products WHERE id != kept_id)',
+    'DROP TABLE kept_products',
+    # the product listed more than once in the same order keeps one line with the summed quantity
+    'UPDATE orders_products SET quantity = (SELECT SUM(line.quantity) FROM orders_products AS line '
+    'WHERE line.order_id = orders_products.order_id AND line.product_id = orders_products.product_id) '
+    'WHERE id IN (SELECT MIN(id) FROM orders_products GROUP BY order_id, product_id HAVING COUNT(*) > 1)',
+    'DELETE FROM orders_products WHERE id NOT IN (SELECT MIN(id) FROM orders_products GROUP BY order_id, product_id)',
+    'CREATE TEMP TABLE kept_orders AS SELECT id, MIN(id) OVER (PARTITION BY order_number) AS kept_id FROM orders',
+    'UPDATE orders_products SET order_id = '
+    '(SELECT kept_id FROM kept_orders WHERE kept_orders.id = orders_products.order_id) '
+    'WHERE order_id IN (SELECT id FROM kept_orders WHERE id != kept_id)',
+    'DELETE FROM orders WHERE id IN (SELECT id FROM kept_orders WHERE id != kept_id)',
+    'DROP TABLE kept_orders',
+    # the lines of the order stored twice are the copies of the same lines
+    'DELETE FROM orders_products WHERE id NOT IN (SELECT MIN(id) FROM orders_products GROUP BY order_id, product_id)',
+)
 
 
 class Database:
     """The collections of the tools to manage the database.
     The class has implemented the necessary methods to use as a context manager.
+    The database is saved on exit only if it was loaded or created and changed since,
+    it is never saved after the failed load. The rows changed since the load are appended to the journal,
+    the whole database file is saved if the schema was changed or the journal is full.
 
     Methods:
          create_database(): create the database if not exists
-         dump(): dump the data from the database and return as bytes
-         load(): load the data from the protected file and load it to database
+         state(): return the change counters of the database
+         is_changed(): check if the database was changed since it was loaded
+         save(): append the changes to the journal or save the whole database file
+         dump(): dump the database image and return as bytes
+         load(): load the database image or the older sql text dump from the protected file
+            and replay the journal
+         migrate(connection: Connection): add the missing columns, deduplicate the rows
+            of the older databases and create the missing indexes and the full-text index
     """
-    def __init__(self, database_path: Path, password: str):
+    def __init__(self, database_path: Path, password: str, key_derivation: KeyDerivation = None,
+                 compression: Compression = None):
         """Construct all the necessary attributes for the database object.
 
         Args:
             database_path (Path): database path
             password (str): database password
+            key_derivation (KeyDerivation): the key derivation of the saved file,
+                the one of the read file or the default one if not passed
+            compression (Compression): the compression of the saved file, zlib if not passed
         """
         self.database_path = database_path
         self.engine = create_engine(f'sqlite:///:memory:', future=True)
         self.password = password
+        self.protection = Protection(password, database_path, key_derivation, compression)
+        self.journal = Journal(database_path.with_name(database_path.name + '.journal'), self.protection)
         self.session = None
+        # the change counters of the loaded database, None if the database must be saved
+        self.loaded_state = None
+        # the database was loaded or created, it is never saved otherwise, e.g. after the failed load
+        self.loaded = False
 
     def __enter__(self):
         self.create_session()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        Protection(self.password, self.database_path).save_database_dump(self.dump())
+        if self.loaded and self.is_changed():
+            self.save()
         self.session.close()
 
     def create_database(self):
@@ -43,6 +93,108 @@ class Database:
             raise FileExistsError
 
         Base.metadata.create_all(self.engine)
+        with self.engine.begin() as connection:
+            create_search_index(connection)
+        self.loaded = True
+
+    def state(self) -> tuple:
+        """Return the number of the changed rows and the version of the schema of the database,
+            the state is changed by any write to the database."""
+        connection = self.engine.raw_connection()
+        try:
+            schema_version, = connection.driver_connection.execute('PRAGMA schema_version').fetchone()
+            return connection.driver_connection.total_changes, schema_version
+        finally:
+            connection.close()
+
+    def is_changed(self) -> bool:
+        """Check if the database was changed since it was loaded.
+
+        Returns:
+            True (bool): if the database was created, changed or loaded from the older format
+            False (bool): if the database is the same as the loaded file
+        """
+        return self.loaded_state is None or self.state() != self.loaded_state
+
+    def save(self):
+        """Append the rows changed since the load to the journal.
+            The whole database file is saved and the journal is removed instead
+            if the database wasn't loaded from the current format, its schema was changed
+            or the journal is full.
+        """
+        if self.loaded_state is None or self.state()[1] != self.loaded_state[1] or self.journal.is_full():
+            self.protection.save_database_dump(self.dump())
+            self.journal.remove()
+        else:
+            changes = self._changes()
+            if changes:
+                self.journal.append(changes)
+
+        self._track_changes()
+        self.loaded_state = self.state()
+
+    def _track_changes(self):
+        """Record the primary keys of the inserted, updated and deleted rows in the temporary table.
+            The keys are not unique, as the conflict clause of the upsert would apply to the triggers."""
+        connection = self.engine.raw_connection()
+        try:
+            script = ['CREATE TEMP TABLE IF NOT EXISTS journal_changes (table_name, key)']
+            for table in Base.metadata.sorted_tables:
+                key = table.primary_key.columns[0].name
+                for event, rows in (('INSERT', ('NEW',)), ('UPDATE', ('OLD', 'NEW')), ('DELETE', ('OLD',))):
+                    inserts = ' '.join(
+                        f"INSERT INTO journal_changes VALUES ('{table.name}', {row}.{key});" for row in rows
+                    )
+                    script.append(
+                        f'CREATE TEMP TRIGGER IF NOT EXISTS journal_{table.name}_{event.lower()} '
+                        f'AFTER {event} ON main.{table.name} BEGIN {inserts} END'
+                    )
+            script.append('DELETE FROM journal_changes')
+            connection.driver_connection.executescript(';\n'.join(script) + ';')
+        finally:
+            connection.close()
+
+    def _changes(self) -> dict:
+        """Return the columns, the changed rows and the primary keys of the changed rows per table."""
+        connection = self.engine.raw_connection()
+        try:
+            changes = {}
+            for table in Base.metadata.sorted_tables:
+                key = table.primary_key.columns[0].name
+                changed = f"SELECT DISTINCT key FROM journal_changes WHERE table_name = '{table.name}'"
+                keys = [row[0] for row in connection.driver_connection.execute(changed)]
+                if not keys:
+                    continue
+                columns = [column.name for column in table.columns if column.computed is None]
+                rows = connection.driver_connection.execute(
+                    f'SELECT {", ".join(columns)} FROM {table.name} WHERE {key} IN ({changed})'
+                ).fetchall()
+                changes[table.name] = {'columns': columns, 'keys': keys, 'rows': rows}
+            return changes
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _replay(driver_connection, changes: dict):
+        """Replace the changed rows of the tables with the rows of the journal segment.
+
+        Args:
+            driver_connection: the sqlite connection
+            changes (dict): the columns, the changed rows and the primary keys of the changed rows per table
+        """
+        tables = [table for table in Base.metadata.sorted_tables if table.name in changes]
+        with driver_connection:
+            for table in reversed(tables):
+                key = table.primary_key.columns[0].name
+                driver_connection.executemany(
+                    f'DELETE FROM {table.name} WHERE {key} = ?', [(value,) for value in changes[table.name]['keys']]
+                )
+            for table in tables:
+                columns = changes[table.name]['columns']
+                driver_connection.executemany(
+                    f'INSERT INTO {table.name} ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})',
+                    changes[table.name]['rows'],
+                )
 
     def create_session(self):
         """Create database session."""
@@ -50,18 +202,77 @@ class Database:
             self.session = session
 
     def dump(self) -> bytes:
-        """Dump the data from the database and return as bytes."""
+        """Dump the database image and return as bytes."""
         connection = self.engine.raw_connection()
-        result = b''
+        try:
+            return connection.driver_connection.serialize()
+        finally:
+            connection.close()
 
-        for line in connection.iterdump():
-            result += bytes('%s\n', 'utf8') % bytes(line, 'utf8')
+    def load(self):
+        """Load the database image from the protected file and replay the journal.
+            The sql text dump of the older files is executed instead
+            and the database is saved as the image on exit.
+            The database file is saved on exit also if the journal is full.
+        """
+        content = self.protection.decrypt_file()
+        is_image = content.startswith(SQLITE_HEADER)
 
-        return result
+        connection = self.engine.raw_connection()
+        try:
+            if is_image:
+                connection.driver_connection.deserialize(content)
+            else:
+                connection.driver_connection.executescript(content.decode('utf-8'))
+            for changes in self.journal.read():
+                self._replay(connection.driver_connection, changes)
+        finally:
+            connection.close()
 
-    def load(self):
-        """Load the data from the protected file and load it to database."""
-        content = Protection(self.password, self.database_path).decrypt_file()
-        scripts = content.split(';')
-        for script in scripts:
-            self.session.execute(text(script))
+        # create the tables missing in the older databases
+        Base.metadata.create_all(self.engine)
+        with self.engine.begin() as connection:
+            self.migrate(connection)
+
+        # the older formats are converted by saving the database
+        if is_image and not self.protection.outdated and not self.journal.is_full():
+            self._track_changes()
+            self.loaded_state = self.state()
+        self.loaded = True
+
+    @staticmethod
+    def migrate(connection: Connection):
+        """Add the missing columns, merge the duplicated orders, products and order lines
+            of the older databases and create the missing indexes and the full-text index.
+            The duplicated rows are merged into the oldest row.
+
+        Args:
+            connection (Connection): database connection
+        """
+        inspector = inspect(connection)
+        for table in Base.metadata.sorted_tables:
+            columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in columns:
+                    definition = CreateColumn(column).compile(dialect=connection.dialect)
+                    connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {definition}'))
+
+        indexes = {
+            index['name']
+            for table in Base.metadata.sorted_tables
+            for index in inspector.get_indexes(table.name)
+        }
+        missing = [
+            index
+            for table in Base.metadata.sorted_tables
+            for index in table.indexes
+            if index.name not in indexes
+        ]
+        if any(index.unique for index in missing):
+            for script in DEDUPLICATION_SCRIPTS:
+                connection.execute(text(script))
+        for index in missing:
+            index.create(connection)
+
+        tables = inspector.get_table_names()
+        create_search_index(connection, [name for name in SEARCH_INDEXES if name not in tables])
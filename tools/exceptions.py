@@ -8,3 +8,11 @@ class ExitException(Exception):
 
 class LoginError(Exception):
     pass
+
+
+class CacheMissError(Exception):
+    pass
+
+
+class CorruptedFileError(Exception):
+    pass
@@ -0,0 +1,156 @@
+"""The bulk writer of the fetched orders to the database."""
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from tools.checkpoint import Checkpoint
+from tools.models import Order, OrderProduct, Product
+
+
+def _order_date(order_date) -> datetime:
+    """Return the order date passed as the datetime or the text in format YYYY-MM-DD."""
+    if isinstance(order_date, str):
+        return datetime.strptime(order_date, '%Y-%m-%d')
+    return order_date
+
+
+class OrderIngest:
+    """The bulk writer of the fetched orders.
+    The existing products are loaded once into the index keyed by the catalog number,
+    the oem number and the description, so the order lines are resolved in memory.
+    The queued orders, the new products and the order lines are written
+    with the bulk upserts in one transaction per batch, so the orders stored again
+    are updated in place instead of being duplicated, their lines are replaced.
+    The committed batch is saved to the disk before it is marked in the checkpoint,
+    so the checkpoint never lists the orders missing in the database file.
+
+    Methods:
+        add(order_number: str, details: dict): queue the order and write the batch if it is full
+        flush(): write the queued orders, save them and mark them in the checkpoint
+    """
+    def __init__(self, session: Session, checkpoint: Checkpoint = None, batch_size: int = 500,
+                 save: Callable[[], None] = None):
+        """Construct all the necessary attributes for the ingest object.
+
+        Args:
+            session (Session): database session
+            checkpoint (Checkpoint): checkpoint marking the written orders, not used if not passed
+            batch_size (int): the number of the orders written in one transaction
+            save (Callable): function saving the committed batch to the disk, not called if not passed
+        """
+        self.session = session
+        self.checkpoint = checkpoint
+        self.save = save
+        self.batch_size = max(1, batch_size)
+        self.orders = []
+
+        self.products = {}
+        query = session.query(Product.id, Product.catalog_number, Product.oem_number, Product.description) \
+            .order_by(Product.id)
+        for product_id, *key in query:
+            self.products.setdefault(tuple(key), product_id)
+
+    def add(self, order_number: str, details: dict):
+        """Queue the order and write the batch if it is full.
+
+        Args:
+            order_number (str): the order number
+            details (dict): the order details
+        """
+        self.orders.append((order_number, details))
+        if len(self.orders) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write the queued orders with their products in one transaction, save them to the disk
+            and mark them in the checkpoint."""
+        if not self.orders:
+            return
+
+        new_products = list(dict.fromkeys(
+            key
+            for _, details in self.orders
+            for key in map(self._product_key, details['products'])
+            if key not in self.products
+        ))
+        try:
+            self._write(new_products)
+        except BaseException:
+            self.session.rollback()
+            for key in new_products:
+                self.products.pop(key, None)
+            raise
+
+        if self.save:
+            self.save()
+        if self.checkpoint:
+            self.checkpoint.extend(order_number for order_number, _ in self.orders)
+        self.orders.clear()
+
+    def _write(self, new_products: list):
+        """Upsert the new products, the queued orders and their lines and commit them."""
+        if new_products:
+            statement = insert(Product)
+            statement = statement.on_conflict_do_update(
+                index_elements=[Product.catalog_number, Product.oem_number, Product.description],
+                # the no-op update returns the id of the stored product
+                set_={'catalog_number': statement.excluded.catalog_number},
+            )
+            product_ids = self.session.scalars(
+                statement.returning(Product.id, sort_by_parameter_order=True),
+                [
+                    {'catalog_number': catalog_number, 'oem_number': oem_number, 'description': description}
+                    for catalog_number, oem_number, description in new_products
+                ],
+            ).all()
+            self.products.update(zip(new_products, product_ids))
+
+        statement = insert(Order)
+        statement = statement.on_conflict_do_update(
+            index_elements=[Order.order_number],
+            set_={'date': statement.excluded.date, 'status': statement.excluded.status},
+        )
+        # the order queued again keeps its last fetched details, so its lines are not added twice
+        orders = list(dict(self.orders).items())
+        order_ids = self.session.scalars(
+            statement.returning(Order.id, sort_by_parameter_order=True),
+            [
+                {
+                    'order_number': order_number,
+                    'date': _order_date(details['date']).date(),
+                    'status': details.get('status'),
+                }
+                for order_number, details in orders
+            ],
+        ).all()
+        # the lines of the orders stored again are replaced by the fetched lines
+        self.session.execute(delete(OrderProduct).where(OrderProduct.order_id.in_(order_ids)))
+
+        order_products = [
+            {
+                'order_id': order_id,
+                'product_id': self.products[self._product_key(product)],
+                'quantity': product['quantity'],
+            }
+            for order_id, (_, details) in zip(order_ids, orders)
+            for product in details['products']
+        ]
+        if order_products:
+            statement = insert(OrderProduct)
+            # the product listed more than once in the order is stored as one line with the summed quantity,
+            # the stored lines of the orders are deleted above, so only the lines of the batch are summed
+            statement = statement.on_conflict_do_update(
+                index_elements=[OrderProduct.order_id, OrderProduct.product_id],
+                set_={'quantity': OrderProduct.quantity + statement.excluded.quantity},
+            )
+            self.session.execute(statement, order_products)
+
+        self.session.commit()
+
+    @staticmethod
+    def _product_key(product: dict) -> tuple:
+        """Return the key of the product in the index."""
+        return product['catalog_number'], product['oem_number'], product['description']
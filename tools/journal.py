@@ -0,0 +1,119 @@
+"""The append-only journal of the changes saved after the database file.
+
+Every save of the changed database appends the segment with the rows changed since the load,
+the segment is compressed and encrypted as the container and stored with its length.
+The segment keeps the identifier of the database file it follows, the authentication code
+ending the file, so the segments of the replaced database file are not replayed.
+The segment cut off by the interrupted save is skipped and overwritten by the next one.
+The complete segment failing the authentication fails the load instead, the database isn't saved
+after the failed load, so the database file and the journal are kept for the recovery.
+"""
+import json
+import os
+import struct
+from pathlib import Path
+
+from tools import container
+from tools.exceptions import CorruptedFileError
+from tools.protection import Protection
+
+SEGMENT_LENGTH = struct.Struct('>I')
+# the journal longer than the part of the database file and the minimum size
+# is compacted into the new database file
+COMPACTION_RATIO = 0.5
+MIN_COMPACTION_SIZE = 1024 ** 2
+
+
+class Journal:
+    """The journal of the changes saved after the database file.
+
+    Methods:
+        read(): return the changes of the segments following the database file
+        append(tables: dict): append the segment with the changes of the tables
+        is_full(): check if the journal should be compacted into the database file
+        remove(): remove the journal after the database file is saved
+    """
+    def __init__(self, path: Path, protection: Protection):
+        """Construct all the necessary attributes for the journal object.
+
+        Args:
+            path (Path): journal file path
+            protection (Protection): protection of the database file encrypting the segments
+        """
+        self.path = path
+        self.protection = protection
+        # the length of the complete segments, the rest was cut off by the interrupted save
+        self.size = 0
+
+    def _base(self) -> str:
+        """Return the identifier of the database file, the authentication code ending the file."""
+        database_path = self.protection.database_path
+        if not database_path.exists() or database_path.stat().st_size < container.MAC_SIZE:
+            return ''
+        with open(database_path, 'rb') as file:
+            file.seek(-container.MAC_SIZE, os.SEEK_END)
+            return file.read().hex()
+
+    def read(self) -> list:
+        """Return the changes of the segments following the database file, in the saved order.
+
+        Returns:
+            (list): the changes of the tables per segment
+
+        Raises:
+            CorruptedFileError: if the complete segment fails the authentication
+        """
+        self.size = 0
+        if not self.path.exists():
+            return []
+
+        base = self._base()
+        segments = []
+        with open(self.path, 'rb') as file:
+            while True:
+                length = file.read(SEGMENT_LENGTH.size)
+                if len(length) < SEGMENT_LENGTH.size:
+                    break
+                content = file.read(SEGMENT_LENGTH.unpack(length)[0])
+                if len(content) < SEGMENT_LENGTH.unpack(length)[0]:
+                    break
+                try:
+                    segment = json.loads(self.protection.decrypt_container(content))
+                except (CorruptedFileError, ValueError) as error:
+                    raise CorruptedFileError(f'The journal {self.path} is corrupted.') from error
+                self.size = file.tell()
+                if segment['base'] == base:
+                    segments.append(segment['tables'])
+
+        return segments
+
+    def append(self, tables: dict):
+        """Append the segment with the changes of the tables and flush it to the disk.
+
+        Args:
+            tables (dict): the columns, the changed rows and the primary keys of the deleted rows per table
+        """
+        segment = json.dumps({'base': self._base(), 'tables': tables}).encode('utf-8')
+        content = self.protection.encrypt_container(segment)
+        with open(self.path, 'ab') as file:
+            file.truncate(self.size)
+            file.write(SEGMENT_LENGTH.pack(len(content)) + content)
+            file.flush()
+            os.fsync(file.fileno())
+            self.size = file.tell()
+
+    def is_full(self) -> bool:
+        """Check if the journal should be compacted into the database file.
+
+        Returns:
+            True (bool): if the journal is longer than the part of the database file and the minimum size
+            False (bool): if there is no journal or it is short
+        """
+        database_path = self.protection.database_path
+        database_size = database_path.stat().st_size if database_path.exists() else 0
+        return self.size > max(database_size * COMPACTION_RATIO, MIN_COMPACTION_SIZE)
+
+    def remove(self):
+        """Remove the journal after the database file is saved."""
+        self.path.unlink(missing_ok=True)
+        self.size = 0
@@ -1,34 +1,64 @@
 """The collections of the models to use in sqlachemy ORM."""
-from sqlalchemy import Integer, String, Date, ForeignKey
+from sqlalchemy import Computed, Integer, String, Date, DateTime, ForeignKey, Index
 from sqlalchemy.orm import declarative_base, mapped_column, relationship
 
 Base = declarative_base()
+# the separators removed from the catalog and the oem numbers in their search keys
+NUMBER_SEPARATORS = ' -/._,'
+
+
+def number_key_expression(column: str) -> str:
+    """Return the sql expression of the search key of the number column,
+        the upper case number without the separators and the leading zeros."""
+    expression = f'upper({column})'
+    for separator in NUMBER_SEPARATORS:
+        expression = f"replace({expression}, '{separator}', '')"
+    return f"ltrim({expression}, '0')"
 
 
 class Product(Base):
     """Model to manage products table."""
     __tablename__ = 'products'
+    __table_args__ = (
+        # the catalog number leads the identity, so the index serves also the catalog number search
+        Index('uq_products_identity', 'catalog_number', 'oem_number', 'description', unique=True),
+        Index('ix_products_catalog_key', 'catalog_key'),
+        Index('ix_products_oem_key', 'oem_key'),
+    )
 
     id = mapped_column(Integer, primary_key=True)
     catalog_number = mapped_column(String)
     oem_number = mapped_column(String)
     description = mapped_column(String)
+    # the generated search keys, computed by the database on any write
+    catalog_key = mapped_column(String, Computed(number_key_expression('catalog_number'), persisted=False))
+    oem_key = mapped_column(String, Computed(number_key_expression('oem_number'), persisted=False))
     orders = relationship('OrderProduct', back_populates='product', viewonly=True)
 
 
 class Order(Base):
     """Model to manage orders table."""
     __tablename__ = 'orders'
+    __table_args__ = (
+        Index('uq_orders_order_number', 'order_number', unique=True),
+        Index('ix_orders_date', 'date'),
+    )
 
     id = mapped_column(Integer, primary_key=True)
     order_number = mapped_column(Integer)
     date = mapped_column(Date)
+    status = mapped_column(String)
     products = relationship('OrderProduct', back_populates='order', viewonly=True)
 
 
 class OrderProduct(Base):
     """Model to associate table orders and products."""
     __tablename__ = 'orders_products'
+    __table_args__ = (
+        # the order id leads the unique index, so the index serves also the joins by the order
+        Index('uq_orders_products_order_product', 'order_id', 'product_id', unique=True),
+        Index('ix_orders_products_product_id', 'product_id'),
+    )
 
     id = mapped_column(Integer, primary_key=True)
     order_id = mapped_column(Integer, ForeignKey('orders.id'))
@@ -36,3 +66,12 @@ class OrderProduct(Base):
     quantity = mapped_column(Integer)
     product = relationship('Product', back_populates='orders')
     order = relationship('Order', back_populates='products')
+
+
+class OemNumber(Base):
+    """Model to manage oem numbers cache table."""
+    __tablename__ = 'oem_numbers'
+
+    catalog_number = mapped_column(String, primary_key=True)
+    oem_number = mapped_column(String)
+    updated_at = mapped_column(DateTime)
@@ -0,0 +1,255 @@
+"""The collections of the parsers to extract the data from arbiko.pl pages."""
+from datetime import datetime
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+from tools.cache import search_number
+
+try:
+    import lxml.html
+except ImportError:  # pragma: no cover
+    lxml = None
+
+
+def _order_date(text: str) -> datetime:
+    """Return the order date from the text in format YYYY-MM-DD."""
+    order_date = [int(num) for num in text.split('-')]
+    return datetime(order_date[0], order_date[1], order_date[2])
+
+
+def _product(cat_num: str, desc: str, quantity: str) -> dict:
+    """Return the product of the order, the oem number is fetched later."""
+    return {
+        'catalog_number': cat_num,
+        'oem_number': None,
+        'description': desc,
+        'quantity': quantity,
+        'search_number': search_number(cat_num),
+    }
+
+
+class SoupParser:
+    """The parser using the BeautifulSoup tree.
+
+    Methods:
+        order_list(content: str): parse the history list
+        order(content: str): parse the order page
+        oem_number(content: str): parse the search result
+    """
+    def __init__(self, features: str = 'html.parser', restricted: bool = False):
+        """Construct all the necessary attributes for the parser object.
+
+        Args:
+            features (str): the BeautifulSoup tree builder
+            restricted (bool): build the tree only from the elements used in the extraction
+        """
+        self.features = features
+        self.restricted = restricted
+
+    def _document(self, content: str, *names: str) -> BeautifulSoup:
+        """Build the document tree, restricted to the passed elements if enabled."""
+        parse_only = SoupStrainer(list(names)) if self.restricted else None
+        return BeautifulSoup(content, self.features, parse_only=parse_only)
+
+    def order_list(self, content: str) -> list:
+        """Parse the history list and return the listed orders.
+
+        Args:
+            content (str): html of the history list
+
+        Returns:
+            orders (list): the orders with the relative url of the order page,
+                the order number, the date and the status
+
+        Raises:
+            IndexError: if the page isn't the history list
+        """
+        document = self._document(content, 'table')
+
+        tables = document.find_all('table')
+        if tables[3].find('tr') is None:
+            raise IndexError('The history list has no rows.')
+
+        orders = []
+        for row in tables[3]:
+            result = str(row.find_all()[11]).split("'")
+            if len(result) > 2:
+                tds = row.find_all('td')
+                orders.append({
+                    'url': result[1],
+                    'order_number': tds[1].text.strip(),
+                    'date': tds[0].text.strip(),
+                    'status': tds[-2].text.strip(),
+                })
+
+        return orders
+
+    def order(self, content: str) -> tuple:
+        """Parse the order page.
+            The oem numbers are not fetched, every product keeps
+            the catalog number to search it as 'search_number'.
+
+        Args:
+            content (str): html of the order page
+
+        Returns:
+            (tuple): order number and the order details
+
+        Raises:
+            IndexError: if the page isn't the order page
+        """
+        order = self._document(content, 'p', 'table')
+
+        tbody = order.tbody
+        order_number = order.find_all('p')[1].text.split(' ')[3].strip('Status')
+        trs = tbody.contents
+
+        table = order.find_all('table')
+        tr = table[2].find_all_next('td')
+
+        order_details = {'date': _order_date(tr[-25].text), 'products': []}
+        for value in trs[1:]:
+            details = value.find_all('td')[1:]
+            if len(details) > 4:
+                cat_num, desc, _, quantity, *_ = details
+                order_details['products'].append(_product(cat_num.text, desc.text, quantity.text))
+
+        return order_number, order_details
+
+    def oem_number(self, content: str) -> str:
+        """Parse the search result and return the oem numbers.
+
+        Args:
+            content (str): html of the search result
+
+        Returns:
+            (str): oem numbers
+
+        Raises:
+            IndexError: if the search result doesn't contain the product
+        """
+        document = self._document(content, 'table')
+        table = document.find_all('table')[2]
+        tr = table.find_all_next('tr')[1]
+        td = tr.find_all_next('td')
+
+        return td[1].get_text(separator=' ')
+
+
+class LxmlParser:
+    """The parser using the lxml tree and the xpath queries.
+
+    Methods:
+        order_list(content: str): parse the history list
+        order(content: str): parse the order page
+        oem_number(content: str): parse the search result
+    """
+    @staticmethod
+    def _document(content: str):
+        """Build the document tree, the empty page fails like the page without the parsed elements."""
+        try:
+            return lxml.html.fromstring(content)
+        except lxml.etree.ParserError as error:
+            raise IndexError('The page is empty.') from error
+
+    def order_list(self, content: str) -> list:
+        """Parse the history list and return the listed orders.
+
+        Args:
+            content (str): html of the history list
+
+        Returns:
+            orders (list): the orders with the relative url of the order page,
+                the order number, the date and the status
+
+        Raises:
+            IndexError: if the page isn't the history list
+        """
+        document = self._document(content)
+        if not document.xpath('(//table)[4]//tr'):
+            raise IndexError('The history list has no rows.')
+
+        orders = []
+        for button in document.xpath('(//table)[4]//input[@onclick]'):
+            result = button.get('onclick').split("'")
+            if len(result) > 2:
+                tds = button.xpath('ancestor::tr[1]/td')
+                orders.append({
+                    'url': result[1],
+                    'order_number': tds[1].text_content().strip(),
+                    'date': tds[0].text_content().strip(),
+                    'status': tds[-2].text_content().strip(),
+                })
+
+        return orders
+
+    def order(self, content: str) -> tuple:
+        """Parse the order page.
+            The oem numbers are not fetched, every product keeps
+            the catalog number to search it as 'search_number'.
+
+        Args:
+            content (str): html of the order page
+
+        Returns:
+            (tuple): order number and the order details
+
+        Raises:
+            IndexError: if the page isn't the order page
+        """
+        order = self._document(content)
+
+        order_number = order.xpath('//p')[1].text_content().split(' ')[3].strip('Status')
+        trs = order.xpath('(//tbody)[1]/tr')
+        tr = order.xpath('(//table)[3]/descendant::td | (//table)[3]/following::td')
+
+        order_details = {'date': _order_date(tr[-25].text_content()), 'products': []}
+        for value in trs[1:]:
+            details = value.xpath('.//td')[1:]
+            if len(details) > 4:
+                cat_num, desc, _, quantity, *_ = (td.text_content() for td in details)
+                order_details['products'].append(_product(cat_num, desc, quantity))
+
+        return order_number, order_details
+
+    def oem_number(self, content: str) -> str:
+        """Parse the search result and return the oem numbers.
+
+        Args:
+            content (str): html of the search result
+
+        Returns:
+            (str): oem numbers
+
+        Raises:
+            IndexError: if the search result doesn't contain the product
+        """
+        document = self._document(content)
+        tr = document.xpath('(//table)[3]/descendant::tr | (//table)[3]/following::tr')[1]
+        td = tr.xpath('descendant::td | following::td')
+
+        return ' '.join(td[1].itertext())
+
+
+PARSERS = {
+    'html.parser': lambda: SoupParser('html.parser'),
+    'html.parser-restricted': lambda: SoupParser('html.parser', restricted=True),
+}
+if lxml is not None:
+    PARSERS['soup-lxml'] = lambda: SoupParser('lxml', restricted=True)
+    PARSERS['lxml'] = LxmlParser
+
+
+def get_parser(name: str = None):
+    """Return the parser.
+
+    Args:
+        name (str): name of the parser backend, the fastest available if not passed
+
+    Returns:
+        (SoupParser | LxmlParser): the parser
+    """
+    if name is None:
+        name = 'lxml' if 'lxml' in PARSERS else 'html.parser'
+
+    return PARSERS[name]()
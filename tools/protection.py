@@ -1,52 +1,94 @@
 """The collections of the tools to encrypt and decrypt the database file."""
 import base64
 import gzip
+import os
+from dataclasses import replace
+from io import BytesIO
 from pathlib import Path
-from typing import Type
+from typing import Optional, Type
 
 import cryptography.fernet
 from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.backends import default_backend
 
+from tools import container
+from tools.container import Compression, KeyDerivation
+
 
 class Protection:
     """The class to encrypt and decrypt database.
+    The keys are derived once per key derivation and kept in the object,
+    the file is saved again with the salt and the parameters it was read with.
+    The data of the caches is encrypted with the key derived from the key of the file,
+    the fixed salt of the older files is used only to read them.
 
     Methods:
-        key_creation(): create the key for the encryption
+        key_creation(): create the key for the encryption of the caches
+        derive_key(key_derivation: KeyDerivation): derive the raw key from the password
         encrypt(data: str): encrypt passed data and return it
         decrypt(data: str): decrypt passed data and return it
+        encrypt_container(data: bytes): compress and encrypt passed data into the container and return it
+        decrypt_container(content: bytes): decrypt passed container and return the data
         decrypt_file(): decrypt database file and return content
-        save_database_dump(database_dump: str): encrypt database dump and save to the file
+        save_database_dump(database_dump: bytes): encrypt database dump and save to the file
     """
-    def __init__(self, password: str, database_path: Path):
+    def __init__(self, password: str, database_path: Path, key_derivation: KeyDerivation = None,
+                 compression: Compression = None):
         """Construct all the necessary attributes for the protection object.
 
         Args:
             password (str): database password
             database_path (Path): database name
+            key_derivation (KeyDerivation): the key derivation of the saved file,
+                the one of the read file or the default one with the random salt if not passed
+            compression (Compression): the compression of the saved file, zlib if not passed
         """
         self.password = bytes(password, 'utf-8')
         self.database_path = database_path
+        self.tuned = key_derivation is not None
+        self.key_derivation = key_derivation or KeyDerivation()
+        self.compression = compression or Compression()
+        self.keys = {}
+        self.fernet = None
+        # the file was read in the older format or with the other key derivation parameters
+        self.outdated = False
+
+    def derive_key(self, key_derivation: Optional[KeyDerivation] = None) -> bytes:
+        """Derive the raw key from the password, once per key derivation.
+
+        Args:
+            key_derivation (KeyDerivation): the key derivation, the fixed salt of the older files if not passed
+
+        Returns:
+            (bytes): 32 bytes key
+        """
+        if key_derivation not in self.keys:
+            if key_derivation is None:
+                kdf = PBKDF2HMAC(
+                    algorithm=hashes.SHA256(),
+                    salt=b'\xfaz\xb5\xf2|\xa1z\xa9\xfe\xd1F@1\xaa\x8a\xc2',
+                    iterations=1024,
+                    length=32,
+                    backend=default_backend(),
+                )
+                self.keys[key_derivation] = kdf.derive(self.password)
+            else:
+                self.keys[key_derivation] = key_derivation.derive(self.password)
+
+        return self.keys[key_derivation]
 
     def key_creation(self) -> cryptography.fernet.Fernet:
-        """Create the key for the encryption.
+        """Create the key for the encryption of the caches, derived from the key of the database file.
 
         Returns:
             object (cryptography.fernet.Fernet): key for encrypt and decrypt data
         """
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            salt=b'\xfaz\xb5\xf2|\xa1z\xa9\xfe\xd1F@1\xaa\x8a\xc2',
-            iterations=1024,
-            length=32,
-            backend=default_backend(),
-        )
-
-        key = Fernet(base64.urlsafe_b64encode(kdf.derive(self.password)))
-        return key
+        file_key = self.derive_key(self.key_derivation)
+        key = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=b'arbiko caches').derive(file_key)
+        return Fernet(base64.urlsafe_b64encode(key))
 
     def encrypt(self, data: bytes) -> bytes:
         """Encrypt and return passed data.
@@ -57,8 +99,8 @@ class Protection:
         Returns:
             (bytes): encrypted data
         """
-        key = self.key_creation()
-        safe = key.encrypt(data)
+        self.fernet = self.fernet or self.key_creation()
+        safe = self.fernet.encrypt(data)
         return safe
 
     def decrypt(self, data: str) -> bytes:
@@ -70,29 +112,83 @@ class Protection:
         Returns:
             (str): decrypted data
         """
-        key = self.key_creation()
-        result = key.decrypt(data)
+        self.fernet = self.fernet or self.key_creation()
+        result = self.fernet.decrypt(data)
         return result
 
-    def decrypt_file(self) -> str:
+    def encrypt_container(self, data: bytes) -> bytes:
+        """Compress and encrypt passed data into the container with the key of the database file.
+
+        Args:
+            data (bytes): data to encrypt
+
+        Returns:
+            (bytes): the container
+        """
+        file = BytesIO()
+        container.write(file, data, self.derive_key(self.key_derivation), self.key_derivation, self.compression)
+        return file.getvalue()
+
+    def decrypt_container(self, content: bytes) -> bytearray:
+        """Decrypt and return the data of passed container.
+
+        Args:
+            content (bytes): the container
+
+        Returns:
+            (bytearray): decrypted data
+        """
+        return container.read(BytesIO(content), self.derive_key)
+
+    def decrypt_file(self) -> bytes:
         """Open, decrypt and return database content.
+            The older files keep the single encrypted message in the gzip file.
 
         Returns:
-            (str): database content
+            (bytes): database content, the sqlite image or the sql text of the older files
         """
+        with open(self.database_path, 'rb') as file:
+            prefix = file.read(container.PREFIX.size)
+            if container.is_container(prefix):
+                file.seek(0)
+                self.outdated = container.PREFIX.unpack(prefix)[1] != container.VERSION
+                return container.read(file, self._file_key)
+
+        self.outdated = True
         file = gzip.open(self.database_path, 'rb')
         data = file.read()
         file.close()
 
-        content = self.decrypt(data)
-        content = content.decode('utf-8')
+        return Fernet(base64.urlsafe_b64encode(self.derive_key())).decrypt(data)
 
-        return content
+    def _file_key(self, key_derivation: Optional[KeyDerivation]) -> bytes:
+        """Return the key of the read file and keep its key derivation for the next save,
+            unless the other parameters were passed."""
+        if key_derivation is not None:
+            if not self.tuned or replace(self.key_derivation, salt=key_derivation.salt) == key_derivation:
+                self.key_derivation = key_derivation
+                self.fernet = None
+            else:
+                self.outdated = True
+        return self.derive_key(key_derivation)
 
     def save_database_dump(self, database_dump: bytes):
-        """Encrypt and save to the file passed database dump."""
-        encrypted_data = self.encrypt(database_dump)
-
-        file = gzip.open(self.database_path, 'wb')
-        file.write(encrypted_data)
-        file.close()
+        """Encrypt and save to the file passed database dump.
+            The dump is compressed and encrypted in chunks streamed to the temporary file,
+            the file replaces the database file after it is flushed to the disk."""
+        temporary_path = self.database_path.with_name(self.database_path.name + '.tmp')
+        with open(temporary_path, 'wb') as file:
+            container.write(
+                file, database_dump, self.derive_key(self.key_derivation), self.key_derivation, self.compression,
+            )
+            file.flush()
+            os.fsync(file.fileno())
+        temporary_path.replace(self.database_path)
+
+        # the directory entry of the renamed file
+        if hasattr(os, 'O_DIRECTORY'):
+            directory = os.open(self.database_path.parent, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(directory)
+            finally:
+                os.close(directory)
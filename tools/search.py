@@ -0,0 +1,280 @@
+"""The full-text search of the ordered products.
+
+The products are indexed in the FTS5 table by the catalog number, the oem number and the description,
+the search keys of the catalog and the oem numbers are indexed by their trigrams for the fuzzy lookup.
+The indexes are kept in sync with the products table by the triggers, so they are updated by any write.
+"""
+from typing import Sequence
+
+from sqlalchemy import Column, Connection, Float, Integer, MetaData, String, Table, case, or_, text
+from sqlalchemy.orm import Session
+
+from tools.models import NUMBER_SEPARATORS, Order, OrderProduct, Product
+
+SEARCH_TABLE = Table(
+    'products_search',
+    MetaData(),
+    Column('rowid', Integer),
+    Column('products_search', String),
+    Column('rank', Float),
+)
+KEYS_TABLE = Table(
+    'products_keys',
+    MetaData(),
+    Column('rowid', Integer),
+    Column('catalog_key', String),
+    Column('oem_key', String),
+    Column('products_keys', String),
+    Column('rank', Float),
+)
+# the columns of the products table indexed for the search
+COLUMNS = ('catalog_number', 'oem_number', 'description')
+# the columns of the found order lines, their orders and products selected with one query
+RESULT_COLUMNS = (
+    OrderProduct.id,
+    Order.order_number,
+    Order.date,
+    Product.catalog_number,
+    Product.oem_number,
+    Product.description,
+    OrderProduct.quantity,
+)
+# the number of the products matching the trigrams of the number compared with the number
+FUZZY_CANDIDATES = 200
+# the minimum similarity of the trigrams of the mistyped number
+MIN_SIMILARITY = 0.5
+
+
+def _index_scripts(name: str, columns: Sequence[str], options: str, sources: Sequence[str]) -> tuple:
+    """Return the statements creating the FTS5 index of the products columns,
+        the triggers keeping it in sync with the products and rebuilding it.
+
+    Args:
+        name (str): the name of the index table
+        columns (Sequence[str]): the indexed columns of the products table
+        options (str): the tokenizer and the other options of the index
+        sources (Sequence[str]): the columns of the products table changing the indexed columns
+
+    Returns:
+        (tuple): the statements
+    """
+    names = ', '.join(columns)
+    new = ', '.join(f'NEW.{column}' for column in columns)
+    old = ', '.join(f'OLD.{column}' for column in columns)
+    return (
+        f"CREATE VIRTUAL TABLE {name} USING fts5({names}, content='products', content_rowid='id', {options})",
+        f'CREATE TRIGGER {name}_insert AFTER INSERT ON products BEGIN '
+        f'INSERT INTO {name} (rowid, {names}) VALUES (NEW.id, {new}); END',
+        f'CREATE TRIGGER {name}_delete AFTER DELETE ON products BEGIN '
+        f"INSERT INTO {name} ({name}, rowid, {names}) VALUES ('delete', OLD.id, {old}); END",
+        f'CREATE TRIGGER {name}_update AFTER UPDATE OF id, {", ".join(sources)} ON products '
+        f'WHEN OLD.id IS NOT NEW.id OR {" OR ".join(f"OLD.{column} IS NOT NEW.{column}" for column in sources)} '
+        f"BEGIN INSERT INTO {name} ({name}, rowid, {names}) VALUES ('delete', OLD.id, {old}); "
+        f'INSERT INTO {name} (rowid, {names}) VALUES (NEW.id, {new}); END',
+        f"INSERT INTO {name} ({name}) VALUES ('rebuild')",
+    )
+
+
+SEARCH_INDEXES = {
+    SEARCH_TABLE.name: _index_scripts(
+        SEARCH_TABLE.name, COLUMNS, "tokenize='unicode61 remove_diacritics 2', prefix='2 3'", COLUMNS,
+    ),
+    KEYS_TABLE.name: _index_scripts(
+        KEYS_TABLE.name, ('catalog_key', 'oem_key'), "tokenize='trigram'", ('catalog_number', 'oem_number'),
+    ),
+}
+
+
+def create_search_index(connection: Connection, names: Sequence[str] = tuple(SEARCH_INDEXES)):
+    """Create the full-text indexes of the stored products and the triggers keeping them in sync.
+
+    Args:
+        connection (Connection): database connection
+        names (Sequence[str]): the names of the created indexes, all indexes if not passed
+    """
+    for name in names:
+        for script in SEARCH_INDEXES[name]:
+            connection.execute(text(script))
+
+
+def match_query(phrases: str, match_all: bool = True, columns: Sequence[str] = COLUMNS) -> str:
+    """Return the full-text query matching the words of the phrases as the prefixes of the indexed words.
+
+    Args:
+        phrases (str): the searched words separated with the spaces
+        match_all (bool): match the products with all words, with any word if False
+        columns (Sequence[str]): the searched columns, any word may be matched in any of them
+
+    Returns:
+        (str): the FTS5 query, empty if there are no words
+
+    Raises:
+        ValueError: if the column is not indexed
+    """
+    unknown = set(columns) - set(COLUMNS)
+    if unknown or not columns:
+        raise ValueError(f'The columns {", ".join(sorted(unknown))} are not indexed.')
+
+    words = ['"{}"*'.format(word.replace('"', '""')) for word in phrases.split()]
+    query = f' {"AND" if match_all else "OR"} '.join(words)
+    if query and set(columns) != set(COLUMNS):
+        query = f'{{{" ".join(columns)}}} : ({query})'
+    return query
+
+
+def search_order_products(session: Session, phrases: str, match_all: bool = True, columns: Sequence[str] = COLUMNS,
+                          by_relevance: bool = False, limit: int = None) -> list:
+    """Return the order lines of the products matching the phrases, found with one query.
+        Every order line is returned once, ordered by the order date in the database,
+        as the row of the RESULT_COLUMNS with the fields of the order and the product.
+
+    Args:
+        session (Session): database session
+        phrases (str): the searched words separated with the spaces
+        match_all (bool): match the products with all words, with any word if False
+        columns (Sequence[str]): the searched columns of the products
+        by_relevance (bool): return the lines of the most relevant products first
+        limit (int): the maximum number of the returned lines, all lines if not passed
+
+    Returns:
+        (list): the rows of the matching order lines
+    """
+    query = match_query(phrases, match_all, columns)
+    if not query:
+        return []
+
+    order = (Order.date, OrderProduct.id)
+    if by_relevance:
+        order = (SEARCH_TABLE.c.rank, *order)
+    return session.query(*RESULT_COLUMNS) \
+        .select_from(OrderProduct).join(Product).join(Order) \
+        .join(SEARCH_TABLE, SEARCH_TABLE.c.rowid == Product.id) \
+        .filter(SEARCH_TABLE.c.products_search.op('MATCH')(query)) \
+        .order_by(*order) \
+        .limit(limit) \
+        .all()
+
+
+def number_key(number: str) -> str:
+    """Return the search key of the typed number, as computed by the database for the stored numbers.
+
+    Args:
+        number (str): the catalog or the oem number
+
+    Returns:
+        (str): the upper case number without the separators and the leading zeros
+    """
+    key = number.upper()
+    for separator in NUMBER_SEPARATORS:
+        key = key.replace(separator, '')
+    return key.lstrip('0')
+
+
+def _trigrams(key: str) -> set:
+    """Return the trigrams of the key."""
+    return {key[index:index + 3] for index in range(len(key) - 2)}
+
+
+def similarity(key: str, other: str) -> tuple:
+    """Return the similarity of the search keys, the same keys first, then the other key containing the key,
+        then the other keys by the Dice coefficient of their trigrams.
+
+    Args:
+        key (str): the search key of the typed number
+        other (str): the search key of the stored number
+
+    Returns:
+        (tuple): the kind of the match, 2 for the same keys, 1 for the contained key, 0 for the similar keys,
+            and the score from 0 to 1, the length of the key to the other key for the contained key
+    """
+    if not key or not other:
+        return 0, 0.0
+    if key == other:
+        return 2, 1.0
+    if key in other:
+        return 1, len(key) / len(other)
+
+    trigrams, other_trigrams = _trigrams(key), _trigrams(other)
+    if not trigrams or not other_trigrams:
+        return 0, 0.0
+    return 0, 2 * len(trigrams & other_trigrams) / (len(trigrams) + len(other_trigrams))
+
+
+def find_products_by_number(session: Session, number: str) -> list:
+    """Return the products with the catalog or the oem number matching the typed number, the most similar first.
+        The products with the same search key are found by the indexes of the keys, the candidates sharing
+        the trigrams with the key by the trigram index, both with one query. Only the best kind of the match
+        is returned, the same numbers, else the numbers containing the typed part, else the similar numbers.
+
+    Args:
+        session (Session): database session
+        number (str): the full, the partial or the mistyped catalog or oem number
+
+    Returns:
+        (list): the product ids with their similarity
+    """
+    key = number_key(number)
+    if not key:
+        return []
+
+    condition = or_(Product.catalog_key == key, Product.oem_key == key)
+    trigrams = _trigrams(key)
+    if trigrams:
+        query = ' OR '.join('"{}"'.format(trigram.replace('"', '""')) for trigram in sorted(trigrams))
+        candidates = session.query(KEYS_TABLE.c.rowid) \
+            .filter(KEYS_TABLE.c.products_keys.op('MATCH')(query)) \
+            .order_by(KEYS_TABLE.c.rank) \
+            .limit(FUZZY_CANDIDATES)
+        condition = or_(condition, Product.id.in_(candidates.scalar_subquery()))
+
+    matches = {}
+    for product_id, catalog_key, oem_key in session.query(Product.id, Product.catalog_key, Product.oem_key) \
+            .filter(condition):
+        match = max(similarity(key, catalog_key), similarity(key, oem_key))
+        if match[0] or match[1] >= MIN_SIMILARITY:
+            matches[product_id] = match
+
+    best = max((kind for kind, _ in matches.values()), default=0)
+    return sorted(
+        ((product_id, score) for product_id, (kind, score) in matches.items() if kind == best),
+        key=lambda item: (-item[1], item[0]),
+    )
+
+
+def search_order_products_by_number(session: Session, number: str, limit: int = None, match_all: bool = True,
+                                    columns: Sequence[str] = COLUMNS) -> list:
+    """Return the order lines of the products with the catalog or the oem number similar to the typed number,
+        the lines of the most similar products first and each product's lines by the order date.
+        They are followed by the other lines of the products matching the number in the full-text index,
+        e.g. the number in the description.
+
+    Args:
+        session (Session): database session
+        number (str): the full, the partial or the mistyped catalog or oem number
+        limit (int): the maximum number of the returned lines, all lines if not passed
+        match_all (bool): match the products with all words of the number in the full-text index
+        columns (Sequence[str]): the columns of the products searched in the full-text index
+
+    Returns:
+        (list): the rows of the matching order lines
+    """
+    result = []
+    products = find_products_by_number(session, number)
+    if products:
+        positions = {product_id: position for position, (product_id, _) in enumerate(products)}
+        result = session.query(*RESULT_COLUMNS) \
+            .select_from(OrderProduct).join(Product).join(Order) \
+            .filter(OrderProduct.product_id.in_(positions)) \
+            .order_by(case(positions, value=OrderProduct.product_id), Order.date, OrderProduct.id) \
+            .limit(limit) \
+            .all()
+    if limit is not None and len(result) >= limit:
+        return result
+
+    # at most all found lines are matched again, so the limit leaves enough of the other lines
+    found = {line.id for line in result}
+    result += [
+        line for line in search_order_products(session, number, match_all, columns, limit=limit)
+        if line.id not in found
+    ]
+    return result[:limit]
@@ -0,0 +1,105 @@
+"""The collections of the tools to limit and retry the requests to arbiko.pl site."""
+from dataclasses import dataclass
+from random import uniform
+from threading import Lock
+from time import monotonic
+
+
+@dataclass
+class RequestPolicy:
+    """The limits of the requests.
+
+    Attributes:
+        timeout (float): timeout of a request in seconds
+        max_retries (int): the maximum number of the retries of a failed request
+        backoff (float): the base of the exponential backoff in seconds
+        max_backoff (float): the maximum backoff in seconds
+        rate (float): the initial number of the requests per second
+        min_rate (float): the lowest rate after the failures
+        max_rate (float): the highest rate after the successful requests
+        target_latency (float): the latency above which the rate is decreased
+    """
+    timeout: float = 30.0
+    max_retries: int = 3
+    backoff: float = 0.5
+    max_backoff: float = 30.0
+    rate: float = 5.0
+    min_rate: float = 0.5
+    max_rate: float = 20.0
+    target_latency: float = 2.0
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Return the exponential backoff with the full jitter for the passed attempt."""
+        return uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+
+class RequestStats:
+    """The counters of the requests reported at the end of the run."""
+    def __init__(self):
+        """Construct all the necessary attributes for the stats object."""
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.throttle_wait = 0.0
+        self.backoff_wait = 0.0
+        self.lock = Lock()
+
+    def add(self, **counters):
+        """Increase the passed counters."""
+        with self.lock:
+            for name, value in counters.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def __str__(self):
+        return (
+            f'Requests: {self.requests}, retries: {self.retries}, failures: {self.failures}, '
+            f'throttle wait: {self.throttle_wait:.1f}s, backoff wait: {self.backoff_wait:.1f}s'
+        )
+
+
+class RateLimiter:
+    """The token bucket limiting the rate of the requests.
+    The rate adapts to the observed latency and errors: it is halved after a failure,
+    decreased when the latency exceeds the target and slowly increased otherwise.
+
+    Methods:
+        reserve(): reserve the token and return the time to wait for it
+        record(latency: float, failed: bool): adapt the rate to the result of the request
+    """
+    def __init__(self, policy: RequestPolicy):
+        """Construct all the necessary attributes for the limiter object.
+
+        Args:
+            policy (RequestPolicy): the limits of the requests
+        """
+        self.policy = policy
+        self.rate = policy.rate
+        self.capacity = max(1.0, policy.rate)
+        self.tokens = self.capacity
+        self.updated = monotonic()
+        self.lock = Lock()
+
+    def reserve(self) -> float:
+        """Reserve the token and return the time to wait for it in seconds."""
+        with self.lock:
+            now = monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def record(self, latency: float, failed: bool = False):
+        """Adapt the rate to the result of the request.
+
+        Args:
+            latency (float): the latency of the request in seconds
+            failed (bool): if the request failed
+        """
+        with self.lock:
+            if failed:
+                self.rate = max(self.policy.min_rate, self.rate / 2)
+            elif latency > self.policy.target_latency:
+                self.rate = max(self.policy.min_rate, self.rate * 0.9)
+            else:
+                self.rate = min(self.policy.max_rate, self.rate + 0.1)